@@ -0,0 +1,48 @@
+"""
+Database migration script for the durable MCP chat room store
+Creates mcp_chat_rooms and lets chat_messages hold AI/MCP rows without a user
+"""
+
+from sqlalchemy import text
+from database import engine
+
+def migrate_chat_rooms():
+    """Create mcp_chat_rooms and make chat_messages.user_id nullable"""
+    
+    with engine.connect() as conn:
+        try:
+            print("Creating mcp_chat_rooms table...")
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS mcp_chat_rooms (
+                    room_id VARCHAR(255) PRIMARY KEY,
+                    project_id INTEGER REFERENCES projects(id),
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    participants JSON,
+                    summary TEXT,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+                    updated_at TIMESTAMP WITH TIME ZONE
+                )
+            """))
+            
+            # AI replies and MCP room messages have no platform user
+            print("Making chat_messages.user_id nullable...")
+            conn.execute(text("""
+                ALTER TABLE chat_messages 
+                ALTER COLUMN user_id DROP NOT NULL
+            """))
+            
+            conn.commit()
+            print("✅ Migration completed successfully!")
+            print("   - Created mcp_chat_rooms table")
+            print("   - chat_messages.user_id is now nullable")
+            
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("🚀 Starting database migration...")
+    print("   Adding durable MCP chat room storage")
+    print()
+    migrate_chat_rooms()
@@ -0,0 +1,50 @@
+"""
+Database migration script for the email outbox
+Creates email_outbox (queued OTP / invite emails) and its queue index
+"""
+
+from sqlalchemy import text
+from database import engine
+
+def migrate_email_outbox():
+    """Create email_outbox and idx_email_outbox_queue"""
+    
+    with engine.connect() as conn:
+        try:
+            print("Creating email_outbox table...")
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS email_outbox (
+                    id SERIAL PRIMARY KEY,
+                    to_email VARCHAR(255) NOT NULL,
+                    template VARCHAR(50) NOT NULL,
+                    params JSON NOT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error_message TEXT,
+                    available_at TIMESTAMP WITH TIME ZONE,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+                    sent_at TIMESTAMP WITH TIME ZONE
+                )
+            """))
+            
+            print("Creating idx_email_outbox_queue...")
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_email_outbox_queue
+                ON email_outbox(status, available_at)
+            """))
+            
+            conn.commit()
+            print("✅ Migration completed successfully!")
+            print("   - Created email_outbox table")
+            print("   - Created idx_email_outbox_queue index")
+            
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("🚀 Starting database migration...")
+    print("   Adding email outbox")
+    print()
+    migrate_email_outbox()
@@ -0,0 +1,38 @@
+"""
+Database migration script for keyset-paginated list endpoints
+Adds (created_at, id) composite indexes backing the page cursors
+"""
+
+from sqlalchemy import text
+from database import engine
+
+INDEXES = [
+    ("idx_projects_created", "projects(created_at, id)"),
+    ("idx_stakeholders_project_created", "stakeholders(project_id, created_at, id)"),
+    ("idx_branches_project_created", "branches(project_id, created_at, id)"),
+    ("idx_refinements_project_created", "refinements(project_id, created_at, id)"),
+]
+
+def migrate_pagination_indexes():
+    """Create the composite indexes used by the list endpoint cursors"""
+    
+    with engine.connect() as conn:
+        try:
+            for name, definition in INDEXES:
+                print(f"Creating {name}...")
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+            
+            conn.commit()
+            print("✅ Migration completed successfully!")
+            print(f"   - Created {len(INDEXES)} pagination indexes")
+            
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("🚀 Starting database migration...")
+    print("   Adding keyset pagination indexes")
+    print()
+    migrate_pagination_indexes()
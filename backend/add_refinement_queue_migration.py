@@ -0,0 +1,53 @@
+"""
+Database migration script for the durable refinement job queue
+Adds claim/lease/backoff columns to the refinements table
+"""
+
+from sqlalchemy import text
+from database import engine
+
+def migrate_refinement_queue():
+    """Add attempts, available_at and lease_expires_at columns to refinements"""
+    
+    with engine.connect() as conn:
+        try:
+            print("Adding attempts column...")
+            conn.execute(text("""
+                ALTER TABLE refinements 
+                ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0
+            """))
+            
+            print("Adding available_at column...")
+            conn.execute(text("""
+                ALTER TABLE refinements 
+                ADD COLUMN IF NOT EXISTS available_at TIMESTAMP WITH TIME ZONE
+            """))
+            
+            print("Adding lease_expires_at column...")
+            conn.execute(text("""
+                ALTER TABLE refinements 
+                ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE
+            """))
+            
+            # Workers poll by status + availability
+            print("Creating queue index...")
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_refinements_queue 
+                ON refinements(status, available_at)
+            """))
+            
+            conn.commit()
+            print("✅ Migration completed successfully!")
+            print("   - Added attempts, available_at, lease_expires_at columns")
+            print("   - Created idx_refinements_queue index")
+            
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("🚀 Starting database migration...")
+    print("   Adding refinement queue fields to refinements table")
+    print()
+    migrate_refinement_queue()
@@ -0,0 +1,33 @@
+"""
+Database migration script for refinement status versions
+Adds the status_version column long-poll and SSE clients compare across workers
+"""
+
+from sqlalchemy import text
+from database import engine
+
+def migrate_refinement_status_version():
+    """Add status_version column to refinements"""
+    
+    with engine.connect() as conn:
+        try:
+            print("Adding status_version column...")
+            conn.execute(text("""
+                ALTER TABLE refinements 
+                ADD COLUMN IF NOT EXISTS status_version INTEGER NOT NULL DEFAULT 1
+            """))
+            
+            conn.commit()
+            print("✅ Migration completed successfully!")
+            print("   - Added status_version column")
+            
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("🚀 Starting database migration...")
+    print("   Adding status_version to refinements table")
+    print()
+    migrate_refinement_status_version()
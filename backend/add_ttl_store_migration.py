@@ -0,0 +1,43 @@
+"""
+Database migration script for the shared TTL key-value store
+Creates ttl_entries (OTPs and invite codes) with an index for the expiry sweep
+"""
+
+from sqlalchemy import text
+from database import engine
+
+def migrate_ttl_store():
+    """Create ttl_entries and its expires_at index"""
+    
+    with engine.connect() as conn:
+        try:
+            print("Creating ttl_entries table...")
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS ttl_entries (
+                    key VARCHAR(255) PRIMARY KEY,
+                    value JSON NOT NULL,
+                    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+                )
+            """))
+            
+            print("Creating idx_ttl_entries_expires...")
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_ttl_entries_expires
+                ON ttl_entries(expires_at)
+            """))
+            
+            conn.commit()
+            print("✅ Migration completed successfully!")
+            print("   - Created ttl_entries table")
+            print("   - Created idx_ttl_entries_expires index")
+            
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("🚀 Starting database migration...")
+    print("   Adding shared TTL store for OTPs and invite codes")
+    print()
+    migrate_ttl_store()
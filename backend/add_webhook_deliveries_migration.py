@@ -0,0 +1,55 @@
+"""
+Database migration script for the webhook ingestion queue
+Creates webhook_deliveries and indexes refinements.pr_url for webhook lookups
+"""
+
+from sqlalchemy import text
+from database import engine
+
+def migrate_webhook_deliveries():
+    """Create webhook_deliveries, its queue index and the refinements.pr_url index"""
+    
+    with engine.connect() as conn:
+        try:
+            print("Creating webhook_deliveries table...")
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS webhook_deliveries (
+                    id VARCHAR(100) PRIMARY KEY,
+                    event VARCHAR(50) NOT NULL,
+                    payload TEXT NOT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error_message TEXT,
+                    available_at TIMESTAMP WITH TIME ZONE,
+                    received_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+                    processed_at TIMESTAMP WITH TIME ZONE
+                )
+            """))
+            
+            print("Creating idx_webhook_deliveries_queue...")
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_queue
+                ON webhook_deliveries(status, received_at)
+            """))
+            
+            print("Creating idx_refinements_pr_url...")
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_refinements_pr_url
+                ON refinements(pr_url)
+            """))
+            
+            conn.commit()
+            print("✅ Migration completed successfully!")
+            print("   - Created webhook_deliveries table")
+            print("   - Created idx_webhook_deliveries_queue and idx_refinements_pr_url indexes")
+            
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("🚀 Starting database migration...")
+    print("   Adding webhook delivery queue")
+    print()
+    migrate_webhook_deliveries()
@@ -7,15 +7,17 @@ For production, integrate Clerk or Firebase Auth.
 
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
-from datetime import datetime, timezone, timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
 from typing import Optional
 import secrets
-import hashlib
 
 from database import get_db
-from models import User, Session as DBSession
-from integrations.email_service import send_otp_email
+from models import User
+from auth_sessions import session_resolver
+from ttl_store import ttl_store
+from email_outbox import email_outbox
 
 router = APIRouter()
 
@@ -41,10 +43,15 @@ class AuthResponse(BaseModel):
     message: Optional[str] = None
 
 
-# ==================== OTP STORAGE (In-memory for MVP) ====================
-# For production: Use Redis or database with TTL
+# ==================== OTP STORAGE ====================
+# Shared TTL store (database or Redis) so any worker can verify a code
 
-otp_storage = {}  # email -> {"otp": str, "expires_at": datetime, "name": str}
+OTP_TTL = timedelta(minutes=10)
+
+
+def otp_key(email: str) -> str:
+    """TTL store key of the pending OTP / invite code for an email"""
+    return f"otp:{email}"
 
 
 def generate_otp() -> str:
@@ -52,15 +59,10 @@ def generate_otp() -> str:
     return str(secrets.randbelow(999999)).zfill(6)
 
 
-def hash_token(token: str) -> str:
-    """Hash session token for storage"""
-    return hashlib.sha256(token.encode()).hexdigest()
-
-
 # ==================== AUTH ENDPOINTS ====================
 
 @router.post("/auth/signup", response_model=AuthResponse)
-async def signup(request: SignUpRequest, db: Session = Depends(get_db)):
+async def signup(request: SignUpRequest, db: AsyncSession = Depends(get_db)):
     """
     Step 1: Sign up with email
     
@@ -68,35 +70,33 @@ async def signup(request: SignUpRequest, db: Session = Depends(get_db)):
     1. User enters email + name
     2. Check if email exists (if yes, treat as login)
     3. Generate OTP
-    4. Store OTP in memory (expires in 10 min)
-    5. Return success (in production: send OTP via email)
+    4. Store OTP in the TTL store (expires in 10 min)
+    5. Queue the OTP email and return success
     """
     try:
         # Check if user already exists
-        existing_user = db.query(User).filter(User.email == request.email).first()
+        existing_user = await db.scalar(select(User).where(User.email == request.email).limit(1))
         
         # Generate OTP
         otp = generate_otp()
-        expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
         
         # Store OTP
-        otp_storage[request.email] = {
+        await ttl_store.set(otp_key(request.email), {
             "otp": otp,
-            "expires_at": expires_at,
             "name": request.name,
             "is_existing_user": existing_user is not None
-        }
+        }, OTP_TTL.total_seconds())
         
-        # Send OTP email
-        email_sent = send_otp_email(request.email, otp, request.name)
+        # Queue the OTP email (delivered by the outbox worker)
+        await email_outbox.enqueue(request.email, "otp", {"otp": otp, "name": request.name})
         
-        if email_sent:
+        if email_outbox.delivers_email:
             return AuthResponse(
                 success=True,
                 message=f"OTP sent to {request.email}. Check your inbox!"
             )
         else:
-            # Fallback if email fails
+            # No mail provider configured: the code only goes to the console
             return AuthResponse(
                 success=True,
                 message=f"OTP sent to {request.email}. Fallback OTP (check console): {otp}"
@@ -108,7 +108,7 @@ async def signup(request: SignUpRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/auth/verify-otp", response_model=AuthResponse)
-async def verify_otp(request: VerifyOTPRequest, db: Session = Depends(get_db)):
+async def verify_otp(request: VerifyOTPRequest, db: AsyncSession = Depends(get_db)):
     """
     Step 2: Verify OTP and create session
     
@@ -120,28 +120,24 @@ async def verify_otp(request: VerifyOTPRequest, db: Session = Depends(get_db)):
     5. Return user info + token
     """
     try:
-        # Check if OTP exists
-        if request.email not in otp_storage:
-            raise HTTPException(status_code=400, detail="No OTP found. Please sign up first.")
-        
-        otp_data = otp_storage[request.email]
-        
-        # Check if OTP is expired
-        if datetime.now(timezone.utc) > otp_data["expires_at"]:
-            del otp_storage[request.email]
-            raise HTTPException(status_code=400, detail="OTP expired. Please request a new one.")
+        # Check if OTP exists (expired entries are gone from the store)
+        otp_data = await ttl_store.get(otp_key(request.email), fresh=True)
+        if otp_data is None:
+            raise HTTPException(status_code=400, detail="No valid OTP found. Please sign up or request a new one.")
         
         # Verify OTP
         if request.otp != otp_data["otp"]:
             raise HTTPException(status_code=400, detail="Invalid OTP")
         
-        # OTP is valid! Clear it
+        # OTP is valid! Consume it; only one concurrent verification can win
+        consumed = await ttl_store.pop(otp_key(request.email))
+        if consumed is None or consumed["otp"] != request.otp:
+            raise HTTPException(status_code=400, detail="OTP already used. Please request a new one.")
         name = otp_data["name"]
         is_existing = otp_data["is_existing_user"]
-        del otp_storage[request.email]
         
         # Get or upgrade user from anonymous to authenticated
-        user = db.query(User).filter(User.email == request.email).first()
+        user = await db.scalar(select(User).where(User.email == request.email).limit(1))
         
         if not user:
             # Create new authenticated user
@@ -152,31 +148,22 @@ async def verify_otp(request: VerifyOTPRequest, db: Session = Depends(get_db)):
                 session_id=None  # Authenticated users don't need session_id
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
             print(f"✅ Created new authenticated user: {user.email}")
         elif user.hashed_password is None:
             # Upgrade anonymous user to authenticated
             user.hashed_password = "otp_auth"
             user.name = name
             print(f"✅ Upgraded anonymous user to authenticated: {user.email}")
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
+            await session_resolver.invalidate_user(user.id)
         else:
             print(f"✅ Existing user logged in: {user.email}")
         
-        # Generate session token
-        session_token = secrets.token_urlsafe(32)
-        hashed_token = hash_token(session_token)
-        
-        # Create session
-        session = DBSession(
-            user_id=user.id,
-            token=hashed_token,
-            expires_at=datetime.now(timezone.utc) + timedelta(days=7)
-        )
-        db.add(session)
-        db.commit()
+        # Create session (stored row, or a signed token with STATELESS_SESSIONS)
+        session_token = await session_resolver.issue(db, user)
         
         return AuthResponse(
             success=True,
@@ -201,7 +188,7 @@ async def ensure_clerk_user(
     clerk_user_id: str,
     email: str,
     name: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Ensure a User record exists for a Clerk user
@@ -215,7 +202,7 @@ async def ensure_clerk_user(
     """
     try:
         # Check by Clerk ID
-        user = db.query(User).filter(User.clerk_user_id == clerk_user_id).first()
+        user = await db.scalar(select(User).where(User.clerk_user_id == clerk_user_id).limit(1))
         
         if user:
             # User exists, update email/name if provided
@@ -223,19 +210,21 @@ async def ensure_clerk_user(
                 user.email = email
             if name and user.name != name:
                 user.name = name
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
+            await session_resolver.invalidate_user(user.id)
             print(f"✅ Found existing Clerk user: {user.email}")
         else:
             # Check by email (might be anonymous user)
-            user = db.query(User).filter(User.email == email).first()
+            user = await db.scalar(select(User).where(User.email == email).limit(1))
             if user:
                 # Link anonymous user to Clerk
                 user.clerk_user_id = clerk_user_id
                 if name:
                     user.name = name
-                db.commit()
-                db.refresh(user)
+                await db.commit()
+                await db.refresh(user)
+                await session_resolver.invalidate_user(user.id)
                 print(f"✅ Linked Clerk ID to existing user: {user.email}")
             else:
                 # Create new user
@@ -245,8 +234,8 @@ async def ensure_clerk_user(
                     name=name
                 )
                 db.add(user)
-                db.commit()
-                db.refresh(user)
+                await db.commit()
+                await db.refresh(user)
                 print(f"✅ Created new Clerk user: {user.email}")
         
         return {
@@ -261,7 +250,7 @@ async def ensure_clerk_user(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Ensure Clerk user error: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -273,38 +262,22 @@ async def ensure_clerk_user(
 
 
 @router.get("/auth/me")
-async def get_current_user(session_token: str, db: Session = Depends(get_db)):
+async def get_current_user(session_token: str, db: AsyncSession = Depends(get_db)):
     """
     Get current user from session token
     
-    Used by frontend to check if user is logged in
+    Used by frontend to check if user is logged in. Resolved tokens are
+    cached, so repeated checks do not touch the database.
     """
     try:
-        hashed_token = hash_token(session_token)
-        
-        # Find session
-        session = db.query(DBSession).filter(
-            DBSession.token == hashed_token,
-            DBSession.expires_at > datetime.now(timezone.utc)
-        ).first()
-        
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid or expired session")
-        
-        # Get user
-        user = db.query(User).filter(User.id == session.user_id).first()
+        user = await session_resolver.resolve(db, session_token)
         
         if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+            raise HTTPException(status_code=401, detail="Invalid or expired session")
         
         return {
             "success": True,
-            "user": {
-                "id": user.id,
-                "email": user.email,
-                "name": user.name,
-                "created_at": user.created_at.isoformat() if user.created_at else None
-            }
+            "user": user
         }
         
     except HTTPException:
@@ -315,19 +288,13 @@ async def get_current_user(session_token: str, db: Session = Depends(get_db)):
 
 
 @router.post("/auth/logout")
-async def logout(session_token: str, db: Session = Depends(get_db)):
+async def logout(session_token: str, db: AsyncSession = Depends(get_db)):
     """
     Logout user by invalidating session
     """
     try:
-        hashed_token = hash_token(session_token)
-        
-        # Delete session
-        session = db.query(DBSession).filter(DBSession.token == hashed_token).first()
-        
-        if session:
-            db.delete(session)
-            db.commit()
+        # Delete the session row (or revoke a stateless token) and drop it from the cache
+        await session_resolver.revoke(db, session_token)
         
         return {"success": True, "message": "Logged out successfully"}
         
@@ -3,21 +3,29 @@ Branches API - GitHub branch management with AI suggestions
 Now using PostgreSQL with SQLAlchemy
 """
 
+import os
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
 import json
 import re
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Branch, Project, Stakeholder
+from api.pagination import paginate, parse_fields, serialize
 from integrations.github_api import github_client
 from integrations.gemini_code_generator import GeminiCodeGenerator
 
 router = APIRouter()
 
+# Same project/member/role always gets the same suggestions; skip the model round-trip
+BRANCH_SUGGESTION_CACHE_TTL = float(os.getenv("BRANCH_SUGGESTION_CACHE_TTL", "86400"))
+
+BRANCH_LIST_FIELDS = ("project_id", "stakeholder_id", "branch_name", "github_url", "status")
+
 # Initialize Gemini for branch name suggestions
 gemini_suggester = None
 try:
@@ -44,14 +52,14 @@ class CreateBranchRequest(BaseModel):
 async def suggest_branch_name(
     project_id: int,
     request: SuggestBranchRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     AI-powered branch name suggestion based on stakeholder role
     """
     
     # Verify project exists
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     if not project:
         return {
             "success": False,
@@ -95,7 +103,7 @@ Return ONLY a JSON object like this (no markdown, no explanations):
 {{"primary": "branch-name-1", "alternative1": "branch-name-2", "alternative2": "branch-name-3"}}"""
 
     try:
-        response = gemini_suggester.generate_text(prompt)
+        response = await gemini_suggester.generate_text(prompt, cache_ttl=BRANCH_SUGGESTION_CACHE_TTL)
         
         # Extract JSON from response
         json_match = re.search(r'\{.*\}', response, re.DOTALL)
@@ -137,14 +145,14 @@ Return ONLY a JSON object like this (no markdown, no explanations):
 async def create_branch(
     project_id: int,
     request: CreateBranchRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a GitHub branch for a stakeholder
     """
     
     # Verify project exists
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     if not project:
         return {
             "success": False,
@@ -153,10 +161,10 @@ async def create_branch(
         }
     
     # Verify stakeholder exists
-    stakeholder = db.query(Stakeholder).filter(
+    stakeholder = await db.scalar(select(Stakeholder).where(
         Stakeholder.id == request.stakeholder_id,
         Stakeholder.project_id == project_id
-    ).first()
+    ).limit(1))
     if not stakeholder:
         return {
             "success": False,
@@ -231,8 +239,8 @@ async def create_branch(
     # Update stakeholder with branch name
     stakeholder.github_branch = request.branch_name
     
-    db.commit()
-    db.refresh(branch)
+    await db.commit()
+    await db.refresh(branch)
     
     return {
         "success": True,
@@ -251,11 +259,17 @@ async def create_branch(
 
 
 @router.get("/projects/{project_id}/branches")
-async def list_branches(project_id: int, db: Session = Depends(get_db)):
-    """List all branches for a project"""
+async def list_branches(
+    project_id: int,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """List branches for a project, oldest first (keyset-paginated when limit is given)"""
     
     # Verify project exists
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     if not project:
         return {
             "success": False,
@@ -263,22 +277,21 @@ async def list_branches(project_id: int, db: Session = Depends(get_db)):
             "error": "Project not found"
         }
     
-    branches = db.query(Branch).filter(Branch.project_id == project_id).all()
+    columns = parse_fields(fields, Branch, BRANCH_LIST_FIELDS)
+    branches, next_cursor = await paginate(
+        db,
+        select(Branch).where(Branch.project_id == project_id),
+        Branch,
+        columns,
+        cursor,
+        limit,
+        descending=False
+    )
     
     return {
         "success": True,
-        "data": [
-            {
-                "id": b.id,
-                "project_id": b.project_id,
-                "stakeholder_id": b.stakeholder_id,
-                "branch_name": b.branch_name,
-                "github_url": b.github_url,
-                "status": b.status,
-                "created_at": b.created_at.isoformat()
-            }
-            for b in branches
-        ],
+        "data": [serialize(b, columns) for b in branches],
+        "next_cursor": next_cursor,
         "error": None
     }
 
@@ -287,14 +300,14 @@ async def list_branches(project_id: int, db: Session = Depends(get_db)):
 async def get_branch(
     project_id: int,
     branch_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get a specific branch"""
     
-    branch = db.query(Branch).filter(
+    branch = await db.scalar(select(Branch).where(
         Branch.id == branch_id,
         Branch.project_id == project_id
-    ).first()
+    ).limit(1))
     
     if not branch:
         return {
@@ -322,14 +335,14 @@ async def get_branch(
 async def delete_branch(
     project_id: int,
     branch_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a branch (mark as closed, don't delete from GitHub)"""
     
-    branch = db.query(Branch).filter(
+    branch = await db.scalar(select(Branch).where(
         Branch.id == branch_id,
         Branch.project_id == project_id
-    ).first()
+    ).limit(1))
     
     if not branch:
         return {
@@ -340,7 +353,7 @@ async def delete_branch(
     
     # Mark as closed instead of deleting
     branch.status = "closed"
-    db.commit()
+    await db.commit()
     
     return {
         "success": True,
@@ -4,16 +4,24 @@ Integrates with Socket.IO for real-time messaging
 """
 
 import os
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timezone
 
-from database import get_db
+from database import get_db, get_read_db
 from models import ChatMessage, Project, Stakeholder, User, Refinement
+from chat_writer import chat_writer
+from project_context import chat_author_name, project_context_cache
+from chat_replay import chat_replay
+from refinement_queue import refinement_queue
+from refinement_events import refinement_events
 from integrations.jllm_api import jllm_agent
+from integrations.chat_memory import chat_memory, decision_outcome, format_memories, CHAT_MEMORY_RECENT_TURNS
 from integrations.fetchai_router import fetchai_router
+from integrations.llm_gateway import llm_gateway
 
 router = APIRouter()
 
@@ -66,8 +74,74 @@ def should_janitor_respond(message: str, recent_messages: List[ChatMessage]) ->
     return False
 
 
+def serialize_message(row: dict, author_name: str) -> dict:
+    """Shape a persisted chat row for the API / WebSocket payload"""
+    return {
+        "id": row["id"],
+        "project_id": row["project_id"],
+        "message": row["message"],
+        "role": row["role"],
+        "is_ai": row["is_ai"],
+        "created_at": row["created_at"].isoformat(),
+        "author_name": author_name
+    }
+
+
+async def build_janitor_history(
+    project_id: int,
+    message: str,
+    speaker_role: Optional[str],
+    recent_messages: List[ChatMessage]
+) -> List[dict]:
+    """
+    Chat history for a Janitor AI turn
+    
+    Semantically relevant earlier turns and decisions (filtered by role) from
+    chat memory, followed by the last few turns verbatim. recent_messages is
+    newest first and includes the current message.
+    """
+    recent = list(reversed(recent_messages[1:CHAT_MEMORY_RECENT_TURNS + 1]))
+    
+    memories = await chat_memory.recall(
+        project_id,
+        message,
+        speaker_role,
+        exclude_message_ids={msg.id for msg in recent_messages}
+    )
+    
+    history = []
+    if memories:
+        history.append({"role": "user", "content": format_memories(memories)})
+    
+    history.extend(
+        {
+            "role": "assistant" if msg.is_ai else "user",
+            "content": msg.message
+        }
+        for msg in recent
+    )
+    return history
+
+
+async def post_janitor_message(sio, project_id: int, text: str) -> dict:
+    """Persist a Janitor AI message through the group-commit writer and broadcast it"""
+    row = await chat_writer.write(
+        project_id=project_id,
+        user_id=None,
+        message=text,
+        role="Facilitator",
+        is_ai=True
+    )
+    payload = serialize_message(row, "Janitor AI")
+    await broadcast_message(sio, project_id, [payload])
+    return payload
+
+
 async def broadcast_message(sio, project_id: int, messages: List[dict]):
     """Broadcast messages to all clients in project room"""
+    # Keep them for clients that reconnect with a cursor
+    chat_replay.record(str(project_id), messages)
+    
     try:
         await sio.emit(
             "chat:message",
@@ -85,8 +159,7 @@ async def broadcast_message(sio, project_id: int, messages: List[dict]):
 async def send_chat_message(
     project_id: int,
     request: SendMessageRequest,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Send a chat message
@@ -94,140 +167,147 @@ async def send_chat_message(
     Flow:
     1. Save user message to database
     2. Analyze with Fetch.ai router (is this a task?)
-    3. If task detected → create refinement, trigger agent
+    3. If task detected → create refinement, enqueue it for the agent workers
     4. Decide if Janitor AI should respond
     5. Save AI response if applicable
-    6. Broadcast all messages via WebSocket
+    6. Broadcast each message via WebSocket as soon as it is saved
     """
     try:
-        # Verify project exists
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if not project:
+        # Project + roster come from the per-project context cache
+        context = await project_context_cache.get(db, project_id)
+        if not context:
             raise HTTPException(status_code=404, detail="Project not found")
         
         # Verify stakeholder
-        stakeholder = db.query(Stakeholder).filter(Stakeholder.id == request.stakeholder_id).first()
-        if not stakeholder:
-            raise HTTPException(status_code=404, detail="Stakeholder not found")
+        member = context.stakeholders.get(request.stakeholder_id)
+        if not member:
+            stakeholder = await db.get(Stakeholder, request.stakeholder_id)
+            if not stakeholder:
+                raise HTTPException(status_code=404, detail="Stakeholder not found")
+            member = {
+                "id": stakeholder.id,
+                "user_id": stakeholder.user_id,
+                "name": stakeholder.name,
+                "email": stakeholder.email,
+                "role": stakeholder.role
+            }
         
         # Get stakeholder's user
-        user_id = stakeholder.user_id
-        author_name = stakeholder.name
+        user_id = member["user_id"]
+        author_name = member["name"]
         
-        print(f"📝 Sending message: stakeholder_id={stakeholder.id}, user_id={user_id}, email={stakeholder.email}")
+        print(f"📝 Sending message: stakeholder_id={member['id']}, user_id={user_id}, email={member['email']}")
         
         # Critical: Ensure user_id is not NULL
+        linked = False
         if not user_id:
-            print(f"⚠️ Stakeholder {stakeholder.id} has no user_id! Looking up user by email...")
+            print(f"⚠️ Stakeholder {member['id']} has no user_id! Looking up user by email...")
             # Try to link stakeholder to user by email
-            user = db.query(User).filter(User.email == stakeholder.email).first()
+            user = await db.scalar(select(User).where(User.email == member["email"]).limit(1))
             if user:
+                # Committed together with any refinement below
+                stakeholder = await db.get(Stakeholder, member["id"])
                 stakeholder.user_id = user.id
                 stakeholder.status = "active"
-                db.commit()
                 user_id = user.id
+                linked = True
                 print(f"✅ Linked stakeholder to user {user_id}")
             else:
-                print(f"❌ No user found for email {stakeholder.email}")
+                print(f"❌ No user found for email {member['email']}")
                 raise HTTPException(
                     status_code=400,
-                    detail=f"User account not found for {stakeholder.email}. Please sign in first."
+                    detail=f"User account not found for {member['email']}. Please sign in first."
                 )
         
-        # 1. Save user message
-        user_msg = ChatMessage(
+        # 1. Save user message (group-committed with concurrent senders)
+        user_row = await chat_writer.write(
             project_id=project_id,
             user_id=user_id,
             message=request.message,
-            role=stakeholder.role,
+            role=member["role"],
             is_ai=False
         )
-        db.add(user_msg)
-        db.commit()
-        db.refresh(user_msg)
         
-        print(f"✅ Message saved: id={user_msg.id}, user_id={user_id}")
+        print(f"✅ Message saved: id={user_row['id']}, user_id={user_id}")
+        chat_memory.index_message(user_row, author_name)
         
-        messages_to_broadcast = [{
-            "id": user_msg.id,
-            "project_id": user_msg.project_id,
-            "message": user_msg.message,
-            "role": user_msg.role,
-            "is_ai": False,
-            "created_at": user_msg.created_at.isoformat(),
-            "author_name": author_name
-        }]
+        messages_to_broadcast = [serialize_message(user_row, author_name)]
+        
+        # Broadcast right away so room order follows id order (the Janitor
+        # reply below can take seconds)
+        from main import sio
+        await broadcast_message(sio, project_id, messages_to_broadcast)
         
         # 2. Analyze with Fetch.ai router - is this a code change request?
         task_analysis = fetchai_router.route_refinement(
             request_text=request.message,
-            stakeholder_role=stakeholder.role,
+            stakeholder_role=member["role"],
             ai_model_preference="auto"
         )
         
         print(f"🤖 Fetch.ai analysis: {task_analysis}")
         
         # 3. If high confidence task detected → create refinement
+        refinement_id = None
         if task_analysis["confidence"] > 0.6:
             refinement = Refinement(
                 project_id=project_id,
-                stakeholder_id=stakeholder.id,
+                stakeholder_id=member["id"],
                 request_text=request.message,
                 ai_model_preference="auto",
                 ai_model_used=task_analysis["model"],
                 status="pending"
             )
             db.add(refinement)
-            db.commit()
-            
-            print(f"✅ Created refinement {refinement.id} for {task_analysis['model']} agent")
-            
-            # Trigger agent in background
-            background_tasks.add_task(
-                execute_refinement_task,
-                refinement.id,
-                task_analysis["model"],
-                db
+            await db.flush()
+            refinement_id = refinement.id
+        
+        # Stakeholder link and refinement share a single commit (the flush
+        # above empties db.new / db.dirty, so check both explicitly)
+        if refinement_id or linked:
+            await db.commit()
+            project_context_cache.invalidate(project_id)
+        
+        if refinement_id:
+            print(f"✅ Created refinement {refinement_id} for {task_analysis['model']} agent")
+            chat_memory.index_decision(
+                project_id,
+                refinement_id,
+                request.message,
+                member["role"],
+                author_name,
+                status="pending"
             )
+            
+            # Committed as "pending" above; wake the refinement workers
+            refinement_events.publish(refinement)
+            refinement_queue.notify()
         
         # 4. Get recent chat history for context
-        recent_messages = db.query(ChatMessage).filter(
+        recent_messages = (await db.scalars(select(ChatMessage).where(
             ChatMessage.project_id == project_id
-        ).order_by(ChatMessage.created_at.desc()).limit(10).all()
+        ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(10))).all()
         
         # 5. Decide if Janitor AI should respond (with error handling)
         try:
             if should_janitor_respond(request.message, recent_messages):
                 print("🤖 Janitor AI responding...")
                 
-                # Build context
-                team_members = db.query(Stakeholder).filter(
-                    Stakeholder.project_id == project_id
-                ).all()
-                
-                team_context = [
-                    {
-                        "name": s.name,
-                        "email": s.email,
-                        "role": s.role
-                    }
-                    for s in team_members
-                ]
-                
-                chat_history = [
-                    {
-                        "role": "assistant" if msg.is_ai else "user",
-                        "content": msg.message
-                    }
-                    for msg in reversed(recent_messages[1:])  # Exclude current message
-                ]
+                # Relevant memories + last few turns instead of the raw recent history
+                chat_history = await build_janitor_history(
+                    project_id,
+                    request.message,
+                    member["role"],
+                    recent_messages
+                )
                 
                 # Get Janitor AI response
                 janitor_response = await jllm_agent.get_response(
                     message=request.message,
                     chat_history=chat_history,
-                    project_context=f"{project.name}: {project.prompt}",
-                    team_members=team_context
+                    project_context=context.project_context,
+                    team_members=context.team_members,
+                    system_context=context.system_context
                 )
                 
                 # Add info about task detection
@@ -235,36 +315,26 @@ async def send_chat_message(
                     janitor_response += f"\n\n🤖 I detected this as a {task_analysis['reasoning']}. Routing to {task_analysis['model']} agent..."
                 
                 # Save AI message
-                ai_msg = ChatMessage(
+                ai_row = await chat_writer.write(
                     project_id=project_id,
                     user_id=None,  # AI has no user
                     message=janitor_response,
                     role="Facilitator",
                     is_ai=True
                 )
-                db.add(ai_msg)
-                db.commit()
-                db.refresh(ai_msg)
                 
-                print(f"✅ Janitor AI response saved: id={ai_msg.id}")
+                print(f"✅ Janitor AI response saved: id={ai_row['id']}")
+                chat_memory.index_message(ai_row, "Janitor AI")
+                
+                ai_message = serialize_message(ai_row, "Janitor AI")
+                messages_to_broadcast.append(ai_message)
                 
-                messages_to_broadcast.append({
-                    "id": ai_msg.id,
-                    "project_id": ai_msg.project_id,
-                    "message": ai_msg.message,
-                    "role": "Facilitator",
-                    "is_ai": True,
-                    "created_at": ai_msg.created_at.isoformat(),
-                    "author_name": "Janitor AI"
-                })
+                # 6. Broadcast the reply via WebSocket
+                await broadcast_message(sio, project_id, [ai_message])
         except Exception as janitor_error:
             print(f"⚠️ Janitor AI error (non-fatal): {str(janitor_error)}")
             # Continue without Janitor AI response - not critical
         
-        # 6. Broadcast via WebSocket
-        from main import sio
-        await broadcast_message(sio, project_id, messages_to_broadcast)
-        
         return {
             "success": True,
             "data": messages_to_broadcast
@@ -281,27 +351,21 @@ async def send_chat_message(
 async def get_chat_messages(
     project_id: int,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get chat message history"""
     try:
-        messages = db.query(ChatMessage).filter(
+        messages = (await db.scalars(select(ChatMessage).where(
             ChatMessage.project_id == project_id
-        ).order_by(ChatMessage.created_at.asc()).limit(limit).all()
+        ).order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()).limit(limit))).all()
+        
+        # Enrich with author names from the cached roster
+        context = await project_context_cache.get(db, project_id)
+        names_by_user = context.names_by_user if context else {}
         
-        # Enrich with author names
         result = []
         for msg in messages:
-            if msg.is_ai:
-                author_name = "Janitor AI"
-            elif msg.user_id:
-                stakeholder = db.query(Stakeholder).filter(
-                    Stakeholder.user_id == msg.user_id,
-                    Stakeholder.project_id == project_id
-                ).first()
-                author_name = stakeholder.name if stakeholder else "Unknown"
-            else:
-                author_name = "System"
+            author_name = chat_author_name(msg.is_ai, msg.user_id, msg.extra_data, names_by_user)
             
             result.append({
                 "id": msg.id,
@@ -324,52 +388,47 @@ async def get_chat_messages(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def execute_refinement_task(refinement_id: int, model: str, db: Session):
+async def execute_refinement_task(
+    refinement_id: int,
+    model: str,
+    db: AsyncSession,
+    attempt: int = 1,
+    final_attempt: bool = True
+):
     """
     Execute a refinement task with the appropriate AI agent
     Actually calls v0 or Claude to generate code changes
+    
+    Run by the refinement queue workers with a session they own. Unexpected
+    errors are raised to the queue, which retries the job or, on the final
+    attempt, marks it failed.
     """
     try:
-        refinement = db.query(Refinement).filter(Refinement.id == refinement_id).first()
+        refinement = await db.get(Refinement, refinement_id)
         if not refinement:
             print(f"❌ Refinement {refinement_id} not found")
             return
         
-        project = db.query(Project).filter(Project.id == refinement.project_id).first()
-        stakeholder = db.query(Stakeholder).filter(Stakeholder.id == refinement.stakeholder_id).first()
+        project = await db.get(Project, refinement.project_id)
+        stakeholder = await db.get(Stakeholder, refinement.stakeholder_id)
         
         refinement.status = "processing"
-        db.commit()
-        
-        # Send "working on it" message
-        working_msg = ChatMessage(
-            project_id=project.id,
-            user_id=None,
-            message=f"🤖 Working on it...\n\nTask: {refinement.request_text}\nAgent: {model.upper()}",
-            role="Facilitator",
-            is_ai=True
-        )
-        db.add(working_msg)
-        db.commit()
-        db.refresh(working_msg)
+        await db.commit()
+        refinement_events.publish(refinement)
         
-        # Broadcast "working" message
+        # Send and broadcast "working on it" message (once, not on retries)
         from main import sio
-        await broadcast_message(sio, project.id, [{
-            "id": working_msg.id,
-            "project_id": working_msg.project_id,
-            "message": working_msg.message,
-            "role": "Facilitator",
-            "is_ai": True,
-            "created_at": working_msg.created_at.isoformat(),
-            "author_name": "Janitor AI"
-        }])
+        if attempt == 1:
+            await post_janitor_message(
+                sio,
+                project.id,
+                f"🤖 Working on it...\n\nTask: {refinement.request_text}\nAgent: {model.upper()}"
+            )
         
         print(f"🚀 Executing refinement {refinement_id} with {model} agent")
         
         # Import agents
         from integrations.claude_api import claude_agent
-        import httpx
         
         files_changed = []
         new_preview_url = None
@@ -386,38 +445,39 @@ async def execute_refinement_task(refinement_id: int, model: str, db: Session):
                 # This is a workaround - ideally frontend handles v0
                 v0_api_key = os.getenv("V0_API_KEY")
                 if v0_api_key:
-                    async with httpx.AsyncClient(timeout=60.0) as client:
-                        response = await client.post(
-                            "https://api.v0.dev/v1/chat/completions",
-                            headers={
-                                "Authorization": f"Bearer {v0_api_key}",
-                                "Content-Type": "application/json"
-                            },
-                            json={
-                                "messages": [
-                                    {"role": "user", "content": refinement.request_text}
-                                ],
-                                "model": "v0-v1"
-                            }
-                        )
+                    response = await llm_gateway.post(
+                        "v0",
+                        "https://api.v0.dev/v1/chat/completions",
+                        headers={
+                            "Authorization": f"Bearer {v0_api_key}",
+                            "Content-Type": "application/json"
+                        },
+                        json={
+                            "messages": [
+                                {"role": "user", "content": refinement.request_text}
+                            ],
+                            "model": "v0-v1"
+                        },
+                        timeout=60.0
+                    )
+                    
+                    if response.status_code == 200:
+                        result = response.json()
+                        # Extract preview URL if available
+                        if "choices" in result and len(result["choices"]) > 0:
+                            content = result["choices"][0].get("message", {}).get("content", "")
+                            # v0 returns markdown with preview URLs
+                            import re
+                            preview_match = re.search(r'https://v0\.dev/chat/[a-zA-Z0-9\-]+', content)
+                            if preview_match:
+                                new_preview_url = preview_match.group(0)
+                                print(f"✅ Got new preview URL: {new_preview_url}")
                         
-                        if response.status_code == 200:
-                            result = response.json()
-                            # Extract preview URL if available
-                            if "choices" in result and len(result["choices"]) > 0:
-                                content = result["choices"][0].get("message", {}).get("content", "")
-                                # v0 returns markdown with preview URLs
-                                import re
-                                preview_match = re.search(r'https://v0\.dev/chat/[a-zA-Z0-9\-]+', content)
-                                if preview_match:
-                                    new_preview_url = preview_match.group(0)
-                                    print(f"✅ Got new preview URL: {new_preview_url}")
-                            
-                            files_changed = ["UI components updated"]
-                            success = True
-                        else:
-                            error_msg = f"v0 API error: {response.status_code}"
-                            print(f"❌ {error_msg}")
+                        files_changed = ["UI components updated"]
+                        success = True
+                    else:
+                        error_msg = f"v0 API error: {response.status_code}"
+                        print(f"❌ {error_msg}")
                 else:
                     error_msg = "V0_API_KEY not configured"
                     print(f"❌ {error_msg}")
@@ -427,14 +487,21 @@ async def execute_refinement_task(refinement_id: int, model: str, db: Session):
                 print(f"🧠 Calling Claude for backend task")
                 
                 if claude_agent:
-                    # Get existing code context (simplified)
-                    current_files = {}  # Would fetch from GitHub in production
-                    
-                    result_files = claude_agent.generate_backend_code(
+                    # Most relevant repo files the stakeholder's role covers, within the token budget
+                    from integrations.context_packer import context_packer
+
+                    context = await context_packer.pack(
+                        project,
+                        refinement.request_text,
+                        role=stakeholder.role if stakeholder else None
+                    )
+
+                    result_files = await claude_agent.generate_backend_code(
                         refinement_request=refinement.request_text,
-                        current_files=current_files,
-                        project_context=f"Project: {project.name}\n{project.prompt}",
-                        allowed_files=[]  # All files allowed
+                        current_files=context.files,
+                        project_context=context.project_context,
+                        allowed_files=context.allowed_files,
+                        base_files=context.sources  # Edits apply to full files, not the truncated view
                     )
                     
                     if result_files:
@@ -453,48 +520,40 @@ async def execute_refinement_task(refinement_id: int, model: str, db: Session):
             refinement.files_changed = files_changed
             refinement.error_message = error_msg
             refinement.completed_at = datetime.now(timezone.utc)
+            refinement.lease_expires_at = None
             
             # Update preview URL if we got a new one
             if new_preview_url:
                 project.v0_preview_url = new_preview_url
             
-            db.commit()
+            await db.commit()
+            refinement_events.publish(refinement)
             
-            # Send completion message
+            # Send and broadcast completion message
             if success:
-                completion_msg = ChatMessage(
-                    project_id=project.id,
-                    user_id=None,
-                    message=f"✅ Task completed!\n\n" +
-                            f"Changes: {', '.join(files_changed) if files_changed else 'UI updated'}\n" +
-                            (f"Preview: {new_preview_url}" if new_preview_url else "Check the preview panel →"),
-                    role="Facilitator",
-                    is_ai=True
+                completion_text = (
+                    f"✅ Task completed!\n\n" +
+                    f"Changes: {', '.join(files_changed) if files_changed else 'UI updated'}\n" +
+                    (f"Preview: {new_preview_url}" if new_preview_url else "Check the preview panel →")
                 )
             else:
-                completion_msg = ChatMessage(
-                    project_id=project.id,
-                    user_id=None,
-                    message=f"❌ Task failed: {error_msg}\n\n" +
-                            "You can try refining your request or check the logs.",
-                    role="Facilitator",
-                    is_ai=True
+                completion_text = (
+                    f"❌ Task failed: {error_msg}\n\n" +
+                    "You can try refining your request or check the logs."
                 )
             
-            db.add(completion_msg)
-            db.commit()
-            db.refresh(completion_msg)
+            await post_janitor_message(sio, project.id, completion_text)
             
-            # Broadcast completion
-            await broadcast_message(sio, project.id, [{
-                "id": completion_msg.id,
-                "project_id": completion_msg.project_id,
-                "message": completion_msg.message,
-                "role": "Facilitator",
-                "is_ai": True,
-                "created_at": completion_msg.created_at.isoformat(),
-                "author_name": "Janitor AI"
-            }])
+            # Keep the decision's outcome in chat memory
+            chat_memory.index_decision(
+                project.id,
+                refinement.id,
+                refinement.request_text,
+                stakeholder.role if stakeholder else None,
+                stakeholder.name if stakeholder else "Unknown",
+                status=refinement.status,
+                outcome=decision_outcome(refinement.status, files_changed, error_msg)
+            )
             
             print(f"✅ Refinement {refinement_id} {'completed' if success else 'failed'}!")
             
@@ -503,34 +562,20 @@ async def execute_refinement_task(refinement_id: int, model: str, db: Session):
             import traceback
             traceback.print_exc()
             
-            # Send error message
-            error_msg_obj = ChatMessage(
-                project_id=project.id,
-                user_id=None,
-                message=f"❌ Error executing task: {str(agent_error)}",
-                role="Facilitator",
-                is_ai=True
-            )
-            db.add(error_msg_obj)
-            db.commit()
-            db.refresh(error_msg_obj)
+            # Let the queue retry with backoff
+            if not final_attempt:
+                raise
             
-            await broadcast_message(sio, project.id, [{
-                "id": error_msg_obj.id,
-                "project_id": error_msg_obj.project_id,
-                "message": error_msg_obj.message,
-                "role": "Facilitator",
-                "is_ai": True,
-                "created_at": error_msg_obj.created_at.isoformat(),
-                "author_name": "Janitor AI"
-            }])
+            # Send error message
+            await post_janitor_message(sio, project.id, f"❌ Error executing task: {str(agent_error)}")
             
             refinement.status = "failed"
             refinement.error_message = str(agent_error)
-            db.commit()
+            refinement.lease_expires_at = None
+            await db.commit()
+            refinement_events.publish(refinement)
         
     except Exception as e:
         print(f"❌ Refinement execution error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        raise
 
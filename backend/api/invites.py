@@ -3,12 +3,15 @@ Invites API - Handle team invitation verification and activation
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
-from datetime import datetime, timezone
 
 from database import get_db
 from models import Stakeholder, Project, User
+from project_context import project_context_cache
+from ttl_store import ttl_store
+from api.auth import otp_key
 
 router = APIRouter()
 
@@ -25,17 +28,14 @@ async def verify_invite(
     code: str = Query(...),
     project: int = Query(...),
     stakeholder: int = Query(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Verify invite code and return invitation details
     """
     try:
-        # Import OTP storage from auth
-        from api.auth import otp_storage
-        
         # Find the stakeholder
-        stakeholder_record = db.query(Stakeholder).filter(Stakeholder.id == stakeholder).first()
+        stakeholder_record = await db.get(Stakeholder, stakeholder)
         if not stakeholder_record:
             return {
                 "success": False,
@@ -44,7 +44,7 @@ async def verify_invite(
             }
         
         # Verify the code matches in OTP storage
-        otp_data = otp_storage.get(stakeholder_record.email)
+        otp_data = await ttl_store.get(otp_key(stakeholder_record.email))
         if not otp_data:
             return {
                 "success": False,
@@ -59,14 +59,6 @@ async def verify_invite(
                 "data": None
             }
         
-        # Check if expired
-        if otp_data.get("expires_at") < datetime.now(timezone.utc):
-            return {
-                "success": False,
-                "error": "Invitation code has expired",
-                "data": None
-            }
-        
         # Verify it's a team invite
         if not otp_data.get("is_team_invite"):
             return {
@@ -76,7 +68,7 @@ async def verify_invite(
             }
         
         # Get project details
-        project_record = db.query(Project).filter(Project.id == project).first()
+        project_record = await db.get(Project, project)
         if not project_record:
             return {
                 "success": False,
@@ -85,7 +77,7 @@ async def verify_invite(
             }
         
         # Get inviter name
-        inviter = db.query(User).filter(User.id == project_record.owner_id).first()
+        inviter = await db.get(User, project_record.owner_id)
         inviter_name = "Team Lead"
         if inviter:
             inviter_name = inviter.name or inviter.email or "Project Creator"
@@ -116,24 +108,20 @@ async def verify_invite(
 @router.post("/invites/activate")
 async def activate_invite(
     request: ActivateInviteRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Activate stakeholder account and link to Clerk user
     
     Flow:
-    1. Verify OTP code
+    1. Verify and consume the OTP code (it works once)
     2. Get or create User with clerk_user_id
     3. Link stakeholder to user
     4. Update stakeholder status to 'active'
-    5. Clean up OTP
     """
     try:
-        # Import OTP storage from auth
-        from api.auth import otp_storage
-        
         # Find the stakeholder
-        stakeholder = db.query(Stakeholder).filter(Stakeholder.id == request.stakeholder_id).first()
+        stakeholder = await db.get(Stakeholder, request.stakeholder_id)
         if not stakeholder:
             return {
                 "success": False,
@@ -142,7 +130,7 @@ async def activate_invite(
             }
         
         # Verify the code
-        otp_data = otp_storage.get(stakeholder.email)
+        otp_data = await ttl_store.get(otp_key(stakeholder.email), fresh=True)
         if not otp_data or otp_data.get("otp") != request.code:
             return {
                 "success": False,
@@ -150,19 +138,20 @@ async def activate_invite(
                 "data": None
             }
         
-        # Check if expired
-        if otp_data.get("expires_at") < datetime.now(timezone.utc):
+        # Consume the code before linking; of concurrent activations only one wins
+        consumed = await ttl_store.pop(otp_key(stakeholder.email))
+        if not consumed or consumed.get("otp") != request.code:
             return {
                 "success": False,
-                "error": "Invitation code has expired",
+                "error": "Invitation code already used",
                 "data": None
             }
         
         # Get or create User with Clerk ID
-        user = db.query(User).filter(User.clerk_user_id == request.clerk_user_id).first()
+        user = await db.scalar(select(User).where(User.clerk_user_id == request.clerk_user_id).limit(1))
         if not user:
             # Check if user exists by email (might be anonymous)
-            user = db.query(User).filter(User.email == request.email).first()
+            user = await db.scalar(select(User).where(User.email == request.email).limit(1))
             if user:
                 # Upgrade anonymous user to Clerk user
                 user.clerk_user_id = request.clerk_user_id
@@ -174,17 +163,15 @@ async def activate_invite(
                     email=request.email
                 )
                 db.add(user)
-                db.flush()  # Get user ID
+                await db.flush()  # Get user ID
         
         # Link stakeholder to user
         stakeholder.user_id = user.id
         stakeholder.status = "active"
         
-        db.commit()
-        db.refresh(stakeholder)
-        
-        # Clean up OTP
-        otp_storage.pop(stakeholder.email, None)
+        await db.commit()
+        await db.refresh(stakeholder)
+        project_context_cache.invalidate(stakeholder.project_id)
         
         return {
             "success": True,
@@ -198,7 +185,7 @@ async def activate_invite(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Activate invite error: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -0,0 +1,133 @@
+"""
+Keyset pagination for list endpoints
+Opt-in via limit: opaque (created_at, id) cursors, bounded page sizes and load_only column projection
+"""
+
+import os
+import json
+import base64
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+DEFAULT_PAGE_SIZE = int(os.getenv("API_DEFAULT_PAGE_SIZE", "50"))  # For a cursor sent without a limit
+MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "200"))
+
+# Always loaded: the cursor is built from them
+KEY_FIELDS = ("id", "created_at")
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past (created_at, id)"""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Inverse of encode_cursor
+
+    Raises:
+        HTTPException: 400 for a malformed cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str], model, default: Sequence[str]) -> List[str]:
+    """
+    Columns to return for ?fields=a,b,c (default when omitted)
+
+    Raises:
+        HTTPException: 400 when a field is not a column of the model
+    """
+    if not fields:
+        requested = list(default)
+    else:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+
+    columns = set(model.__table__.columns.keys())
+    unknown = [f for f in requested if f not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    for key in reversed(KEY_FIELDS):
+        if key not in requested:
+            requested.insert(0, key)
+    return requested
+
+
+async def paginate(
+    db: AsyncSession,
+    stmt,
+    model,
+    fields: Sequence[str],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    descending: bool = True
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of stmt ordered by (created_at, id), or all of it
+
+    Without a limit or cursor every row is returned, as the endpoints did
+    before pagination, so existing callers keep getting complete lists.
+
+    The cursor becomes a row-value comparison on the ordering key, so with a
+    matching (…, created_at, id) index every page is an index range scan of
+    limit + 1 rows, however deep it is. Only the requested columns are loaded.
+
+    Args:
+        db: Async session
+        stmt: select(model) with the endpoint's filters applied
+        model: Mapped class with created_at and id columns
+        fields: Column names to load (from parse_fields)
+        cursor: next_cursor of the previous page
+        limit: Page size, clamped to 1..MAX_PAGE_SIZE; None for all rows
+        descending: Newest first (default) or oldest first
+
+    Returns:
+        (rows, next_cursor) - next_cursor is None on the last page
+    """
+    if limit is None and cursor:
+        limit = DEFAULT_PAGE_SIZE
+    key = tuple_(model.created_at, model.id)
+
+    if cursor:
+        after = tuple_(*decode_cursor(cursor))
+        stmt = stmt.where(key < after if descending else key > after)
+
+    if descending:
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        stmt = stmt.order_by(model.created_at.asc(), model.id.asc())
+
+    stmt = stmt.options(load_only(*(getattr(model, f) for f in fields)))
+    if limit is None:
+        return (await db.scalars(stmt)).all(), None
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = (await db.scalars(stmt.limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+def serialize(row, fields: Sequence[str]) -> Dict[str, Any]:
+    """Requested columns of a row, with dates as ISO strings"""
+    data = {}
+    for field in fields:
+        value = getattr(row, field)
+        data[field] = value.isoformat() if isinstance(value, (date, datetime)) else value
+    return data
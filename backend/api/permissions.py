@@ -3,8 +3,9 @@ Role-Based File Access Control
 Determines which files each stakeholder role can edit
 """
 
-from typing import List, Dict
-import fnmatch
+from typing import Iterable, List, Dict, Optional, Pattern, Set
+from functools import lru_cache
+import re
 
 # Role-based file patterns
 ROLE_PERMISSIONS: Dict[str, Dict[str, List[str]]] = {
@@ -60,6 +61,72 @@ ROLE_PERMISSIONS: Dict[str, Dict[str, List[str]]] = {
 }
 
 
+def _glob_to_regex(pattern: str) -> str:
+    """
+    Translate a gitignore-style glob into an (unanchored) regex
+    
+    - "*" and "?" never cross a "/"
+    - "**/" matches zero or more directories, a trailing "/**" everything below
+    - A pattern without "/" matches the file name at any depth ("*.css")
+    """
+    i, out = 0, []
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("(?:/.*)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    
+    regex = "".join(out)
+    if "/" not in pattern:
+        regex = f"(?:.*/)?{regex}"
+    return regex
+
+
+@lru_cache(maxsize=None)
+def _compiled(role: str) -> Optional[Pattern]:
+    """
+    One anchored regex per role: no blocked pattern matches (negative
+    lookahead) and some allowed pattern does. None for unknown roles.
+    """
+    permissions = ROLE_PERMISSIONS.get(role)
+    if not permissions:
+        return None
+    
+    allowed = "|".join(_glob_to_regex(p) for p in permissions["allowed"]) or "(?!)"
+    blocked = "|".join(_glob_to_regex(p) for p in permissions["blocked"])
+    
+    regex = f"(?:{allowed})\\Z"
+    if blocked:
+        regex = f"(?!(?:{blocked})\\Z){regex}"
+    return re.compile(regex)
+
+
+def _normalize(file_path: str) -> str:
+    return file_path[2:] if file_path.startswith("./") else file_path.lstrip("/")
+
+
+@lru_cache(maxsize=65536)
 def can_edit_file(role: str, file_path: str) -> bool:
     """
     Check if a stakeholder with given role can edit a file
@@ -71,21 +138,22 @@ def can_edit_file(role: str, file_path: str) -> bool:
     Returns:
         True if allowed, False otherwise
     """
-    permissions = ROLE_PERMISSIONS.get(role)
-    if not permissions:
-        return False
-    
-    # Check if explicitly blocked
-    for pattern in permissions["blocked"]:
-        if fnmatch.fnmatch(file_path, pattern):
-            return False
-    
-    # Check if allowed
-    for pattern in permissions["allowed"]:
-        if fnmatch.fnmatch(file_path, pattern):
-            return True
+    pattern = _compiled(role)
+    return bool(pattern and pattern.match(_normalize(file_path)))
+
+
+def filter_paths(role: str, paths: Iterable[str]) -> Set[str]:
+    """
+    The subset of paths a role can edit
     
-    return False
+    One compiled-regex match per path; use the returned set for O(1)
+    membership checks.
+    """
+    pattern = _compiled(role)
+    if pattern is None:
+        return set()
+    match = pattern.match
+    return {path for path in paths if match(_normalize(path))}
 
 
 def get_allowed_files(role: str, all_files: List[str]) -> List[str]:
@@ -97,9 +165,16 @@ def get_allowed_files(role: str, all_files: List[str]) -> List[str]:
         all_files: List of all file paths
     
     Returns:
-        Filtered list of allowed files
+        Filtered list of allowed files (input order)
     """
-    return [f for f in all_files if can_edit_file(role, f)]
+    allowed = filter_paths(role, all_files)
+    return [f for f in all_files if f in allowed]
+
+
+def clear_permission_cache():
+    """Forget compiled patterns and decisions after ROLE_PERMISSIONS changes"""
+    _compiled.cache_clear()
+    can_edit_file.cache_clear()
 
 
 def get_file_restrictions(role: str) -> Dict[str, List[str]]:
@@ -3,19 +3,38 @@ Projects API - REST endpoints for project management
 Now using PostgreSQL with SQLAlchemy
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timezone
+import os
+import json
+import hashlib
 
-from database import get_db
-from models import Project, User, Stakeholder, Branch, Refinement
+from database import get_db, get_read_db
+from models import Project, User, Stakeholder, Branch, Refinement, ChatMessage
+from api.pagination import paginate, parse_fields, serialize
 from integrations.chroma_client import chroma_search, generate_embedding
+from integrations.chat_memory import chat_memory
 from integrations.github_api import github_client
+from project_context import chat_author_name, project_context_cache
+from refinement_events import refinement_events
 
 router = APIRouter()
 
+# Default list columns; large text (prompt) only via ?fields=
+PROJECT_LIST_FIELDS = ("name", "status", "github_repo", "app_url", "owner_id", "updated_at")
+BRANCH_LIST_FIELDS = ("branch_name", "github_url", "status", "stakeholder_id")
+
+# Latest chat messages in /projects/{id}/overview (?messages= up to the max)
+OVERVIEW_MESSAGES = int(os.getenv("OVERVIEW_MESSAGES", "20"))
+OVERVIEW_MAX_MESSAGES = int(os.getenv("OVERVIEW_MAX_MESSAGES", "100"))
+OVERVIEW_STAKEHOLDER_FIELDS = ("id", "user_id", "name", "email", "role", "status", "github_branch", "created_at")
+OVERVIEW_BRANCH_FIELDS = ("id", "stakeholder_id", "branch_name", "github_url", "status", "created_at")
+
 
 class CreateProjectRequest(BaseModel):
     name: str
@@ -58,13 +77,13 @@ class ApiResponse(BaseModel):
 
 
 @router.post("/projects")
-async def create_project(request: CreateProjectRequest, db: Session = Depends(get_db)):
+async def create_project(request: CreateProjectRequest, db: AsyncSession = Depends(get_db)):
     """Create a new project"""
     
     # Get or create anonymous user (session-based)
     # For MVP: Users don't need accounts to generate apps!
     # They only sign up when they want to invite team members
-    user = db.query(User).filter(User.email == request.user_email).first()
+    user = await db.scalar(select(User).where(User.email == request.user_email).limit(1))
     if not user:
         # Create anonymous user with session_id
         import uuid
@@ -74,7 +93,7 @@ async def create_project(request: CreateProjectRequest, db: Session = Depends(ge
             email=request.user_email  # Store email for potential signup later
         )
         db.add(user)
-        db.flush()  # Get user ID
+        await db.flush()  # Get user ID
     
     # Create project
     project = Project(
@@ -85,8 +104,8 @@ async def create_project(request: CreateProjectRequest, db: Session = Depends(ge
     )
     
     db.add(project)
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
     
     return {
         "success": True,
@@ -106,36 +125,36 @@ async def create_project(request: CreateProjectRequest, db: Session = Depends(ge
 
 
 @router.get("/projects")
-async def list_projects(db: Session = Depends(get_db)):
-    """List all projects"""
+async def list_projects(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    List projects, newest first
     
-    projects = db.query(Project).order_by(Project.created_at.desc()).all()
+    All projects unless limit is given; then keyset-paginated: pass the
+    returned next_cursor to get the following page.
+    fields=a,b,c picks the columns to return; the prompt text is only loaded
+    when asked for.
+    """
+    columns = parse_fields(fields, Project, PROJECT_LIST_FIELDS)
+    projects, next_cursor = await paginate(db, select(Project), Project, columns, cursor, limit)
     
     return {
         "success": True,
-        "data": [
-            {
-                "id": p.id,
-                "name": p.name,
-                "prompt": p.prompt,
-                "status": p.status,
-                "github_repo": p.github_repo,
-                "app_url": p.app_url,
-                "owner_id": p.owner_id,
-                "created_at": p.created_at.isoformat(),
-                "updated_at": p.updated_at.isoformat() if p.updated_at else None
-            }
-            for p in projects
-        ],
+        "data": [serialize(p, columns) for p in projects],
+        "next_cursor": next_cursor,
         "error": None
     }
 
 
 @router.get("/projects/{project_id}")
-async def get_project(project_id: int, db: Session = Depends(get_db)):
+async def get_project(project_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get a specific project"""
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     
     if not project:
         return {
@@ -163,11 +182,102 @@ async def get_project(project_id: int, db: Session = Depends(get_db)):
     }
 
 
+@router.get("/projects/{project_id}/overview")
+async def get_project_overview(
+    project_id: int,
+    request: Request,
+    messages: int = OVERVIEW_MESSAGES,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Project dashboard in one round trip
+    
+    Project, stakeholders, branches, refinement counts by status and the
+    latest chat messages, in a fixed five queries: the project with its
+    stakeholders and branches (selectinload), one GROUP BY and one page of
+    messages. The response carries an ETag of its content; a request with a
+    matching If-None-Match gets 304 Not Modified.
+    """
+    project = await db.scalar(
+        select(Project)
+        .where(Project.id == project_id)
+        .options(selectinload(Project.stakeholders), selectinload(Project.branches))
+    )
+    
+    if not project:
+        return {
+            "success": False,
+            "data": None,
+            "error": "Project not found"
+        }
+    
+    status_counts = dict((await db.execute(
+        select(Refinement.status, func.count())
+        .where(Refinement.project_id == project_id)
+        .group_by(Refinement.status)
+    )).all())
+    
+    limit = max(0, min(messages, OVERVIEW_MAX_MESSAGES))
+    latest = (await db.scalars(
+        select(ChatMessage)
+        .where(ChatMessage.project_id == project_id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(limit)
+    )).all() if limit else []
+    
+    stakeholders = sorted(project.stakeholders, key=lambda s: s.id)
+    names_by_user = {s.user_id: s.name for s in stakeholders if s.user_id}
+    
+    data = {
+        "project": {
+            "id": project.id,
+            "name": project.name,
+            "prompt": project.prompt,
+            "status": project.status,
+            "github_repo": project.github_repo,
+            "app_url": project.app_url,
+            "v0_chat_id": project.v0_chat_id,
+            "v0_preview_url": project.v0_preview_url,
+            "owner_id": project.owner_id,
+            "created_at": project.created_at.isoformat(),
+            "updated_at": project.updated_at.isoformat() if project.updated_at else None
+        },
+        "stakeholders": [serialize(s, OVERVIEW_STAKEHOLDER_FIELDS) for s in stakeholders],
+        "branches": [serialize(b, OVERVIEW_BRANCH_FIELDS) for b in sorted(project.branches, key=lambda b: b.id)],
+        "refinements": {
+            "total": sum(status_counts.values()),
+            "by_status": {status or "unknown": count for status, count in status_counts.items()}
+        },
+        "messages": [
+            {
+                "id": m.id,
+                "message": m.message,
+                "role": m.role,
+                "is_ai": m.is_ai,
+                "created_at": m.created_at.isoformat(),
+                "author_name": chat_author_name(m.is_ai, m.user_id, m.extra_data, names_by_user)
+            }
+            for m in reversed(latest)
+        ]
+    }
+    
+    # Same content -> same ETag, so an unchanged dashboard revalidates with a 304
+    digest = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+    etag = f'"{digest[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    body = json.dumps({"success": True, "data": data, "error": None})
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.patch("/projects/{project_id}")
-async def update_project(project_id: int, updates: dict, db: Session = Depends(get_db)):
+async def update_project(project_id: int, updates: dict, db: AsyncSession = Depends(get_db)):
     """Update project status/URLs"""
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     
     if not project:
         return {
@@ -182,8 +292,9 @@ async def update_project(project_id: int, updates: dict, db: Session = Depends(g
         if field in allowed_fields and hasattr(project, field):
             setattr(project, field, value)
     
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
+    project_context_cache.invalidate(project_id)
     
     return {
         "success": True,
@@ -200,10 +311,10 @@ async def update_project(project_id: int, updates: dict, db: Session = Depends(g
 
 
 @router.delete("/projects/{project_id}")
-async def delete_project(project_id: int, db: Session = Depends(get_db)):
+async def delete_project(project_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a project"""
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     
     if not project:
         return {
@@ -215,10 +326,12 @@ async def delete_project(project_id: int, db: Session = Depends(get_db)):
     # Delete Chroma embeddings
     if chroma_search:
         chroma_search.delete_project_embeddings(str(project_id))
+    chat_memory.drop_project(project_id)
     
     # Delete project (cascades to stakeholders, branches, etc.)
-    db.delete(project)
-    db.commit()
+    await db.delete(project)
+    await db.commit()
+    project_context_cache.invalidate(project_id)
     
     return {
         "success": True,
@@ -228,10 +341,16 @@ async def delete_project(project_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/projects/{project_id}/branches")
-async def get_project_branches(project_id: int, db: Session = Depends(get_db)):
-    """Get branches for a project"""
+async def get_project_branches(
+    project_id: int,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get branches for a project, oldest first (keyset-paginated when limit is given)"""
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     
     if not project:
         return {
@@ -240,28 +359,30 @@ async def get_project_branches(project_id: int, db: Session = Depends(get_db)):
             "error": "Project not found"
         }
     
+    columns = parse_fields(fields, Branch, BRANCH_LIST_FIELDS)
+    branches, next_cursor = await paginate(
+        db,
+        select(Branch).where(Branch.project_id == project_id),
+        Branch,
+        columns,
+        cursor,
+        limit,
+        descending=False
+    )
+    
     return {
         "success": True,
-        "data": [
-            {
-                "id": b.id,
-                "branch_name": b.branch_name,
-                "github_url": b.github_url,
-                "status": b.status,
-                "stakeholder_id": b.stakeholder_id,
-                "created_at": b.created_at.isoformat()
-            }
-            for b in project.branches
-        ],
+        "data": [serialize(b, columns) for b in branches],
+        "next_cursor": next_cursor,
         "error": None
     }
 
 
 @router.get("/projects/{project_id}/agents")
-async def get_project_agents(project_id: int, db: Session = Depends(get_db)):
+async def get_project_agents(project_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get agents for a project (stub for now)"""
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     
     if not project:
         return {
@@ -279,7 +400,7 @@ async def get_project_agents(project_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/projects/save-to-github")
-async def save_to_github(request: SaveToGitHubRequest, db: Session = Depends(get_db)):
+async def save_to_github(request: SaveToGitHubRequest, db: AsyncSession = Depends(get_db)):
     """
     Save v0-generated project files to a new GitHub repository and update the project record with the repo details.
     
@@ -287,7 +408,7 @@ async def save_to_github(request: SaveToGitHubRequest, db: Session = Depends(get
     
     Parameters:
         request (SaveToGitHubRequest): Contains project_id, project_name, files, optional v0_preview_url and description used to create and populate the repository.
-        db (Session): Database session (dependency-injected); used to load and update the Project record.
+        db (AsyncSession): Database session (dependency-injected); used to load and update the Project record.
     
     Returns:
         dict: A response object with keys:
@@ -297,7 +418,7 @@ async def save_to_github(request: SaveToGitHubRequest, db: Session = Depends(get
     """
     try:
         # Verify project exists
-        project = db.query(Project).filter(Project.id == request.project_id).first()
+        project = await db.get(Project, request.project_id)
         if not project:
             return {
                 "success": False,
@@ -414,8 +535,8 @@ This project was created using the One-Prompt Startup Platform.
         project.v0_preview_url = request.v0_preview_url  # Save v0 preview URL
         project.updated_at = datetime.now(timezone.utc)
         
-        db.commit()
-        db.refresh(project)
+        await db.commit()
+        await db.refresh(project)
         
         print(f"Project saved to GitHub successfully!")
         
@@ -450,13 +571,13 @@ This project was created using the One-Prompt Startup Platform.
 
 
 @router.post("/projects/{project_id}/codebase")
-async def store_codebase(project_id: int, files: Dict[str, str], db: Session = Depends(get_db)):
+async def store_codebase(project_id: int, files: Dict[str, str], db: AsyncSession = Depends(get_db)):
     """
     Store generated codebase files in Chroma for semantic search
     Note: Files now stored in Chroma, not in-memory
     """
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     
     if not project:
         return {
@@ -504,13 +625,13 @@ async def store_codebase(project_id: int, files: Dict[str, str], db: Session = D
 
 
 @router.get("/projects/{project_id}/codebase")
-async def get_codebase(project_id: int, db: Session = Depends(get_db)):
+async def get_codebase(project_id: int, db: AsyncSession = Depends(get_read_db)):
     """
     Get codebase files from GitHub (not from Chroma)
     Use GitHub API to fetch actual files
     """
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     
     if not project:
         return {
@@ -531,10 +652,10 @@ async def get_codebase(project_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/projects/{project_id}/codebase/files")
-async def list_codebase_files(project_id: int, db: Session = Depends(get_db)):
+async def list_codebase_files(project_id: int, db: AsyncSession = Depends(get_read_db)):
     """List file structure (from Chroma metadata)"""
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     
     if not project:
         return {
@@ -583,14 +704,14 @@ async def semantic_search(
     project_id: int,
     query: str,
     n_results: int = 5,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Semantic code search powered by Chroma
     Find code by meaning, not just text match
     """
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     
     if not project:
         return {
@@ -639,7 +760,7 @@ async def semantic_search(
 async def get_latest_code(
     project_id: int,
     stakeholder_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Fetch latest code from GitHub for refinement
@@ -648,7 +769,7 @@ async def get_latest_code(
         All files from the GitHub repo, filtered by role permissions if stakeholder_id provided
     """
     try:
-        project = db.query(Project).filter(Project.id == project_id).first()
+        project = await db.get(Project, project_id)
         if not project:
             return {
                 "success": False,
@@ -678,12 +799,11 @@ async def get_latest_code(
         
         # If stakeholder_id provided, filter by permissions
         if stakeholder_id:
-            from api.permissions import get_allowed_files
+            from api.permissions import filter_paths
             
-            stakeholder = db.query(Stakeholder).filter(Stakeholder.id == stakeholder_id).first()
+            stakeholder = await db.get(Stakeholder, stakeholder_id)
             if stakeholder:
-                all_file_paths = list(files.keys())
-                allowed_paths = get_allowed_files(stakeholder.role, all_file_paths)
+                allowed_paths = filter_paths(stakeholder.role, files)
                 files = {path: content for path, content in files.items() if path in allowed_paths}
         
         return {
@@ -712,7 +832,7 @@ async def get_latest_code(
 async def create_branch_and_pr(
     project_id: int,
     request: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a GitHub branch for a project, push files to it, open a pull request, persist the branch record, and link the PR to the latest pending refinement for the stakeholder.
@@ -725,7 +845,7 @@ async def create_branch_and_pr(
             - files (dict): Mapping of file paths to file contents to push to the branch.
             - pr_title (str, optional): Title for the pull request.
             - pr_description (str, optional): Body/description for the pull request.
-        db (Session): Database session (injected dependency).
+        db (AsyncSession): Database session (injected dependency).
     
     Returns:
         dict: Response object with the following structure:
@@ -739,7 +859,7 @@ async def create_branch_and_pr(
             - error (str or None): Error message when success is `False`, otherwise `None`.
     """
     try:
-        project = db.query(Project).filter(Project.id == project_id).first()
+        project = await db.get(Project, project_id)
         if not project:
             return {"success": False, "error": "Project not found", "data": None}
         
@@ -748,7 +868,7 @@ async def create_branch_and_pr(
         
         # Get stakeholder
         stakeholder_id = request.get("stakeholder_id")
-        stakeholder = db.query(Stakeholder).filter(Stakeholder.id == stakeholder_id).first()
+        stakeholder = await db.get(Stakeholder, stakeholder_id)
         
         # Generate branch name if not provided
         branch_name = request.get("branch_name")
@@ -810,20 +930,21 @@ async def create_branch_and_pr(
             status="active"
         )
         db.add(branch_record)
-        db.commit()
-        db.refresh(branch_record)
+        await db.commit()
+        await db.refresh(branch_record)
         
         # 5. Update refinement with PR URL (if refinement exists)
-        latest_refinement = db.query(Refinement).filter(
+        latest_refinement = await db.scalar(select(Refinement).where(
             Refinement.project_id == project_id,
             Refinement.stakeholder_id == stakeholder_id,
             Refinement.status == "pending"
-        ).order_by(Refinement.created_at.desc()).first()
+        ).order_by(Refinement.created_at.desc()).limit(1))
         
         if latest_refinement:
             latest_refinement.pr_url = pr_result.get("pr_url")
             latest_refinement.status = "processing"
-            db.commit()
+            await db.commit()
+            refinement_events.publish(latest_refinement)
             print(f"✓ Linked PR to refinement #{latest_refinement.id}")
         
         return {
@@ -838,7 +959,7 @@ async def create_branch_and_pr(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Create branch and PR error: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -849,7 +970,7 @@ async def create_branch_and_pr(
 async def push_to_main(
     project_id: int,
     request: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Push changes directly to main branch (for anonymous users or quick updates)
@@ -861,7 +982,7 @@ async def push_to_main(
     }
     """
     try:
-        project = db.query(Project).filter(Project.id == project_id).first()
+        project = await db.get(Project, project_id)
         if not project:
             return {"success": False, "error": "Project not found", "data": None}
         
@@ -2,17 +2,36 @@
 Refinements API - Handle iterative MVP improvements
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import AsyncGenerator, Optional, List
 from datetime import datetime, timezone
+import os
+import json
+import time
+import asyncio
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Refinement, Project, Stakeholder
+from api.pagination import paginate, parse_fields, serialize
+from refinement_queue import refinement_queue
+from refinement_events import refinement_events
+from integrations.fetchai_router import fetchai_router
 
 router = APIRouter()
 
+# Columns of RefinementResponse
+REFINEMENT_LIST_FIELDS = ("project_id", "stakeholder_id", "request_text", "ai_model_used", "status", "pr_url")
+
+# Longest a ?wait= long poll is held open, and the SSE keep-alive interval
+REFINEMENT_LONG_POLL_MAX = float(os.getenv("REFINEMENT_LONG_POLL_MAX", "30"))
+REFINEMENT_SSE_HEARTBEAT = float(os.getenv("REFINEMENT_SSE_HEARTBEAT", "15"))
+# A waiting long poll re-reads the row this often, for changes no event reached this worker for
+REFINEMENT_LONG_POLL_RECHECK = float(os.getenv("REFINEMENT_LONG_POLL_RECHECK", "5"))
+
 
 class CreateRefinementRequest(BaseModel):
     project_id: int
@@ -40,7 +59,7 @@ class RefinementResponse(BaseModel):
 async def create_refinement(
     project_id: int,
     request: CreateRefinementRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new refinement request
@@ -49,12 +68,12 @@ async def create_refinement(
     1. Validate project and stakeholder
     2. Check role permissions
     3. Route to appropriate AI model (Fetch.ai)
-    4. Create refinement record
+    4. Create refinement record and enqueue it for the agent workers
     5. Return refinement ID for frontend to poll
     """
     try:
         # Verify project exists
-        project = db.query(Project).filter(Project.id == project_id).first()
+        project = await db.get(Project, project_id)
         if not project:
             return {
                 "success": False,
@@ -63,7 +82,7 @@ async def create_refinement(
             }
         
         # Verify stakeholder
-        stakeholder = db.query(Stakeholder).filter(Stakeholder.id == request.stakeholder_id).first()
+        stakeholder = await db.get(Stakeholder, request.stakeholder_id)
         if not stakeholder:
             return {
                 "success": False,
@@ -71,34 +90,44 @@ async def create_refinement(
                 "data": None
             }
         
-        # Create refinement record
+        # Pick the agent up front so workers can apply per-provider limits
+        routing = fetchai_router.route_refinement(
+            request_text=request.request_text,
+            stakeholder_role=stakeholder.role,
+            ai_model_preference=request.ai_model_preference or "auto"
+        )
+        
+        # Create refinement record ("pending" = queued)
         refinement = Refinement(
             project_id=project_id,
             stakeholder_id=request.stakeholder_id,
             request_text=request.request_text,
             ai_model_preference=request.ai_model_preference or "auto",
+            ai_model_used=routing["model"],
             status="pending"
         )
         
         db.add(refinement)
-        db.commit()
-        db.refresh(refinement)
+        await db.commit()
+        await db.refresh(refinement)
         
-        # TODO: Queue refinement for processing by AI agents
-        # This will be handled asynchronously
+        # Announce it, then wake the refinement workers
+        refinement_events.publish(refinement)
+        refinement_queue.notify()
         
         return {
             "success": True,
             "data": {
                 "refinement_id": refinement.id,
                 "status": refinement.status,
-                "message": "Refinement queued! AI agents are working on it."
+                "version": refinement.status_version,
+                "message": "Refinement queued! Status updates arrive as refinement:status events."
             },
             "error": None
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Create refinement error: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -109,21 +138,114 @@ async def create_refinement(
         }
 
 
-@router.get("/projects/{project_id}/refinements", response_model=List[RefinementResponse])
-async def list_refinements(project_id: int, db: Session = Depends(get_db)):
+@router.get("/projects/{project_id}/refinements")
+async def list_refinements(
+    project_id: int,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
     """
-    Get all refinements for a project
+    Get refinements for a project, newest first
+    
+    All of them unless limit is given; then keyset-paginated (pass
+    next_cursor back as cursor). fields=a,b,c picks the columns, e.g. add
+    error_message or files_changed.
     """
-    refinements = db.query(Refinement).filter(Refinement.project_id == project_id).order_by(Refinement.created_at.desc()).all()
-    return refinements
+    columns = parse_fields(fields, Refinement, REFINEMENT_LIST_FIELDS)
+    refinements, next_cursor = await paginate(
+        db,
+        select(Refinement).where(Refinement.project_id == project_id),
+        Refinement,
+        columns,
+        cursor,
+        limit
+    )
+    
+    return {
+        "success": True,
+        "data": [serialize(r, columns) for r in refinements],
+        "next_cursor": next_cursor,
+        "error": None
+    }
+
+
+@router.get("/projects/{project_id}/refinements/events")
+async def stream_refinement_events(project_id: int, request: Request):
+    """
+    Server-sent events: every status change of the project's refinements
+    
+    Each event is "refinement:status" with the same payload as the Socket.IO
+    event, including its status version. Holds no database connection.
+    """
+    queue = refinement_events.subscribe(project_id)
+    
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), REFINEMENT_SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield (
+                    "event: refinement:status\n"
+                    f"id: {event['refinement_id']}.{event['version']}\n"
+                    f"data: {json.dumps(event)}\n\n"
+                )
+        finally:
+            refinement_events.unsubscribe(project_id, queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def get_refinement_db(request: Request, wait: float = 0) -> AsyncGenerator[AsyncSession, None]:
+    """Primary for long polls: a replica may not have the change that woke them yet"""
+    sessions = get_db() if wait > 0 else get_read_db(request)
+    try:
+        async for db in sessions:
+            yield db
+    finally:
+        await sessions.aclose()
 
 
 @router.get("/refinements/{refinement_id}")
-async def get_refinement(refinement_id: int, db: Session = Depends(get_db)):
+async def get_refinement(
+    refinement_id: int,
+    wait: float = 0,
+    version: Optional[int] = None,
+    db: AsyncSession = Depends(get_refinement_db)
+):
     """
     Get refinement details including status
+    
+    Long poll: with ?wait=<seconds> the request blocks (up to
+    REFINEMENT_LONG_POLL_MAX) until the row's status_version moves past
+    ?version= (the "version" of the previous response), then returns the new
+    state. Without version it waits for the next change. Events wake it
+    early; the row is re-read every REFINEMENT_LONG_POLL_RECHECK seconds in
+    case the change happened on a worker whose events don't reach this one.
     """
-    refinement = db.query(Refinement).filter(Refinement.id == refinement_id).first()
+    refinement = await db.get(Refinement, refinement_id)
+    
+    if wait > 0 and refinement:
+        deadline = time.monotonic() + min(wait, REFINEMENT_LONG_POLL_MAX)
+        since = version if version is not None else refinement.status_version
+        while refinement and refinement.status_version <= since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Give the connection back while waiting so idle pollers hold none
+            await db.commit()
+            await refinement_events.wait(refinement_id, since, min(remaining, REFINEMENT_LONG_POLL_RECHECK))
+            refinement = await db.get(Refinement, refinement_id, populate_existing=True)
+    
     if not refinement:
         raise HTTPException(status_code=404, detail="Refinement not found")
     
@@ -138,7 +260,8 @@ async def get_refinement(refinement_id: int, db: Session = Depends(get_db)):
             "status": refinement.status,
             "pr_url": refinement.pr_url,
             "files_changed": refinement.files_changed,
-            "created_at": refinement.created_at
+            "created_at": refinement.created_at,
+            "version": refinement.status_version
         },
         "error": None
     }
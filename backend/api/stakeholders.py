@@ -6,16 +6,21 @@ Now using PostgreSQL with SQLAlchemy
 import os
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Stakeholder, Project, User
-from integrations.email_service import send_team_invite_email
+from api.pagination import paginate, parse_fields, serialize
+from email_outbox import email_outbox
+from project_context import project_context_cache
 
 router = APIRouter()
 
+STAKEHOLDER_LIST_FIELDS = ("project_id", "name", "email", "role", "github_branch")
+
 
 class CreateStakeholderRequest(BaseModel):
     name: str
@@ -37,12 +42,12 @@ class StakeholderResponse(BaseModel):
 async def add_stakeholder(
     project_id: int,
     request: CreateStakeholderRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Add a team member to the project"""
     
     # Verify project exists
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     if not project:
         return {
             "success": False,
@@ -51,7 +56,7 @@ async def add_stakeholder(
         }
     
     # Check if user exists with this email (auto-link)
-    user = db.query(User).filter(User.email == request.email).first()
+    user = await db.scalar(select(User).where(User.email == request.email).limit(1))
     user_id = user.id if user else None
     
     # Create stakeholder
@@ -65,8 +70,9 @@ async def add_stakeholder(
     )
     
     db.add(stakeholder)
-    db.commit()
-    db.refresh(stakeholder)
+    await db.commit()
+    await db.refresh(stakeholder)
+    project_context_cache.invalidate(project_id)
     
     print(f"✅ Created stakeholder for {request.email} (user_id: {user_id}, status: {stakeholder.status})")
     
@@ -87,11 +93,17 @@ async def add_stakeholder(
 
 
 @router.get("/projects/{project_id}/stakeholders")
-async def list_stakeholders(project_id: int, db: Session = Depends(get_db)):
-    """List all stakeholders for a project"""
+async def list_stakeholders(
+    project_id: int,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """List stakeholders for a project, oldest first (keyset-paginated when limit is given)"""
     
     # Verify project exists
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     if not project:
         return {
             "success": False,
@@ -99,24 +111,21 @@ async def list_stakeholders(project_id: int, db: Session = Depends(get_db)):
             "error": "Project not found"
         }
     
-    stakeholders = db.query(Stakeholder).filter(
-        Stakeholder.project_id == project_id
-    ).all()
+    columns = parse_fields(fields, Stakeholder, STAKEHOLDER_LIST_FIELDS)
+    stakeholders, next_cursor = await paginate(
+        db,
+        select(Stakeholder).where(Stakeholder.project_id == project_id),
+        Stakeholder,
+        columns,
+        cursor,
+        limit,
+        descending=False
+    )
     
     return {
         "success": True,
-        "data": [
-            {
-                "id": s.id,
-                "project_id": s.project_id,
-                "name": s.name,
-                "email": s.email,
-                "role": s.role,
-                "github_branch": s.github_branch,
-                "created_at": s.created_at.isoformat()
-            }
-            for s in stakeholders
-        ],
+        "data": [serialize(s, columns) for s in stakeholders],
+        "next_cursor": next_cursor,
         "error": None
     }
 
@@ -125,14 +134,14 @@ async def list_stakeholders(project_id: int, db: Session = Depends(get_db)):
 async def get_stakeholder(
     project_id: int,
     stakeholder_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific stakeholder"""
     
-    stakeholder = db.query(Stakeholder).filter(
+    stakeholder = await db.scalar(select(Stakeholder).where(
         Stakeholder.id == stakeholder_id,
         Stakeholder.project_id == project_id
-    ).first()
+    ).limit(1))
     
     if not stakeholder:
         return {
@@ -161,14 +170,14 @@ async def update_stakeholder(
     project_id: int,
     stakeholder_id: int,
     updates: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update stakeholder (role, branch, etc.)"""
     
-    stakeholder = db.query(Stakeholder).filter(
+    stakeholder = await db.scalar(select(Stakeholder).where(
         Stakeholder.id == stakeholder_id,
         Stakeholder.project_id == project_id
-    ).first()
+    ).limit(1))
     
     if not stakeholder:
         return {
@@ -183,8 +192,9 @@ async def update_stakeholder(
         if field in allowed_fields and hasattr(stakeholder, field):
             setattr(stakeholder, field, value)
     
-    db.commit()
-    db.refresh(stakeholder)
+    await db.commit()
+    await db.refresh(stakeholder)
+    project_context_cache.invalidate(project_id)
     
     return {
         "success": True,
@@ -204,14 +214,14 @@ async def update_stakeholder(
 async def remove_stakeholder(
     project_id: int,
     stakeholder_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Remove a stakeholder from the project"""
     
-    stakeholder = db.query(Stakeholder).filter(
+    stakeholder = await db.scalar(select(Stakeholder).where(
         Stakeholder.id == stakeholder_id,
         Stakeholder.project_id == project_id
-    ).first()
+    ).limit(1))
     
     if not stakeholder:
         return {
@@ -221,8 +231,9 @@ async def remove_stakeholder(
         }
     
     # Delete stakeholder
-    db.delete(stakeholder)
-    db.commit()
+    await db.delete(stakeholder)
+    await db.commit()
+    project_context_cache.invalidate(project_id)
     
     return {
         "success": True,
@@ -243,7 +254,7 @@ class InviteTeamMemberRequest(BaseModel):
 async def invite_team_member(
     project_id: int,
     request: InviteTeamMemberRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Invite team member to project
@@ -256,7 +267,7 @@ async def invite_team_member(
     """
     try:
         # Verify project exists
-        project = db.query(Project).filter(Project.id == project_id).first()
+        project = await db.get(Project, project_id)
         if not project:
             return {
                 "success": False,
@@ -265,10 +276,10 @@ async def invite_team_member(
             }
         
         # Check if stakeholder already exists
-        existing = db.query(Stakeholder).filter(
+        existing = await db.scalar(select(Stakeholder).where(
             Stakeholder.project_id == project_id,
             Stakeholder.email == request.email
-        ).first()
+        ).limit(1))
         
         if existing:
             return {
@@ -286,48 +297,46 @@ async def invite_team_member(
         )
         
         db.add(stakeholder)
-        db.commit()
-        db.refresh(stakeholder)
+        await db.commit()
+        await db.refresh(stakeholder)
+        project_context_cache.invalidate(project_id)
         
         # Generate invite OTP
-        from datetime import timezone, timedelta
+        from datetime import timedelta
         import secrets
         
         otp = str(secrets.randbelow(999999)).zfill(6)
-        expires_at = datetime.now(timezone.utc) + timedelta(minutes=30)
         
-        # Store OTP in auth storage (shared with auth.py)
-        from api.auth import otp_storage
-        otp_storage[request.email] = {
+        # Store OTP in the shared TTL store (verified by auth.py / invites.py)
+        from api.auth import otp_key
+        from ttl_store import ttl_store
+        await ttl_store.set(otp_key(request.email), {
             "otp": otp,
-            "expires_at": expires_at,
             "name": request.name,
             "is_existing_user": False,
             "is_team_invite": True,
             "project_id": project_id,
             "stakeholder_id": stakeholder.id
-        }
+        }, timedelta(minutes=30).total_seconds())
         
         # Get inviter name (project owner)
-        inviter = db.query(User).filter(User.id == project.owner_id).first()
+        inviter = await db.get(User, project.owner_id)
         if inviter:
             inviter_name = inviter.name or inviter.email or "Project Creator"
         else:
             inviter_name = "Team Lead"
         
-        # Send team invite email
-        email_sent = send_team_invite_email(
-            to_email=request.email,
-            inviter_name=inviter_name,
-            project_name=project.name,
-            otp=otp,
-            role=request.role,
-            project_id=project_id,
-            stakeholder_id=stakeholder.id,
-            invite_url=os.getenv("FRONTEND_URL", "http://localhost:3000")
-        )
+        # Queue the team invite email (delivered by the outbox worker)
+        invite_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
+        await email_outbox.enqueue(request.email, "team_invite", {
+            "inviter_name": inviter_name,
+            "project_name": project.name,
+            "otp": otp,
+            "role": request.role,
+            "join_link": f"{invite_url}/join?code={otp}&project={project_id}&stakeholder={stakeholder.id}"
+        })
         
-        if email_sent:
+        if email_outbox.delivers_email:
             return {
                 "success": True,
                 "data": {
@@ -339,7 +348,7 @@ async def invite_team_member(
                 "error": None
             }
         else:
-            # Fallback if email fails
+            # No mail provider configured: the code only goes to the console
             return {
                 "success": True,
                 "data": {
@@ -1,14 +1,20 @@
 from fastapi import APIRouter, Request, HTTPException, Depends, Header
-from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from datetime import datetime, timezone
+import hashlib
+import hmac
+import os
 
 from database import get_db
-from models import Refinement, Project, Branch
-from integrations.github_api import github_client
+from models import WebhookDelivery
+from webhook_queue import webhook_queue
 
 router = APIRouter()
 
+# Shared secret configured on the GitHub webhook; unset = signatures not checked
+GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET", "")
+
 """
 IMPORTANT: CodeRabbit Integration Clarification
 ===============================================
@@ -33,105 +39,77 @@ To integrate CodeRabbit:
 3. CodeRabbit will automatically review all future PRs
 """
 
-@router.post("/webhooks/github")
+@router.post("/webhooks/github", status_code=202)
 async def github_webhook(
     request: Request,
     x_github_event: Optional[str] = Header(None),
+    x_github_delivery: Optional[str] = Header(None),
     x_hub_signature_256: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Handle incoming GitHub webhook events and update PR-related refinement state.
+    Accept a GitHub webhook delivery and queue it for processing.
     
-    Processes "pull_request", "issue_comment", and "pull_request_review" events from GitHub. For pull_request events, updates the corresponding Refinement record (by PR URL) to reflect opened, closed+merged (completed), or closed-not-merged (failed) states and commits those changes to the database. For issue_comment and pull_request_review events, detects CodeRabbit-originated activity and logs a preview.
+    Verifies the X-Hub-Signature-256 HMAC when GITHUB_WEBHOOK_SECRET is set, then stores the raw body once per X-GitHub-Delivery (GitHub redeliveries and retries are acknowledged without being stored again) and returns 202. The webhook queue worker applies "pull_request" events to the Refinement with the matching PR URL and logs CodeRabbit "issue_comment" / "pull_request_review" activity, in batches.
     
     Parameters:
-        request (Request): The incoming FastAPI request containing the webhook JSON payload.
+        request (Request): The incoming FastAPI request; its raw body is what GitHub signed.
         x_github_event (Optional[str]): The GitHub event type from the `X-GitHub-Event` header (e.g., "pull_request", "issue_comment", "pull_request_review").
-        x_hub_signature_256 (Optional[str]): The `X-Hub-Signature-256` header value when a webhook secret is configured (used for payload verification if implemented).
-        db (Session): Database session (injected via dependency) used to query and update Refinement records.
+        x_github_delivery (Optional[str]): The unique delivery GUID from the `X-GitHub-Delivery` header; falls back to a hash of the body.
+        x_hub_signature_256 (Optional[str]): The `X-Hub-Signature-256` header, "sha256=<hex HMAC of the body>".
+        db (AsyncSession): Database session (injected via dependency) used to store the delivery.
     
     Returns:
         dict: A response object with keys:
-            - "success": `True` if the webhook was processed without error.
-            - "message": Short status message.
+            - "success": `True` once the delivery is stored (or was already).
+            - "message": "Webhook queued" or "Duplicate delivery".
             - "event": The GitHub event type received.
+            - "delivery_id": The de-duplication key.
     
     Raises:
-        HTTPException: Raised with status 500 if processing fails.
+        HTTPException: 401 for a missing or invalid signature, 500 if the delivery cannot be stored.
     """
+    body = await request.body()
+    
+    if GITHUB_WEBHOOK_SECRET:
+        expected = "sha256=" + hmac.new(GITHUB_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        if not x_hub_signature_256 or not hmac.compare_digest(x_hub_signature_256, expected):
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    
+    event_type = x_github_event or "unknown"
+    delivery_id = x_github_delivery or f"sha256:{hashlib.sha256(body).hexdigest()}"
+    
     try:
-        payload = await request.json()
-        event_type = x_github_event
-        
-        print(f"\n======================================================================")
-        print(f"GitHub Webhook Received: {event_type}")
-        print(f"======================================================================")
-        
-        if event_type == "pull_request":
-            action = payload.get("action")  # opened, closed, reopened, synchronize
-            pr_data = payload.get("pull_request", {})
-            pr_url = pr_data.get("html_url")
-            pr_state = pr_data.get("state")  # open, closed
-            merged = pr_data.get("merged", False)
-            
-            print(f"Action: {action}")
-            print(f"PR URL: {pr_url}")
-            print(f"State: {pr_state}, Merged: {merged}")
-            
-            # Update refinement status in database
-            if pr_url:
-                refinement = db.query(Refinement).filter(Refinement.pr_url == pr_url).first()
-                if refinement:
-                    if action == "opened":
-                        refinement.status = "processing"
-                    elif action == "closed" and merged:
-                        refinement.status = "completed"
-                        refinement.completed_at = datetime.now(timezone.utc)
-                    elif action == "closed" and not merged:
-                        refinement.status = "failed"
-                        refinement.error_message = "PR closed without merging"
-                    
-                    db.commit()
-                    print(f"✓ Updated refinement #{refinement.id} status to: {refinement.status}")
-        
-        elif event_type == "issue_comment":
-            # Track when CodeRabbit posts comments
-            comment_body = payload.get("comment", {}).get("body", "")
-            comment_user = payload.get("comment", {}).get("user", {}).get("login", "")
-            
-            if "coderabbit" in comment_user.lower():
-                print(f"✓ CodeRabbit comment detected")
-                print(f"  Preview: {comment_body[:200]}...")
-                # You could parse the comment to extract review scores, suggestions, etc.
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(WebhookDelivery).values(
+            id=delivery_id[:100],
+            event=event_type[:50],
+            payload=body.decode("utf-8", errors="replace"),
+            status="pending",
+            attempts=0
+        ).on_conflict_do_nothing(index_elements=[WebhookDelivery.id])
         
-        elif event_type == "pull_request_review":
-            # Track PR reviews (including CodeRabbit's)
-            review_state = payload.get("review", {}).get("state")  # approved, changes_requested, commented
-            review_body = payload.get("review", {}).get("body", "")
-            reviewer = payload.get("review", {}).get("user", {}).get("login", "")
-            
-            print(f"Review by {reviewer}: {review_state}")
-            if "coderabbit" in reviewer.lower():
-                print(f"✓ CodeRabbit review: {review_state}")
-        
-        print(f"======================================================================\n")
-        
-        return {
-            "success": True,
-            "message": "Webhook processed",
-            "event": event_type
-        }
-    
+        result = await db.execute(stmt)
+        await db.commit()
     except Exception as e:
-        print(f"❌ Error processing GitHub webhook: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        await db.rollback()
+        print(f"❌ Error storing GitHub webhook {delivery_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    duplicate = result.rowcount == 0
+    if not duplicate:
+        webhook_queue.notify()
+    
+    return {
+        "success": True,
+        "message": "Duplicate delivery" if duplicate else "Webhook queued",
+        "event": event_type,
+        "delivery_id": delivery_id
+    }
 
 
 @router.get("/webhooks/setup-instructions")
-async def webhook_setup_instructions():
+async def webhook_setup_instructions(request: Request):
     """
     Provide setup instructions for installing the CodeRabbit GitHub App and for configuring a GitHub webhook endpoint.
     
@@ -0,0 +1,246 @@
+"""
+Session token issuing and resolution
+Opaque tokens backed by the sessions table or HMAC-signed stateless tokens, resolved through an in-process cache
+"""
+
+import os
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import User, Session as DBSession
+from ttl_store import ttl_store
+
+SESSION_TTL = timedelta(days=int(os.getenv("SESSION_TTL_DAYS", "7")))
+# How long a resolved token is trusted without asking the database again;
+# also the longest a logout on another worker can go unnoticed here
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))
+SESSION_CACHE_MAX = int(os.getenv("SESSION_CACHE_MAX", "10000"))
+# Stateless tokens: signed with this secret, never stored (only revocations are)
+SESSION_TOKEN_SECRET = os.getenv("SESSION_TOKEN_SECRET", "")
+STATELESS_SESSIONS = os.getenv("STATELESS_SESSIONS", "false").lower() == "true"
+
+_STATELESS_PREFIX = "s2"  # Carries the profile; "s1" tokens (user id only) are still accepted
+_STATELESS_PREFIXES = ("s1.", "s2.")
+
+
+def hash_token(token: str) -> str:
+    """Hash session token for storage"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SESSION_TOKEN_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def _user_info(user: User) -> Dict:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "name": user.name,
+        "created_at": user.created_at.isoformat() if user.created_at else None
+    }
+
+
+class SessionResolver:
+    """
+    Token -> user resolution with a per-process LRU
+
+    A resolved token is cached by its hash until SESSION_CACHE_TTL passes or
+    the session expires, whichever is first, so steady-state auth checks are
+    a dict lookup. logout() drops the entry here at once; other workers stop
+    accepting the token within SESSION_CACHE_TTL.
+
+    With STATELESS_SESSIONS (and SESSION_TOKEN_SECRET) new tokens are
+    "s2.<claims>.<hmac>", the claims holding the user's profile: verifying
+    one needs no session or user row, only TTL store checks for a revocation
+    or a later profile change, whose misses are remembered locally for
+    SESSION_CACHE_TTL. The users table is read only after a profile change.
+    """
+
+    def __init__(
+        self,
+        cache_ttl: float = SESSION_CACHE_TTL,
+        max_entries: int = SESSION_CACHE_MAX,
+        stateless: bool = STATELESS_SESSIONS
+    ):
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self.stateless = stateless and bool(SESSION_TOKEN_SECRET)
+        if stateless and not SESSION_TOKEN_SECRET:
+            print("⚠️ STATELESS_SESSIONS needs SESSION_TOKEN_SECRET, using database sessions")
+        # token hash -> (user info, cached until epoch)
+        self._cache: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "rejected": 0, "revoked": 0}
+
+    async def issue(self, db: AsyncSession, user: User) -> str:
+        """New session token for a user (commits the session row if database-backed)"""
+        expires_at = datetime.now(timezone.utc) + SESSION_TTL
+
+        if self.stateless:
+            claims = {
+                **_user_info(user),
+                "exp": int(expires_at.timestamp()),
+                "iat": time.time(),
+                "jti": secrets.token_urlsafe(12)
+            }
+            encoded = base64.urlsafe_b64encode(json.dumps(claims, separators=(",", ":")).encode()).decode().rstrip("=")
+            payload = f"{_STATELESS_PREFIX}.{encoded}"
+            token = f"{payload}.{_sign(payload)}"
+        else:
+            token = secrets.token_urlsafe(32)
+            db.add(DBSession(user_id=user.id, token=hash_token(token), expires_at=expires_at))
+            await db.commit()
+
+        self._remember(hash_token(token), _user_info(user), expires_at.timestamp())
+        return token
+
+    async def resolve(self, db: AsyncSession, token: str) -> Optional[Dict]:
+        """
+        User info for a valid, unexpired token
+
+        Returns:
+            {"id", "email", "name", "created_at"}, or None for an invalid,
+            expired or revoked token (or a deleted user)
+        """
+        token_hash = hash_token(token)
+        cached = self._cache.get(token_hash)
+        if cached is not None:
+            user, valid_until = cached
+            if time.time() < valid_until:
+                self._cache.move_to_end(token_hash)
+                self.stats["hits"] += 1
+                return user
+            del self._cache[token_hash]
+
+        self.stats["misses"] += 1
+
+        if token.startswith(_STATELESS_PREFIXES):
+            found = await self._resolve_stateless(token)
+        else:
+            found = await self._resolve_stored(db, token_hash)
+        if found is None:
+            self.stats["rejected"] += 1
+            return None
+
+        user_id, expires_at, info = found
+        if info is None:
+            user = await db.get(User, user_id)
+            if not user:
+                self.stats["rejected"] += 1
+                return None
+            info = _user_info(user)
+
+        self._remember(token_hash, info, expires_at)
+        return info
+
+    async def _resolve_stored(self, db: AsyncSession, token_hash: str) -> Optional[Tuple[int, float, None]]:
+        row = (await db.execute(
+            select(DBSession.user_id, DBSession.expires_at).where(
+                DBSession.token == token_hash,
+                DBSession.expires_at > datetime.now(timezone.utc)
+            ).limit(1)
+        )).first()
+        if row is None:
+            return None
+        expires_at = row.expires_at
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return row.user_id, expires_at.timestamp(), None
+
+    async def _resolve_stateless(self, token: str) -> Optional[Tuple[int, float, Optional[Dict]]]:
+        """(user id, expiry epoch, profile or None when it must be read from users)"""
+        parsed = self._parse_stateless(token)
+        if parsed is None:
+            return None
+        user_id, expires_at, token_id, claims = parsed
+
+        revoked, profile_changed = await asyncio.gather(
+            ttl_store.get(f"revoked:{token_id}", remember_missing=self.cache_ttl),
+            ttl_store.get(f"profile:{user_id}", remember_missing=self.cache_ttl)
+        )
+        if revoked:
+            return None
+
+        profile = None
+        if claims is not None and not (profile_changed and profile_changed >= claims["iat"]):
+            profile = {key: claims[key] for key in ("id", "email", "name", "created_at")}
+        return user_id, expires_at, profile
+
+    def _parse_stateless(self, token: str) -> Optional[Tuple[int, float, str, Optional[Dict]]]:
+        """(user id, expiry epoch, token id, claims or None for an s1 token) of a correctly signed, unexpired token"""
+        if not SESSION_TOKEN_SECRET:
+            return None
+        try:
+            payload, signature = token.rsplit(".", 1)
+            if not hmac.compare_digest(signature, _sign(payload)):
+                return None
+            if payload.startswith("s1."):
+                _, user_id, expires_at, token_id = payload.split(".")
+                claims = None
+            else:
+                _, encoded = payload.split(".")
+                claims = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+                user_id, expires_at, token_id = claims["id"], claims["exp"], claims["jti"]
+            user_id, expires_at = int(user_id), float(expires_at)
+        except (ValueError, KeyError, TypeError):
+            return None
+        if expires_at <= time.time():
+            return None
+        return user_id, expires_at, token_id, claims
+
+    async def revoke(self, db: AsyncSession, token: str):
+        """Log a token out everywhere (immediately in this process)"""
+        token_hash = hash_token(token)
+        self._cache.pop(token_hash, None)
+        self.stats["revoked"] += 1
+
+        parsed = self._parse_stateless(token) if token.startswith(_STATELESS_PREFIXES) else None
+        if parsed is not None:
+            _, expires_at, token_id, _ = parsed
+            await ttl_store.set(f"revoked:{token_id}", True, max(1.0, expires_at - time.time()))
+            return
+
+        await db.execute(delete(DBSession).where(DBSession.token == token_hash))
+        await db.commit()
+
+    async def invalidate_user(self, user_id: int):
+        """
+        Drop cached resolutions of a user whose profile changed
+
+        Also records the change, so stateless tokens issued before it read
+        the profile from users instead of their claims (on other workers
+        within SESSION_CACHE_TTL).
+        """
+        for token_hash in [h for h, (user, _) in self._cache.items() if user["id"] == user_id]:
+            del self._cache[token_hash]
+        if SESSION_TOKEN_SECRET:
+            await ttl_store.set(f"profile:{user_id}", time.time(), SESSION_TTL.total_seconds())
+
+    def _remember(self, token_hash: str, user: Dict, expires_at: float):
+        self._cache[token_hash] = (user, min(expires_at, time.time() + self.cache_ttl))
+        self._cache.move_to_end(token_hash)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "cached": len(self._cache),
+            "mode": "stateless" if self.stateless else "database"
+        }
+
+
+# Global instance
+session_resolver = SessionResolver()
@@ -0,0 +1,162 @@
+"""
+Reconnect-with-cursor replay for Socket.IO chat rooms
+Bounded per-room ring buffer of recent broadcasts with a DB fallback for larger gaps
+"""
+
+import os
+import bisect
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from models import ChatMessage
+from project_context import chat_author_name, project_context_cache
+
+CHAT_REPLAY_BUFFER_SIZE = int(os.getenv("CHAT_REPLAY_BUFFER_SIZE", "200"))
+CHAT_REPLAY_MAX_ROOMS = int(os.getenv("CHAT_REPLAY_MAX_ROOMS", "1000"))
+CHAT_REPLAY_DB_LIMIT = int(os.getenv("CHAT_REPLAY_DB_LIMIT", "500"))
+CHAT_REPLAY_CHUNK_SIZE = int(os.getenv("CHAT_REPLAY_CHUNK_SIZE", "50"))
+# Seconds to wait for the client to acknowledge a replay chunk
+CHAT_REPLAY_ACK_TIMEOUT = float(os.getenv("CHAT_REPLAY_ACK_TIMEOUT", "10"))
+# The buffer only sees this process's broadcasts, so it is trusted only when
+# this process is the sole chat writer; otherwise every replay reads the DB
+CHAT_REPLAY_SINGLE_WRITER = os.getenv(
+    "CHAT_REPLAY_SINGLE_WRITER",
+    "true" if int(os.getenv("WEB_CONCURRENCY", "1")) <= 1 else "false"
+).lower() == "true"
+
+
+class _RoomBuffer:
+    """Recent messages for one room, sorted by id"""
+
+    def __init__(self, first_id: int):
+        self.ids: List[int] = []
+        self.messages: List[Dict] = []
+        # Every message in this room with id > floor is in the buffer
+        self.floor = first_id - 1
+
+    def add(self, message: Dict, capacity: int):
+        # Broadcasts can arrive out of id order; insert in place
+        message_id = message["id"]
+        index = bisect.bisect_left(self.ids, message_id)
+        if index < len(self.ids) and self.ids[index] == message_id:
+            return
+        self.ids.insert(index, message_id)
+        self.messages.insert(index, message)
+
+        if len(self.ids) > capacity:
+            self.floor = max(self.floor, self.ids[0])
+            del self.ids[0]
+            del self.messages[0]
+
+    def since(self, last_seen_id: int) -> Optional[List[Dict]]:
+        if last_seen_id < self.floor:
+            return None
+        return self.messages[bisect.bisect_right(self.ids, last_seen_id):]
+
+
+class ChatReplayBuffer:
+    """
+    Per-room replay of recently broadcast chat messages
+
+    Rooms are keyed like the Socket.IO rooms (str(project_id)). Only
+    broadcasts from this process are recorded, so the buffer is used only in
+    single-writer mode; a cursor older than a room's buffer, or any cursor
+    when several processes write, is served from the chat_messages table.
+    """
+
+    def __init__(
+        self,
+        capacity: int = CHAT_REPLAY_BUFFER_SIZE,
+        max_rooms: int = CHAT_REPLAY_MAX_ROOMS,
+        db_limit: int = CHAT_REPLAY_DB_LIMIT,
+        single_writer: bool = CHAT_REPLAY_SINGLE_WRITER
+    ):
+        self.capacity = capacity
+        self.max_rooms = max_rooms
+        self.db_limit = db_limit
+        self.single_writer = single_writer
+        self._rooms: "OrderedDict[str, _RoomBuffer]" = OrderedDict()
+        self.stats = {"buffer_replays": 0, "db_replays": 0}
+
+    def record(self, room_id: str, messages: List[Dict]):
+        """Remember broadcast messages for later replay"""
+        if not messages or not self.single_writer:
+            return
+
+        room = self._rooms.get(room_id)
+        if room is None:
+            room = _RoomBuffer(min(m["id"] for m in messages))
+            self._rooms[room_id] = room
+            while len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+        self._rooms.move_to_end(room_id)
+
+        for message in messages:
+            room.add(message, self.capacity)
+
+    async def replay(self, room_id: str, last_seen_id: int) -> Dict:
+        """
+        Get messages newer than the client's cursor
+
+        Returns:
+            {"messages": [...], "source": "buffer" | "db", "truncated": bool}
+            truncated means the gap exceeded the DB limit and the client should
+            reload history over REST.
+        """
+        room = self._rooms.get(room_id)
+        if room is not None:
+            missed = room.since(last_seen_id)
+            if missed is not None:
+                self.stats["buffer_replays"] += 1
+                return {"messages": missed, "source": "buffer", "truncated": False}
+
+        self.stats["db_replays"] += 1
+        messages = await self._load_since(room_id, last_seen_id)
+        truncated = len(messages) > self.db_limit
+        return {
+            "messages": messages[:self.db_limit],
+            "source": "db",
+            "truncated": truncated
+        }
+
+    async def _load_since(self, room_id: str, last_seen_id: int) -> List[Dict]:
+        try:
+            project_id = int(room_id)
+        except (TypeError, ValueError):
+            return []
+
+        async with AsyncSessionLocal() as db:
+            rows = (await db.scalars(
+                select(ChatMessage).where(
+                    ChatMessage.project_id == project_id,
+                    ChatMessage.id > last_seen_id
+                ).order_by(ChatMessage.id.asc()).limit(self.db_limit + 1)
+            )).all()
+
+            context = await project_context_cache.get(db, project_id)
+            names_by_user = context.names_by_user if context else {}
+
+            return [
+                {
+                    "id": m.id,
+                    "project_id": m.project_id,
+                    "message": m.message,
+                    "role": m.role,
+                    "is_ai": m.is_ai,
+                    "created_at": m.created_at.isoformat(),
+                    "author_name": chat_author_name(m.is_ai, m.user_id, m.extra_data, names_by_user)
+                }
+                for m in rows
+            ]
+
+
+def chunk_messages(messages: List[Dict], size: int = CHAT_REPLAY_CHUNK_SIZE) -> List[List[Dict]]:
+    """Split a replay into emit-sized chunks"""
+    return [messages[i:i + size] for i in range(0, len(messages), size)]
+
+
+# Global instance
+chat_replay = ChatReplayBuffer()
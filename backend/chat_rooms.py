@@ -0,0 +1,401 @@
+"""
+Durable MCP chat room store
+Bounded in-memory ring buffers backed by chat_messages, with per-room counters
+"""
+
+import os
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import ChatMessage, ChatRoom, Project
+from chat_writer import chat_writer
+from project_context import chat_author_name
+
+MCP_ROOM_BUFFER_SIZE = int(os.getenv("MCP_ROOM_BUFFER_SIZE", "200"))
+MCP_ROOM_MAX_ROOMS = int(os.getenv("MCP_ROOM_MAX_ROOMS", "500"))
+MCP_ROOM_FLUSH_INTERVAL = float(os.getenv("MCP_ROOM_FLUSH_INTERVAL", "5"))
+# Participant ids kept per room; the reported count stops growing at this cap
+MCP_ROOM_MAX_PARTICIPANTS = int(os.getenv("MCP_ROOM_MAX_PARTICIPANTS", "1000"))
+
+
+class _Room:
+    """In-memory state for one room"""
+
+    __slots__ = ("room_id", "project_id", "messages", "message_count",
+                 "participants", "pending_count", "dirty")
+
+    def __init__(self, room_id: str, project_id: Optional[int], message_count: int,
+                 participants: List[str], messages: List[Tuple], capacity: int):
+        self.room_id = room_id
+        self.project_id = project_id
+        # Compact entries: (timestamp, user_id, role, content, is_ai)
+        self.messages = deque(messages, maxlen=capacity)
+        self.message_count = message_count
+        self.participants = set(participants[:MCP_ROOM_MAX_PARTICIPANTS])
+        self.pending_count = 0  # Messages not yet added to the persisted counter
+        self.dirty = False
+
+
+def _to_entry(item: Tuple) -> Dict:
+    timestamp, user_id, role, content, is_ai = item
+    entry = {
+        "timestamp": timestamp,
+        "user_id": user_id,
+        "role": role,
+        "content": content
+    }
+    if is_ai:
+        entry["ai_response"] = True
+    return entry
+
+
+def _add_participant(participants, user_id: str):
+    if len(participants) < MCP_ROOM_MAX_PARTICIPANTS:
+        participants.add(user_id)
+
+
+class ChatRoomStore:
+    """
+    Bounded, persistent store for MCP chat rooms
+
+    Rooms whose id is a project id persist their messages to chat_messages
+    (through the group-commit writer), broadcast them to the project chat and
+    reload the latest ones on a cold start. Other rooms keep messages in
+    memory only. Message and participant counters live in mcp_chat_rooms and
+    are flushed write-behind, so listing rooms is one query over that table;
+    project-room counters follow every chat_writer commit, web chat included.
+    Participant ids are capped at MCP_ROOM_MAX_PARTICIPANTS per room.
+    """
+
+    def __init__(
+        self,
+        capacity: int = MCP_ROOM_BUFFER_SIZE,
+        max_rooms: int = MCP_ROOM_MAX_ROOMS,
+        flush_interval: float = MCP_ROOM_FLUSH_INTERVAL
+    ):
+        self.capacity = capacity
+        self.max_rooms = max_rooms
+        self.flush_interval = flush_interval
+        self._rooms: "OrderedDict[str, _Room]" = OrderedDict()
+        self._flusher: Optional[asyncio.Task] = None
+        # Counter deltas for project rooms that are not resident
+        self._detached: Dict[str, int] = {}
+        chat_writer.subscribe(self._on_committed)
+
+    async def get_room(self, room_id: str, create: bool = False) -> Optional[_Room]:
+        """Get a room, loading it from the database if it is not resident"""
+        room = self._rooms.get(room_id)
+        if room is not None:
+            self._rooms.move_to_end(room_id)
+            return room
+
+        room, created = await asyncio.to_thread(self._load_room, room_id, create)
+        if room is None:
+            return None
+        if created:
+            # The new row already counts every committed message
+            self._detached.pop(room_id, None)
+
+        # Another request may have loaded it while we were in the thread
+        if room_id in self._rooms:
+            return self._rooms[room_id]
+
+        self._rooms[room_id] = room
+        await self._evict()
+        return room
+
+    async def append(
+        self,
+        room_id: str,
+        user_id: str,
+        role: str,
+        content: str,
+        is_ai: bool = False
+    ) -> Tuple[int, Dict]:
+        """
+        Add a message to a room
+
+        Returns:
+            (message index within the room, message entry)
+        """
+        room = await self.get_room(room_id, create=True)
+
+        if room.project_id is not None:
+            # Buffered and counted by _on_committed, like web chat messages
+            row = await chat_writer.write(
+                project_id=room.project_id,
+                user_id=None,
+                message=content,
+                role=role,
+                is_ai=is_ai,
+                extra_data={"source": "mcp", "mcp_user_id": user_id}
+            )
+
+            from main import sio
+            from api.chat import broadcast_message, serialize_message
+            author_name = chat_author_name(is_ai, None, row["extra_data"], {})
+            await broadcast_message(sio, room.project_id, [serialize_message(row, author_name)])
+
+            item = (row["created_at"].isoformat(), user_id, role, content, is_ai)
+            return room.message_count - 1, _to_entry(item)
+
+        item = (datetime.utcnow().isoformat(), user_id, role, content, is_ai)
+        room.messages.append(item)
+        room.message_count += 1
+        room.pending_count += 1
+        _add_participant(room.participants, user_id)
+        room.dirty = True
+        self._ensure_flusher()
+
+        return room.message_count - 1, _to_entry(item)
+
+    def recent(self, room: _Room, limit: int) -> List[Dict]:
+        """Latest messages of a room (bounded by the ring size)"""
+        items = list(room.messages)
+        return [_to_entry(item) for item in items[-limit:]] if limit > 0 else []
+
+    async def get_summary(self, room_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self._read_summary, room_id)
+
+    async def set_summary(self, room_id: str, summary: str):
+        await asyncio.to_thread(self._write_summary, room_id, summary)
+
+    async def list_rooms(self) -> List[Dict]:
+        """Room ids with message and participant counts"""
+        await self.flush()
+        rows = await asyncio.to_thread(self._read_counters)
+        return [
+            {
+                "room_id": room_id,
+                "message_count": message_count,
+                "participants": len(participants or [])
+            }
+            for room_id, message_count, participants in rows
+        ]
+
+    async def flush(self):
+        """Persist pending counter deltas for dirty rooms"""
+        dirty = [room for room in self._rooms.values() if room.dirty]
+        if dirty or self._detached:
+            await self._flush_rooms(dirty)
+
+    async def close(self):
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+        self._flusher = None
+        await self.flush()
+
+    # ---------- internals ----------
+
+    def _on_committed(self, rows: List[Dict[str, Any]]):
+        """Keep project rooms in step with every chat_messages commit"""
+        for row in rows:
+            room_id = str(row["project_id"])
+            room = self._rooms.get(room_id)
+            if room is None:
+                self._detached[room_id] = self._detached.get(room_id, 0) + 1
+                continue
+
+            mcp_user_id = (row["extra_data"] or {}).get("mcp_user_id")
+            user_id = mcp_user_id or ("facilitator" if row["is_ai"] else str(row["user_id"]))
+            room.messages.append((
+                row["created_at"].isoformat(),
+                user_id,
+                row["role"],
+                row["message"],
+                bool(row["is_ai"])
+            ))
+            room.message_count += 1
+            room.pending_count += 1
+            if mcp_user_id or row["is_ai"] or row["user_id"] is not None:
+                _add_participant(room.participants, user_id)
+            room.dirty = True
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            # Long-lived: don't inherit the first caller's request context
+            self._flusher = contextvars.Context().run(asyncio.create_task, self._run_flusher())
+
+    async def _run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Chat room counter flush failed: {e}")
+
+    async def _evict(self):
+        evicted = []
+        while len(self._rooms) > self.max_rooms:
+            _, room = self._rooms.popitem(last=False)
+            if room.dirty:
+                evicted.append(room)
+        if evicted:
+            await self._flush_rooms(evicted)
+
+    async def _flush_rooms(self, rooms: List[_Room]):
+        updates = [(room.room_id, room.pending_count, sorted(room.participants)) for room in rooms]
+        for room in rooms:
+            room.dirty = False
+        detached, self._detached = self._detached, {}
+        updates += [(room_id, delta, []) for room_id, delta in detached.items()]
+
+        try:
+            merged = await asyncio.to_thread(self._write_counters, updates)
+        except Exception:
+            for room in rooms:
+                room.dirty = True
+            for room_id, delta in detached.items():
+                self._detached[room_id] = self._detached.get(room_id, 0) + delta
+            raise
+
+        for room, (_, delta, _) in zip(rooms, updates):
+            room.pending_count -= delta
+            room.participants.update(merged.get(room.room_id, []))
+
+    def _load_room(self, room_id: str, create: bool) -> Tuple[Optional[_Room], bool]:
+        db = SessionLocal()
+        try:
+            row = db.query(ChatRoom).filter(ChatRoom.room_id == room_id).first()
+            created = row is None
+
+            project_id = None
+            if row is not None:
+                project_id = row.project_id
+            elif room_id.isdigit():
+                if db.query(Project.id).filter(Project.id == int(room_id)).first():
+                    project_id = int(room_id)
+
+            if row is None:
+                if not create and project_id is None:
+                    return None, False
+                row = self._create_row(db, room_id, project_id)
+
+            messages = []
+            if project_id is not None:
+                recent = db.query(ChatMessage).filter(
+                    ChatMessage.project_id == project_id
+                ).order_by(ChatMessage.id.desc()).limit(self.capacity).all()
+
+                for m in reversed(recent):
+                    extra = m.extra_data or {}
+                    user_id = extra.get("mcp_user_id") or (
+                        "facilitator" if m.is_ai else str(m.user_id)
+                    )
+                    messages.append((
+                        m.created_at.isoformat() if m.created_at else None,
+                        user_id,
+                        m.role,
+                        m.message,
+                        bool(m.is_ai)
+                    ))
+
+            return _Room(
+                room_id,
+                project_id,
+                row.message_count or 0,
+                row.participants or [],
+                messages,
+                self.capacity
+            ), created
+        finally:
+            db.close()
+
+    def _create_row(self, db, room_id: str, project_id: Optional[int]) -> ChatRoom:
+        message_count = 0
+        participants: List[str] = []
+
+        # Project rooms start from the existing project chat
+        if project_id is not None:
+            message_count = db.query(func.count(ChatMessage.id)).filter(
+                ChatMessage.project_id == project_id
+            ).scalar() or 0
+            participants = [
+                str(user_id) for (user_id,) in db.query(ChatMessage.user_id).filter(
+                    ChatMessage.project_id == project_id,
+                    ChatMessage.user_id.isnot(None)
+                ).distinct().limit(MCP_ROOM_MAX_PARTICIPANTS)
+            ]
+
+        row = ChatRoom(
+            room_id=room_id,
+            project_id=project_id,
+            message_count=message_count,
+            participants=participants
+        )
+        db.add(row)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Created concurrently by another worker
+            db.rollback()
+            row = db.query(ChatRoom).filter(ChatRoom.room_id == room_id).first()
+        return row
+
+    def _write_counters(self, updates: List[Tuple[str, int, List[str]]]) -> Dict[str, List[str]]:
+        db = SessionLocal()
+        try:
+            merged = {}
+            for room_id, delta, participants in updates:
+                row = db.query(ChatRoom).filter(
+                    ChatRoom.room_id == room_id
+                ).with_for_update().first()
+                if row is None:
+                    continue
+                row.message_count = ChatRoom.message_count + delta
+                row.participants = sorted(
+                    set(row.participants or []) | set(participants)
+                )[:MCP_ROOM_MAX_PARTICIPANTS]
+                merged[room_id] = row.participants
+            db.commit()
+            return merged
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _read_counters(self) -> List[Tuple[str, int, List[str]]]:
+        db = SessionLocal()
+        try:
+            return [
+                (row.room_id, row.message_count, row.participants)
+                for row in db.query(
+                    ChatRoom.room_id,
+                    ChatRoom.message_count,
+                    ChatRoom.participants
+                ).order_by(ChatRoom.room_id)
+            ]
+        finally:
+            db.close()
+
+    def _read_summary(self, room_id: str) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            row = db.query(ChatRoom.summary).filter(ChatRoom.room_id == room_id).first()
+            return row.summary if row else None
+        finally:
+            db.close()
+
+    def _write_summary(self, room_id: str, summary: str):
+        db = SessionLocal()
+        try:
+            db.query(ChatRoom).filter(ChatRoom.room_id == room_id).update(
+                {ChatRoom.summary: summary},
+                synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+# Global instance
+chat_room_store = ChatRoomStore()
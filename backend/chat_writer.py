@@ -0,0 +1,181 @@
+"""
+Write-behind chat persistence
+Batches chat message inserts from concurrent senders into group commits
+"""
+
+import os
+import asyncio
+import contextvars
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from database import SessionLocal, note_write
+from models import ChatMessage
+
+# Flush window and batch cap for group commits
+CHAT_FLUSH_WINDOW_MS = float(os.getenv("CHAT_FLUSH_WINDOW_MS", "5"))
+CHAT_MAX_BATCH = int(os.getenv("CHAT_MAX_BATCH", "200"))
+
+
+class ChatWriteBuffer:
+    """
+    Group-commit writer for chat messages
+
+    Every caller awaits its own row, but rows queued within the same flush
+    window are inserted with one multi-row INSERT ... RETURNING and a single
+    commit. A single flusher drains the queue in FIFO order, so ids (and
+    therefore per-room ordering) follow submission order.
+    """
+
+    def __init__(
+        self,
+        flush_window_ms: float = CHAT_FLUSH_WINDOW_MS,
+        max_batch: int = CHAT_MAX_BATCH
+    ):
+        self.flush_window = flush_window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self.stats = {"messages": 0, "commits": 0, "failed_batches": 0}
+
+    def subscribe(self, callback: Callable[[List[Dict[str, Any]]], None]):
+        """Call callback(rows) with the inserted rows after every committed batch"""
+        self._listeners.append(callback)
+
+    async def write(
+        self,
+        project_id: int,
+        user_id: Optional[int],
+        message: str,
+        role: Optional[str],
+        is_ai: bool = False,
+        extra_data: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue a chat message and wait until its batch is committed
+
+        Returns:
+            The inserted row as a dict, including the assigned id and created_at
+        """
+        row = {
+            "project_id": project_id,
+            "user_id": user_id,
+            "message": message,
+            "role": role,
+            "is_ai": is_ai,
+            "extra_data": extra_data
+        }
+        # The insert runs in the flusher, outside the caller's request
+        note_write()
+        future = asyncio.get_running_loop().create_future()
+        self._ensure_flusher()
+        await self._queue.put((row, future))
+        return await future
+
+    async def close(self):
+        """Flush everything still queued and stop the flusher"""
+        if self._flusher and not self._flusher.done():
+            await self._queue.put(None)
+            await self._flusher
+        self._flusher = None
+        self._queue = None
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            # Long-lived: start it in an empty context so it doesn't inherit
+            # the first caller's request state (query stats, write pin)
+            self._flusher = contextvars.Context().run(asyncio.create_task, self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+
+        while not closing:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.flush_window
+
+            # Collect concurrent senders until the window closes or the batch is full
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                try:
+                    if remaining > 0:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[Dict, asyncio.Future]]):
+        rows = [row for row, _ in batch]
+
+        try:
+            inserted = await asyncio.to_thread(self._insert_rows, rows)
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            print(f"❌ Chat group commit failed ({len(rows)} messages): {e}")
+            if len(batch) > 1:
+                # Retry row by row so one bad message doesn't fail its neighbours
+                for item in batch:
+                    await self._flush([item])
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["messages"] += len(rows)
+        self.stats["commits"] += 1
+
+        committed = [
+            {**row, "id": message_id, "created_at": created_at}
+            for row, (message_id, created_at) in zip(rows, inserted)
+        ]
+        for listener in self._listeners:
+            try:
+                listener(committed)
+            except Exception as e:
+                print(f"⚠️ Chat commit listener failed: {e}")
+
+        for (_, future), result in zip(batch, committed):
+            if not future.done():
+                future.set_result(result)
+
+    def _insert_rows(self, rows: List[Dict]) -> List[Tuple[int, Any]]:
+        """Insert one batch in a single transaction (runs in a worker thread)"""
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                insert(ChatMessage).returning(
+                    ChatMessage.id,
+                    ChatMessage.created_at,
+                    sort_by_parameter_order=True
+                ),
+                rows
+            )
+            inserted = [(r.id, r.created_at) for r in result]
+            db.commit()
+            return inserted
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+# Global instance
+chat_writer = ChatWriteBuffer()
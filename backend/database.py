@@ -1,14 +1,21 @@
 """
 Database connection and session management
-PostgreSQL with SQLAlchemy
+PostgreSQL with SQLAlchemy: async engine (asyncpg) for request handlers, sync engine for scripts and worker threads
+Optional read replicas for read-only endpoints (get_read_db), with read-your-writes and lag fallback
 """
 
 import os
-from sqlalchemy import create_engine
+import time
+import asyncio
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import Session, sessionmaker
 from contextlib import contextmanager
-from typing import Generator
+from contextvars import ContextVar
+from typing import AsyncGenerator, Dict, List, Optional
+
+from fastapi import Request
 
 # Get database URL from environment
 DATABASE_URL = os.getenv(
@@ -16,36 +23,288 @@ DATABASE_URL = os.getenv(
     "postgresql://localhost:5432/opsx_db"  # Default for local development
 )
 
-# Create SQLAlchemy engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# Comma-separated replica URLs; empty = every read goes to the primary
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+# After a request writes, the same client reads from the primary for this long
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+# Replicas further behind than this are skipped until they catch up
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "2"))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "5"))
+DB_PRIMARY_COOKIE = "opsx_db_primary_until"
+# Same pin as a header, for cross-site frontends that don't send cookies
+DB_PRIMARY_HEADER = "X-DB-Primary-Until"
+
+
+def _async_url(url: str) -> str:
+    """Same database through its async driver (asyncpg / aiosqlite)"""
+    for sync_prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+# Sync engine: migration scripts, init_db and the background writers' threads
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,  # Verify connections before using
-    pool_size=10,
-    max_overflow=20,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     echo=False  # Set to True for SQL query logging
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: API handlers, so queries never block the event loop
+_async_pool_args = {} if ASYNC_DATABASE_URL.startswith("sqlite") else {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW
+}
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    echo=False,
+    **_async_pool_args
+)
+
+# expire_on_commit=False: attributes stay readable after commit without a lazy reload
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
 
-def get_db() -> Generator[Session, None, None]:
+# Replay delay on a Postgres standby; 0 when it has replayed everything it received
+_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaRouter:
+    """
+    Round-robin over the read replicas that are within DB_REPLICA_MAX_LAG
+
+    Replica lag is measured at most every DB_REPLICA_LAG_CHECK_INTERVAL
+    seconds, on the request path. A replica that errors or lags is skipped
+    until a later check passes; with none usable, reads go to the primary.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        max_lag: float = DB_REPLICA_MAX_LAG,
+        check_interval: float = DB_REPLICA_LAG_CHECK_INTERVAL
+    ):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.engines = [
+            create_async_engine(
+                _async_url(url),
+                pool_pre_ping=True,
+                echo=False,
+                **({} if url.startswith("sqlite") else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW})
+            )
+            for url in urls
+        ]
+        self.sessions = [
+            async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+            for engine in self.engines
+        ]
+        self._lag: List[Optional[float]] = [None] * len(self.engines)
+        self._checked_at = 0.0
+        self._check_lock = asyncio.Lock()
+        self._next = 0
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "read_your_writes": 0, "lag_fallbacks": 0}
+
+    async def _check_lag(self):
+        async with self._check_lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return
+            for i, engine in enumerate(self.engines):
+                try:
+                    async with engine.connect() as conn:
+                        if engine.dialect.name == "postgresql":
+                            self._lag[i] = float(await conn.scalar(_REPLICA_LAG_SQL))
+                        else:
+                            await conn.execute(text("SELECT 1"))
+                            self._lag[i] = 0.0
+                except Exception as e:
+                    if self._lag[i] is not None:
+                        print(f"⚠️ Read replica {i} unavailable: {e}")
+                    self._lag[i] = None
+            self._checked_at = time.monotonic()
+
+    async def pick(self) -> Optional[async_sessionmaker]:
+        """Session factory of the next healthy replica, or None for the primary"""
+        if not self.engines:
+            return None
+
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            await self._check_lag()
+
+        healthy = [i for i, lag in enumerate(self._lag) if lag is not None and lag <= self.max_lag]
+        if not healthy:
+            self.stats["lag_fallbacks"] += 1
+            return None
+
+        self._next = (self._next + 1) % len(healthy)
+        return self.sessions[healthy[self._next]]
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "replicas": len(self.engines),
+            "lag_seconds": [None if lag is None else round(lag, 3) for lag in self._lag]
+        }
+
+    async def close(self):
+        for engine in self.engines:
+            await engine.dispose()
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+
+# Per-request write flag, set by ReadYourWritesMiddleware
+_request_writes: ContextVar[Optional[Dict]] = ContextVar("db_request_writes", default=None)
+
+
+def note_write():
+    """
+    Mark the current request as a writer
+
+    Called automatically when an ORM session flushes or runs an
+    INSERT/UPDATE/DELETE; call it directly for writes made elsewhere
+    (e.g. queued to a background writer) that the client will read back.
+    """
+    state = _request_writes.get()
+    if state is not None:
+        state["wrote"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    note_write()
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_orm_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        note_write()
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware: pin a client to the primary right after it writes
+
+    When a request writes, its response carries a short-lived pin, both as
+    a cookie and as an X-DB-Primary-Until header the client echoes back;
+    while it is valid get_read_db serves that client from the primary, so
+    it never reads a replica that has not caught up with its own change.
     """
-    FastAPI dependency to get database session
+
+    def __init__(self, app, window: float = DB_READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_router.engines:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"wrote": False}
+        token = _request_writes.set(state)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and state["wrote"]:
+                until = time.time() + self.window
+                cookie = f"{DB_PRIMARY_COOKIE}={until:.3f}; Max-Age={int(self.window) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode()),
+                    (DB_PRIMARY_HEADER.lower().encode(), f"{until:.3f}".encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _request_writes.reset(token)
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    FastAPI dependency to get an async database session
     
     Usage:
         @router.get("/endpoint")
-        async def endpoint(db: Session = Depends(get_db)):
-            ...
+        async def endpoint(db: AsyncSession = Depends(get_db)):
+            result = await db.execute(select(User))
+    
+    Relationships are not lazy-loaded on an AsyncSession: eager load them
+    with selectinload() or query them explicitly.
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _pinned_to_primary(request: Request) -> bool:
+    state = _request_writes.get()
+    if state is not None and state["wrote"]:
+        return True
+    now = time.time()
+    for pin in (request.headers.get(DB_PRIMARY_HEADER), request.cookies.get(DB_PRIMARY_COOKIE)):
+        try:
+            if pin and float(pin) > now:
+                return True
+        except ValueError:
+            pass
+    return False
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    FastAPI dependency for read-only endpoints
+    
+    Same as get_db, but served by a read replica when DATABASE_REPLICA_URLS
+    is set. Falls back to the primary within DB_READ_YOUR_WRITES_SECONDS of
+    the client's last write, and when every replica lags or is down. Never
+    write through this session.
+    """
+    session_factory = None
+    if replica_router.engines:
+        if _pinned_to_primary(request):
+            replica_router.stats["read_your_writes"] += 1
+        else:
+            session_factory = await replica_router.pick()
+
+    if session_factory is None:
+        replica_router.stats["primary_reads"] += 1
+        session_factory = AsyncSessionLocal
+    else:
+        replica_router.stats["replica_reads"] += 1
+
+    async with session_factory() as db:
         yield db
-    finally:
-        db.close()
 
 
 @contextmanager
@@ -70,13 +329,19 @@ def get_db_context():
 
 def init_db():
     """Initialize database - create all tables"""
-    from models import User, Project, Stakeholder, Branch, ChatMessage, CodeEmbedding
+    from models import User, Project, Stakeholder, Branch, ChatMessage, ChatRoom, CodeEmbedding, TTLEntry, WebhookDelivery, EmailOutbox
     
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
     print("Database tables created successfully!")
 
 
+async def close_db():
+    """Dispose the async connection pools on shutdown"""
+    await replica_router.close()
+    await async_engine.dispose()
+
+
 def drop_all():
     """Drop all tables (use with caution!)"""
     print("WARNING: Dropping all database tables...")
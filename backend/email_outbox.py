@@ -0,0 +1,370 @@
+"""
+Transactional email outbox
+API handlers enqueue rows; a background worker delivers them in batched SendGrid calls with retries
+"""
+
+import os
+import random
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import and_, or_
+
+from database import AsyncSessionLocal, SessionLocal
+from models import EmailOutbox
+from integrations.email_service import SENDGRID_API_KEY, FROM_EMAIL, otp_email, team_invite_email
+
+# sendgrid, console (print, the default without SENDGRID_API_KEY) or memory (tests)
+EMAIL_SINK = os.getenv("EMAIL_SINK") or ("sendgrid" if SENDGRID_API_KEY else "console")
+# Recipients per SendGrid call (the API allows up to 1000 personalizations)
+EMAIL_BATCH_SIZE = min(1000, int(os.getenv("EMAIL_BATCH_SIZE", "500")))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_BACKOFF_BASE = float(os.getenv("EMAIL_BACKOFF_BASE", "10"))
+EMAIL_BACKOFF_MAX = float(os.getenv("EMAIL_BACKOFF_MAX", "600"))
+# HTTP timeout, and how long a claimed batch stays invisible to other workers
+EMAIL_SEND_TIMEOUT = float(os.getenv("EMAIL_SEND_TIMEOUT", "30"))
+
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+
+# template name -> renderer(**params) returning (subject, html_content)
+EMAIL_TEMPLATES: Dict[str, Callable[..., Tuple[str, str]]] = {
+    "otp": otp_email,
+    "team_invite": team_invite_email,
+}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class EmailSendError(Exception):
+    """A sink could not deliver a batch; retryable for throttling / server / network errors"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class SendGridSink:
+    """
+    One SendGrid v3 call per batch of same-template messages
+
+    The template is rendered once with "-param-" tags as the shared content;
+    each recipient is a personalization with its own subject and tag
+    substitutions.
+    """
+
+    name = "sendgrid"
+
+    def __init__(self, api_key: str = SENDGRID_API_KEY, from_email: str = FROM_EMAIL):
+        self.api_key = api_key
+        self.from_email = from_email
+        self._http: Optional[httpx.AsyncClient] = None
+
+    async def send(self, template: str, messages: List[Dict]):
+        render = EMAIL_TEMPLATES[template]
+        params = list(messages[0]["params"])
+        _, html_content = render(**{key: f"-{key}-" for key in params})
+
+        payload = {
+            "personalizations": [
+                {
+                    "to": [{"email": message["to_email"]}],
+                    "subject": render(**message["params"])[0],
+                    "substitutions": {f"-{key}-": str(message["params"][key]) for key in params}
+                }
+                for message in messages
+            ],
+            "from": {"email": self.from_email},
+            "content": [{"type": "text/html", "value": html_content}]
+        }
+
+        try:
+            response = await self._client().post(SENDGRID_URL, json=payload)
+        except httpx.HTTPError as e:
+            raise EmailSendError(f"SendGrid request failed: {e}")
+
+        if response.status_code != 202:
+            retryable = response.status_code == 429 or response.status_code >= 500
+            raise EmailSendError(f"SendGrid API error: {response.status_code} - {response.text[:300]}", retryable)
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=EMAIL_SEND_TIMEOUT
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class ConsoleSink:
+    """Local development: print what would have been sent"""
+
+    name = "console"
+
+    async def send(self, template: str, messages: List[Dict]):
+        for message in messages:
+            subject, _ = EMAIL_TEMPLATES[template](**message["params"])
+            print(f"\n{'='*60}")
+            print(f"EMAIL to {message['to_email']}: {subject}")
+            if "otp" in message["params"]:
+                print(f"Code: {message['params']['otp']}")
+            if "join_link" in message["params"]:
+                print(f"Join Link: {message['params']['join_link']}")
+            print(f"{'='*60}\n")
+
+    async def close(self):
+        pass
+
+
+class MemorySink:
+    """Tests: keep rendered messages in .sent"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.sent: List[Dict] = []
+
+    async def send(self, template: str, messages: List[Dict]):
+        for message in messages:
+            subject, html_content = EMAIL_TEMPLATES[template](**message["params"])
+            self.sent.append({
+                "to_email": message["to_email"],
+                "template": template,
+                "params": message["params"],
+                "subject": subject,
+                "html_content": html_content
+            })
+
+    async def close(self):
+        pass
+
+
+def _make_sink(name: str):
+    if name == "sendgrid" and SENDGRID_API_KEY:
+        return SendGridSink()
+    if name == "memory":
+        return MemorySink()
+    return ConsoleSink()
+
+
+class EmailOutboxWorker:
+    """
+    Delivers email_outbox rows through a sink
+
+    enqueue() only inserts a row, so handlers never wait on the mail
+    provider. The worker claims up to EMAIL_BATCH_SIZE due rows (FOR UPDATE
+    SKIP LOCKED, then a lease of EMAIL_SEND_TIMEOUT so a crashed sender's
+    rows come back), sends each template group in one call and retries
+    failures with exponential backoff up to EMAIL_MAX_ATTEMPTS. A batch
+    rejected as a whole (4xx) is retried message by message so one bad
+    address cannot fail its neighbours.
+    """
+
+    def __init__(
+        self,
+        sink=None,
+        batch_size: int = EMAIL_BATCH_SIZE,
+        poll_interval: float = EMAIL_POLL_INTERVAL,
+        max_attempts: int = EMAIL_MAX_ATTEMPTS
+    ):
+        self.sink = sink or _make_sink(EMAIL_SINK)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "api_calls": 0}
+
+    @property
+    def delivers_email(self) -> bool:
+        """False when messages only go to the console / memory sink"""
+        return self.sink.name == "sendgrid"
+
+    async def enqueue(self, to_email: str, template: str, params: Dict) -> int:
+        """
+        Queue an email for delivery
+
+        Returns:
+            The outbox row id
+
+        Raises:
+            ValueError: Unknown template
+        """
+        if template not in EMAIL_TEMPLATES:
+            raise ValueError(f"Unknown email template: {template}")
+
+        async with AsyncSessionLocal() as db:
+            row = EmailOutbox(to_email=to_email, template=template, params=params, status="pending", attempts=0)
+            db.add(row)
+            await db.commit()
+
+        self.stats["queued"] += 1
+        self.notify()
+        return row.id
+
+    async def start(self):
+        """Start the delivery worker"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._worker())
+        print(f"📧 Email outbox started: {self.sink.name} sink, batches of {self.batch_size}")
+
+    async def stop(self):
+        """Stop the worker (claimed rows are retried once their lease ends) and close the sink"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.sink.close()
+
+    def notify(self):
+        """Wake the worker after an email was queued"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                handled = await self._deliver_batch()
+            except Exception as e:
+                print(f"⚠️ Email outbox batch failed: {e}")
+                handled = 0
+
+            if handled >= self.batch_size:
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver_batch(self) -> int:
+        messages = await asyncio.to_thread(self._claim)
+        if not messages:
+            return 0
+
+        by_template: Dict[str, List[Dict]] = defaultdict(list)
+        for message in messages:
+            by_template[message["template"]].append(message)
+
+        sent: List[int] = []
+        failed: Dict[int, EmailSendError] = {}
+        for template, group in by_template.items():
+            try:
+                await self._send(template, group)
+                sent.extend(m["id"] for m in group)
+            except EmailSendError as e:
+                if e.retryable or len(group) == 1:
+                    failed.update((m["id"], e) for m in group)
+                    continue
+                # Rejected as a whole: find the bad message(s)
+                for message in group:
+                    try:
+                        await self._send(template, [message])
+                        sent.append(message["id"])
+                    except EmailSendError as single:
+                        failed[message["id"]] = single
+
+        await asyncio.to_thread(self._settle, sent, failed)
+        return len(messages)
+
+    async def _send(self, template: str, messages: List[Dict]):
+        self.stats["api_calls"] += 1
+        try:
+            await self.sink.send(template, messages)
+        except EmailSendError:
+            raise
+        except Exception as e:
+            # Rendering errors (e.g. missing params) will not fix themselves
+            raise EmailSendError(f"{type(e).__name__}: {e}", retryable=False)
+
+    def _claim(self) -> List[Dict]:
+        """Lease the next due rows (runs in a worker thread)"""
+        db = SessionLocal()
+        try:
+            now = _utcnow()
+            rows = db.query(EmailOutbox).filter(
+                or_(
+                    and_(
+                        EmailOutbox.status == "pending",
+                        or_(EmailOutbox.available_at.is_(None), EmailOutbox.available_at <= now)
+                    ),
+                    # Lease expired: the sender that held it is gone
+                    and_(EmailOutbox.status == "sending", EmailOutbox.available_at < now)
+                )
+            ).order_by(EmailOutbox.id.asc()).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+            messages = []
+            for row in rows:
+                row.status = "sending"
+                row.attempts = (row.attempts or 0) + 1
+                row.available_at = now + timedelta(seconds=EMAIL_SEND_TIMEOUT * 2)
+                messages.append({
+                    "id": row.id,
+                    "to_email": row.to_email,
+                    "template": row.template,
+                    "params": row.params or {},
+                    "attempts": row.attempts
+                })
+            db.commit()
+            return messages
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _settle(self, sent: List[int], failed: Dict[int, EmailSendError]):
+        """Record delivery results (runs in a worker thread)"""
+        db = SessionLocal()
+        try:
+            now = _utcnow()
+            if sent:
+                db.query(EmailOutbox).filter(EmailOutbox.id.in_(sent)).update(
+                    {
+                        EmailOutbox.status: "sent",
+                        EmailOutbox.sent_at: now,
+                        EmailOutbox.available_at: None,
+                        EmailOutbox.error_message: None
+                    },
+                    synchronize_session=False
+                )
+                self.stats["sent"] += len(sent)
+
+            if failed:
+                for row in db.query(EmailOutbox).filter(EmailOutbox.id.in_(list(failed))):
+                    error = failed[row.id]
+                    row.error_message = str(error)
+                    if error.retryable and row.attempts < self.max_attempts:
+                        delay = min(EMAIL_BACKOFF_MAX, EMAIL_BACKOFF_BASE * 2 ** (row.attempts - 1))
+                        row.status = "pending"
+                        row.available_at = now + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+                        self.stats["retried"] += 1
+                    else:
+                        row.status = "failed"
+                        row.available_at = None
+                        self.stats["failed"] += 1
+                        print(f"❌ Email {row.id} to {row.to_email} failed: {error}")
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+# Global instance
+email_outbox = EmailOutboxWorker()
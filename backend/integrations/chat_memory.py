@@ -0,0 +1,381 @@
+"""
+Role-aware chat memory in Chroma
+Indexes chat turns and decisions per project and recalls the relevant ones for JLLM
+"""
+
+import os
+import asyncio
+import contextvars
+from typing import Dict, List, Optional, Set, Tuple
+
+from integrations.chroma_client import chroma_search
+from project_context import chat_author_name
+
+# Retrieval
+CHAT_MEMORY_TOP_K = int(os.getenv("CHAT_MEMORY_TOP_K", "6"))
+CHAT_MEMORY_MAX_DISTANCE = float(os.getenv("CHAT_MEMORY_MAX_DISTANCE", "0.8"))  # Cosine distance
+# Latest turns always kept verbatim for conversational continuity
+CHAT_MEMORY_RECENT_TURNS = int(os.getenv("CHAT_MEMORY_RECENT_TURNS", "4"))
+# Roles whose turns are relevant to every speaker (plus the speaker's own role)
+CHAT_MEMORY_SHARED_ROLES = [
+    r.strip() for r in os.getenv("CHAT_MEMORY_SHARED_ROLES", "Founder,Facilitator").split(",") if r.strip()
+]
+
+# Incremental indexing
+CHAT_MEMORY_FLUSH_MS = float(os.getenv("CHAT_MEMORY_FLUSH_MS", "250"))
+CHAT_MEMORY_MAX_BATCH = int(os.getenv("CHAT_MEMORY_MAX_BATCH", "64"))
+CHAT_MEMORY_BACKFILL_LIMIT = int(os.getenv("CHAT_MEMORY_BACKFILL_LIMIT", "2000"))
+# Document written last by a backfill; its presence means history is indexed
+BACKFILL_MARKER_ID = "backfill-complete"
+
+# (project_id, document id, text, metadata)
+_Doc = Tuple[int, str, str, Dict]
+
+
+class ChatMemory:
+    """
+    Per-project chat memory
+
+    Each project gets its own Chroma collection (chat_{project_id}) embedded
+    with Chroma's default text embedding function. Messages are queued and
+    upserted in batches off the request path; decisions (refinements) are
+    upserted under a stable id so their status stays current.
+    """
+
+    def __init__(
+        self,
+        flush_window_ms: float = CHAT_MEMORY_FLUSH_MS,
+        max_batch: int = CHAT_MEMORY_MAX_BATCH
+    ):
+        self.client = chroma_search.client if chroma_search else None
+        self.flush_window = flush_window_ms / 1000
+        self.max_batch = max_batch
+        self._collections: Dict[int, object] = {}
+        self._backfilled: Set[int] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self.stats = {"indexed": 0, "batches": 0, "recalls": 0, "failed_batches": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    # ---------- indexing ----------
+
+    def index_message(self, row: Dict, author_name: str):
+        """Queue a persisted chat row (as returned by chat_writer) for embedding"""
+        self._enqueue((
+            row["project_id"],
+            f"msg-{row['id']}",
+            row["message"],
+            {
+                "kind": "ai" if row["is_ai"] else "message",
+                "message_id": row["id"],
+                "role": row["role"] or "Unknown",
+                "author": author_name,
+                "created_at": row["created_at"].timestamp() if row.get("created_at") else 0.0
+            }
+        ))
+
+    def index_decision(
+        self,
+        project_id: int,
+        refinement_id: int,
+        request_text: str,
+        role: str,
+        author_name: str,
+        status: str,
+        outcome: Optional[str] = None
+    ):
+        """Queue a refinement as a decision; re-indexing the same id replaces it"""
+        self._enqueue(_decision_doc(project_id, refinement_id, request_text, role, author_name, status, outcome))
+
+    async def close(self):
+        """Index everything still queued and stop the flusher"""
+        if self._flusher and not self._flusher.done():
+            await self._queue.put(None)
+            await self._flusher
+        self._flusher = None
+        self._queue = None
+
+    def drop_project(self, project_id: int):
+        """Delete a project's chat memory"""
+        self._collections.pop(project_id, None)
+        self._backfilled.discard(project_id)
+        if not self.enabled:
+            return
+        try:
+            self.client.delete_collection(name=f"chat_{project_id}")
+        except Exception:
+            pass  # Never indexed
+
+    def _enqueue(self, doc: _Doc):
+        if not self.enabled:
+            return
+        if self._flusher is None or self._flusher.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            # Long-lived: don't inherit the first caller's request context
+            self._flusher = contextvars.Context().run(asyncio.create_task, self._run())
+        self._queue.put_nowait(doc)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+
+        while not closing:
+            doc = await self._queue.get()
+            if doc is None:
+                break
+
+            batch = [doc]
+            deadline = loop.time() + self.flush_window
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                try:
+                    if remaining > 0:
+                        doc = await asyncio.wait_for(self._queue.get(), remaining)
+                    else:
+                        doc = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+
+                if doc is None:
+                    closing = True
+                    break
+                batch.append(doc)
+
+            try:
+                await asyncio.to_thread(self._upsert, batch)
+                self.stats["indexed"] += len(batch)
+                self.stats["batches"] += 1
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                print(f"⚠️ Chat memory indexing failed ({len(batch)} docs): {e}")
+
+    def _collection(self, project_id: int):
+        collection = self._collections.get(project_id)
+        if collection is None:
+            collection = self.client.get_or_create_collection(
+                name=f"chat_{project_id}",
+                metadata={
+                    "description": f"OPS-X chat memory for project {project_id}",
+                    "hnsw:space": "cosine"
+                }
+            )
+            self._collections[project_id] = collection
+        return collection
+
+    def _upsert(self, docs: List[_Doc]):
+        """Upsert one batch, one call per project (runs in a worker thread)"""
+        by_project: Dict[int, Dict[str, Tuple[str, Dict]]] = {}
+        for project_id, doc_id, text, metadata in docs:
+            # Later entries for the same id (decision status updates) win
+            by_project.setdefault(project_id, {})[doc_id] = (text, metadata)
+
+        for project_id, entries in by_project.items():
+            self._collection(project_id).upsert(
+                ids=list(entries.keys()),
+                documents=[text for text, _ in entries.values()],
+                metadatas=[metadata for _, metadata in entries.values()]
+            )
+
+    # ---------- retrieval ----------
+
+    async def recall(
+        self,
+        project_id: int,
+        query: str,
+        speaker_role: Optional[str],
+        k: int = CHAT_MEMORY_TOP_K,
+        exclude_message_ids: Optional[Set[int]] = None
+    ) -> List[Dict]:
+        """
+        Top-k past turns relevant to a query
+
+        Only turns by the speaker's role, the shared roles, and decisions are
+        considered.
+
+        Returns:
+            [{"kind", "role", "author", "content", "message_id"}], decisions first,
+            then turns in conversation order
+        """
+        if not self.enabled or not query.strip():
+            return []
+
+        roles = sorted({speaker_role or "Unknown", *CHAT_MEMORY_SHARED_ROLES})
+        exclude = exclude_message_ids or set()
+
+        try:
+            if project_id not in self._backfilled:
+                await asyncio.to_thread(self._backfill, project_id)
+                self._backfilled.add(project_id)
+
+            # Over-fetch a little so excluded (already in history) turns don't eat the budget
+            results = await asyncio.to_thread(self._query, project_id, query, roles, k + len(exclude))
+        except Exception as e:
+            print(f"⚠️ Chat memory recall failed: {e}")
+            return []
+
+        self.stats["recalls"] += 1
+
+        memories = []
+        for text, metadata, distance in results:
+            if distance > CHAT_MEMORY_MAX_DISTANCE:
+                continue
+            if metadata.get("message_id") in exclude:
+                continue
+            memories.append({
+                "kind": metadata.get("kind"),
+                "role": metadata.get("role"),
+                "author": metadata.get("author"),
+                "content": text,
+                "message_id": metadata.get("message_id"),
+                "order": (metadata.get("created_at") or 0.0, metadata.get("message_id") or 0)
+            })
+            if len(memories) >= k:
+                break
+
+        # Decisions first, then turns in conversation order
+        memories.sort(key=lambda m: (m["kind"] != "decision", m["order"]))
+        for m in memories:
+            del m["order"]
+        return memories
+
+    def _query(self, project_id: int, query: str, roles: List[str], n_results: int) -> List[Tuple[str, Dict, float]]:
+        collection = self._collection(project_id)
+        count = collection.count()
+        if count == 0:
+            return []
+
+        where = {"$or": [{"role": role} for role in roles] + [{"kind": "decision"}]}
+        results = collection.query(
+            query_texts=[query],
+            where=where,
+            n_results=min(n_results, count)
+        )
+
+        if not results["ids"] or not results["ids"][0]:
+            return []
+        return list(zip(results["documents"][0], results["metadatas"][0], results["distances"][0]))
+
+    def _backfill(self, project_id: int):
+        """Index history written before memory existed (first recall per process)"""
+        # Live indexing fills the collection right away, so completion is
+        # tracked with a marker document rather than the collection count
+        collection = self._collection(project_id)
+        if collection.get(ids=[BACKFILL_MARKER_ID])["ids"]:
+            return
+
+        from database import SessionLocal
+        from models import ChatMessage, Refinement, Stakeholder
+
+        db = SessionLocal()
+        try:
+            messages = db.query(ChatMessage).filter(
+                ChatMessage.project_id == project_id
+            ).order_by(ChatMessage.id.desc()).limit(CHAT_MEMORY_BACKFILL_LIMIT).all()
+
+            # Decisions indexed live already carry their outcome; don't overwrite them
+            indexed = set(collection.get(
+                ids=[f"decision-{r_id}" for (r_id,) in db.query(Refinement.id).filter(Refinement.project_id == project_id)]
+            )["ids"])
+
+            stakeholders = db.query(Stakeholder).filter(Stakeholder.project_id == project_id).all()
+            names_by_user = {s.user_id: s.name for s in stakeholders if s.user_id}
+            by_id = {s.id: s for s in stakeholders}
+
+            docs: List[_Doc] = [
+                (
+                    project_id,
+                    f"msg-{m.id}",
+                    m.message,
+                    {
+                        "kind": "ai" if m.is_ai else "message",
+                        "message_id": m.id,
+                        "role": m.role or "Unknown",
+                        "author": chat_author_name(m.is_ai, m.user_id, m.extra_data, names_by_user),
+                        "created_at": m.created_at.timestamp() if m.created_at else 0.0
+                    }
+                )
+                for m in messages
+            ]
+
+            for r in db.query(Refinement).filter(Refinement.project_id == project_id):
+                if f"decision-{r.id}" in indexed:
+                    continue
+                stakeholder = by_id.get(r.stakeholder_id)
+                docs.append(_decision_doc(
+                    project_id,
+                    r.id,
+                    r.request_text,
+                    stakeholder.role if stakeholder else None,
+                    stakeholder.name if stakeholder else "Unknown",
+                    r.status or "pending",
+                    decision_outcome(r.status, r.files_changed, r.error_message)
+                ))
+        finally:
+            db.close()
+
+        # No role, so recall's role filter never returns it
+        docs.append((
+            project_id,
+            BACKFILL_MARKER_ID,
+            "Chat memory backfill marker",
+            {"kind": "marker", "docs": len(docs)}
+        ))
+
+        for i in range(0, len(docs), self.max_batch):
+            self._upsert(docs[i:i + self.max_batch])
+
+        if len(docs) > 1:
+            print(f"📚 Backfilled chat memory for project {project_id}: {len(docs) - 1} docs")
+
+
+def decision_outcome(status: Optional[str], files_changed: Optional[List[str]], error: Optional[str]) -> Optional[str]:
+    """Outcome line of a finished refinement, as shown in its decision"""
+    if status == "completed" and files_changed:
+        return f"Changed {', '.join(files_changed)}"
+    return error
+
+
+def _decision_doc(
+    project_id: int,
+    refinement_id: int,
+    request_text: str,
+    role: Optional[str],
+    author_name: str,
+    status: str,
+    outcome: Optional[str] = None
+) -> _Doc:
+    text = f"Decision ({status}): {request_text}"
+    if outcome:
+        text += f"\nOutcome: {outcome}"
+    return (
+        project_id,
+        f"decision-{refinement_id}",
+        text,
+        {
+            "kind": "decision",
+            "refinement_id": refinement_id,
+            "role": role or "Unknown",
+            "author": author_name,
+            "status": status
+        }
+    )
+
+
+def format_memories(memories: List[Dict]) -> str:
+    """Render recalled turns as a compact context block for the LLM"""
+    lines = []
+    for m in memories:
+        if m["kind"] == "decision":
+            lines.append(f"- 📌 {m['content']} (requested by {m['author']}, {m['role']})")
+        else:
+            lines.append(f"- [{m['role']}] {m['author']}: {m['content']}")
+    return "Relevant earlier discussion:\n" + "\n".join(lines)
+
+
+# Global instance
+chat_memory = ChatMemory()
@@ -5,18 +5,40 @@ Using Anthropic's Claude for backend logic, APIs, and databases
 
 import os
 import anthropic
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+from integrations.llm_gateway import llm_gateway
+from integrations.stream_parser import CLAUDE, parse_files
+from integrations.patch_apply import EDIT_FORMAT_INSTRUCTIONS, apply_response
 
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
 
+# Edit mode: existing files come back as search/replace edits applied locally,
+# so output tokens scale with the change instead of the file size
+CLAUDE_EDIT_MODE = os.getenv("CLAUDE_EDIT_MODE", "true").lower() == "true"
+CLAUDE_MAX_TOKENS = 4096
+CLAUDE_FULL_FILE_MAX_TOKENS = int(os.getenv("CLAUDE_FULL_FILE_MAX_TOKENS", "8192"))
+
+# Mark the system prompt and project/file context as cacheable prefixes
+CLAUDE_PROMPT_CACHE = os.getenv("CLAUDE_PROMPT_CACHE", "true").lower() == "true"
+
 if CLAUDE_API_KEY:
-    claude_client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
+    # Async client; retries and timeouts are owned by the LLM gateway
+    claude_client = anthropic.AsyncAnthropic(api_key=CLAUDE_API_KEY, max_retries=0)
     print("Claude API initialized successfully")
 else:
     claude_client = None
     print("WARNING: CLAUDE_API_KEY not set, Claude agent disabled")
 
 
+def _anthropic_usage(message) -> Tuple[int, int, int, int]:
+    """Gateway usage tuple; Anthropic's input_tokens excludes cache reads and writes"""
+    usage = message.usage
+    read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    written = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    return usage.input_tokens + read + written, usage.output_tokens, read, written
+
+
 class ClaudeBackendAgent:
     """Claude-powered backend code generation"""
     
@@ -24,12 +46,14 @@ class ClaudeBackendAgent:
         self.client = claude_client
         self.model = "claude-sonnet-4-20250514"  # Latest Claude Sonnet
     
-    def generate_backend_code(
+    async def generate_backend_code(
         self,
         refinement_request: str,
         current_files: Dict[str, str],
         project_context: str,
-        allowed_files: List[str]
+        allowed_files: List[str],
+        base_files: Optional[Dict[str, str]] = None,
+        edit_mode: Optional[bool] = None
     ) -> Dict[str, str]:
         """
         Generate backend code changes based on refinement request
@@ -39,6 +63,9 @@ class ClaudeBackendAgent:
             current_files: Dict of {file_path: content} of BACKEND files only
             project_context: Project description and requirements
             allowed_files: List of file paths this user can edit
+            base_files: Full contents edits are applied to, when current_files
+                were truncated for the prompt (defaults to current_files)
+            edit_mode: Ask for search/replace edits (default CLAUDE_EDIT_MODE)
         
         Returns:
             Dict of {file_path: new_content} with changes
@@ -46,33 +73,151 @@ class ClaudeBackendAgent:
         if not self.client:
             raise ValueError("Claude API not configured")
         
-        # Build the prompt
-        system_prompt = """You are a senior backend engineer specializing in FastAPI, PostgreSQL, and API design.
+        # Nothing to edit without current files
+        edit_mode = (CLAUDE_EDIT_MODE if edit_mode is None else edit_mode) and bool(current_files)
+        base_files = base_files or current_files
+        
+        prompts = self._build_prompts(
+            refinement_request, current_files, project_context, allowed_files, edit_mode=edit_mode
+        )
+        
+        try:
+            content = await self._complete(prompts, CLAUDE_MAX_TOKENS)
+            
+            if not edit_mode:
+                modified_files = self._parse_files(content)
+                print(f"Claude generated {len(modified_files)} file(s)")
+                return modified_files
+            
+            # Apply edits locally; anything that doesn't apply cleanly is regenerated whole
+            modified_files, failed = apply_response(content, base_files)
+            if failed:
+                print(f"⚠️ {len(failed)} edit(s) did not apply, falling back to full files: {failed}")
+                modified_files.update(await self._regenerate_full_files(
+                    refinement_request,
+                    {path: base_files.get(path, "") for path in failed},
+                    project_context,
+                    allowed_files
+                ))
+            
+            print(f"Claude generated {len(modified_files)} file(s) ({len(failed)} via full-file fallback)")
+            return modified_files
+            
+        except Exception as e:
+            print(f"Claude API error: {str(e)}")
+            raise
+    
+    async def _complete(self, prompts: Tuple[str, str, str], max_tokens: int) -> str:
+        """One non-streaming completion through the gateway"""
+        response = await llm_gateway.call(
+            "claude",
+            lambda: self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                **self._request(*prompts)
+            ),
+            usage=_anthropic_usage
+        )
+        return response.content[0].text
+    
+    @staticmethod
+    def _request(system_prompt: str, context_prompt: str, request_prompt: str) -> Dict:
+        """
+        system + messages for the Messages API, static content first
+        
+        The system prompt is identical for every call in a mode and the
+        project/file context repeats across retries and follow-up requests,
+        so both are marked as cache breakpoints; only the request text is new.
+        """
+        if not CLAUDE_PROMPT_CACHE:
+            return {
+                "system": system_prompt,
+                "messages": [
+                    {"role": "user", "content": f"{context_prompt}\n{request_prompt}"}
+                ]
+            }
+        
+        cached = {"type": "ephemeral"}
+        return {
+            "system": [
+                {"type": "text", "text": system_prompt, "cache_control": cached}
+            ],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": context_prompt, "cache_control": cached},
+                        {"type": "text", "text": request_prompt}
+                    ]
+                }
+            ]
+        }
+    
+    async def _regenerate_full_files(
+        self,
+        refinement_request: str,
+        files: Dict[str, str],
+        project_context: str,
+        allowed_files: List[str]
+    ) -> Dict[str, str]:
+        """Full-file fallback for edits that failed validation"""
+        prompts = self._build_prompts(
+            refinement_request
+            + "\n\nReturn the COMPLETE updated content of each of these files: "
+            + ", ".join(files),
+            files,
+            project_context,
+            allowed_files,
+            edit_mode=False
+        )
+        content = await self._complete(prompts, CLAUDE_FULL_FILE_MAX_TOKENS)
+        regenerated = self._parse_files(content)
+        return {path: code for path, code in regenerated.items() if path in files}
+    
+    def _build_prompts(
+        self,
+        refinement_request: str,
+        current_files: Dict[str, str],
+        project_context: str,
+        allowed_files: List[str],
+        edit_mode: bool = False
+    ) -> Tuple[str, str, str]:
+        """Build the (system, context, request) prompts for a backend refinement"""
+        if edit_mode:
+            output_goal = "Return minimal edits for existing files and complete contents only for new files"
+            output_rule = "Keep SEARCH blocks short but unique; never rewrite a whole file just to change a few lines"
+            output_format = EDIT_FORMAT_INSTRUCTIONS
+        else:
+            output_goal = "Generate COMPLETE file contents (not diffs)"
+            output_rule = "Generate complete file contents, not partial changes"
+            output_format = """Return your response in this exact format:
+---FILE: path/to/file.py---
+[complete file content here]
+---END FILE---
+
+---FILE: path/to/another_file.py---
+[complete file content here]
+---END FILE---
+"""
+        
+        system_prompt = f"""You are a senior backend engineer specializing in FastAPI, PostgreSQL, and API design.
 
 You are helping refine an existing codebase. Your job is to:
 1. Understand the refinement request
 2. Only modify backend-related files (APIs, database, server config)
-3. Generate COMPLETE file contents (not diffs)
+3. {output_goal}
 4. Ensure all changes are production-ready
 5. Maintain existing code style and structure
 
 CRITICAL RULES:
 - Only edit files in the allowed_files list
-- Generate complete file contents, not partial changes
+- {output_rule}
 - Test your logic mentally - no placeholder code
 - Preserve imports and existing functionality
 - Add proper error handling
 - Follow REST API best practices
 
-Return your response in this exact format:
----FILE: path/to/file.py---
-[complete file content here]
----END FILE---
-
----FILE: path/to/another_file.py---
-[complete file content here]
----END FILE---
-"""
+{output_format}"""
         
         # Build context about current files
         files_context = "\n\n".join([
@@ -80,7 +225,8 @@ Return your response in this exact format:
             for path, content in current_files.items()
         ])
         
-        user_prompt = f"""PROJECT CONTEXT:
+        # Stable context first, the request last (see _request)
+        context_prompt = f"""PROJECT CONTEXT:
 {project_context}
 
 CURRENT BACKEND FILES:
@@ -88,51 +234,18 @@ CURRENT BACKEND FILES:
 
 ALLOWED FILES TO EDIT:
 {', '.join(allowed_files)}
-
-REFINEMENT REQUEST:
+"""
+        
+        request_prompt = f"""REFINEMENT REQUEST:
 {refinement_request}
 
 Generate the modified backend code. Only include files that need changes.
 """
-        
-        try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-            
-            # Parse response
-            content = response.content[0].text
-            modified_files = self._parse_files(content)
-            
-            print(f"Claude generated {len(modified_files)} file(s)")
-            return modified_files
-            
-        except Exception as e:
-            print(f"Claude API error: {str(e)}")
-            raise
+        return system_prompt, context_prompt, request_prompt
     
     def _parse_files(self, content: str) -> Dict[str, str]:
         """Parse files from Claude's response"""
-        files = {}
-        
-        # Split by file markers
-        parts = content.split("---FILE: ")
-        
-        for part in parts[1:]:  # Skip first empty part
-            if "---" in part:
-                # Extract filename and content
-                lines = part.split("\n", 1)
-                if len(lines) == 2:
-                    filename = lines[0].replace("---", "").strip()
-                    file_content = lines[1].split("---END FILE---")[0].strip()
-                    files[filename] = file_content
-        
-        return files
+        return parse_files(content, formats=(CLAUDE,))
 
 
 # Global instance
@@ -0,0 +1,429 @@
+"""
+Context Packer - Select the code a refinement needs under a token budget
+Ranks repo files by term overlap and import proximity, filtered by role permissions
+"""
+
+import os
+import re
+import time
+import asyncio
+import posixpath
+from collections import OrderedDict, deque
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from api.permissions import filter_paths, get_file_restrictions
+from integrations.github_api import github_client
+
+# Prompt budget for CURRENT FILES (approximate tokens, ~4 characters each)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "24000"))
+CONTEXT_MAX_FILE_TOKENS = int(os.getenv("CONTEXT_MAX_FILE_TOKENS", "6000"))
+
+# Repo file listings are reused across refinements for a short while
+CONTEXT_SNAPSHOT_TTL = float(os.getenv("CONTEXT_SNAPSHOT_TTL", "120"))
+CONTEXT_SNAPSHOT_MAX_REPOS = int(os.getenv("CONTEXT_SNAPSHOT_MAX_REPOS", "32"))
+
+# Only the best-ranked paths are downloaded: at most this much text, a few files at a time
+CONTEXT_FETCH_TOKENS = int(os.getenv("CONTEXT_FETCH_TOKENS", "72000"))
+CONTEXT_FETCH_CONCURRENCY = int(os.getenv("CONTEXT_FETCH_CONCURRENCY", "8"))
+CONTEXT_BLOB_CACHE_FILES = int(os.getenv("CONTEXT_BLOB_CACHE_FILES", "2000"))  # By blob SHA, so never stale
+
+CHARS_PER_TOKEN = 4
+MAX_TREE_PATHS = 200  # Paths listed in the repository overview
+
+# Never worth a prompt slot
+SKIPPED_FILES = {"package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock"}
+SKIPPED_DIRS = ("node_modules/", ".next/", "dist/", "build/", ".git/", "__pycache__/")
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "into", "add", "make",
+    "should", "please", "can", "new", "update", "change", "use", "when", "all"
+}
+
+# Relative imports (JS/TS) and module imports (Python)
+_JS_IMPORT = re.compile(r"""(?:import\s[^'"]*?from\s*|import\s*\(?\s*|require\(\s*)['"]([^'"]+)['"]""")
+_PY_IMPORT = re.compile(r"^\s*(?:from\s+([.\w]+)\s+import|import\s+([\w.]+))", re.MULTILINE)
+_JS_EXTENSIONS = ("", ".ts", ".tsx", ".js", ".jsx", "/index.ts", "/index.tsx", "/index.js")
+
+# Lines worth keeping when a file has to be cut down
+_SIGNATURE = re.compile(r"^\s*(?:def |async def |class |export |function |const \w+ = |@router\.|@app\.)")
+
+
+class PackedContext(NamedTuple):
+    """What a code agent gets for one refinement"""
+    files: Dict[str, str]        # path -> (possibly truncated) content, most relevant first
+    allowed_files: List[str]     # Editable paths and the role's patterns for new files
+    project_context: str
+    stats: Dict
+    sources: Dict[str, str]      # path -> full content, for applying edits to truncated files
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def repo_full_name(github_repo: str) -> str:
+    """'https://github.com/user/repo.git' or 'user/repo' -> 'user/repo'"""
+    if "github.com/" in github_repo:
+        return github_repo.split("github.com/")[1].replace(".git", "").strip("/")
+    return github_repo
+
+
+def _terms(text: str) -> Set[str]:
+    return {w.lower() for w in _WORD.findall(text)} - _STOPWORDS
+
+
+class ContextPacker:
+    """
+    Builds bounded, relevant code context for refinement agents
+
+    Lists the repo tree, downloads only the paths that rank best for the
+    request (plus what the top hits import) within a fetch budget, scores
+    those by term overlap with the request, spreads score to files within
+    two import hops of the best hits, then greedily packs the ranking into
+    the token budget, cutting oversized files down to imports, signatures
+    and the lines that mention the request.
+    """
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, max_file_tokens: int = CONTEXT_MAX_FILE_TOKENS):
+        self.token_budget = token_budget
+        self.max_file_tokens = max_file_tokens
+        # repo -> (listed_at, {path: {"sha", "size"}})
+        self._snapshots: "OrderedDict[str, Tuple[float, Dict[str, Dict]]]" = OrderedDict()
+        self._fetching: Dict[str, asyncio.Future] = {}
+        self._blobs: "OrderedDict[str, str]" = OrderedDict()  # blob sha -> content
+
+    async def pack(
+        self,
+        project,
+        request_text: str,
+        role: Optional[str] = None,
+        files: Optional[Dict[str, str]] = None
+    ) -> PackedContext:
+        """
+        Select context for a refinement request
+
+        Args:
+            project: Project row (name, prompt, github_repo)
+            request_text: The refinement request
+            role: Stakeholder role; None means unrestricted
+            files: Repo snapshot to use instead of fetching from GitHub
+
+        Returns:
+            PackedContext with at most token_budget tokens of files
+        """
+        project_context = f"Project: {project.name}\n{project.prompt}"
+
+        tree = None
+        if files is None:
+            tree = await self.snapshot(project.github_repo) if project.github_repo else {}
+
+        # Skip rules and permissions apply to paths, before anything is downloaded
+        paths = [path for path in (files if tree is None else tree) if not self._skipped(path)]
+        if not paths:
+            return PackedContext({}, self._allowed_patterns(role), project_context, {"repo_files": 0}, {})
+
+        editable = set(paths) if role is None else filter_paths(role, paths)
+
+        if tree is not None:
+            files = await self._fetch_ranked(project.github_repo, tree, paths, editable, request_text)
+        candidates = {path: files[path] for path in paths if path in files}
+
+        scores = self._lexical_scores(candidates, request_text)
+
+        # Files the role can't edit are kept only as references of relevant editable ones
+        seeds = self._seeds(scores, editable)
+        for path, distance in self._import_neighbours(candidates, seeds).items():
+            scores[path] = scores.get(path, 0.0) + 0.5 / distance
+        for path in list(scores):
+            if path in editable:
+                scores[path] += 0.25
+            elif scores[path] < 0.5:
+                del scores[path]
+
+        ranked = sorted(scores, key=lambda p: (-scores[p], p))
+        terms = _terms(request_text)
+
+        # Paths alone are cheap and tell the model what exists
+        project_context += "\n\nREPOSITORY FILES:\n" + "\n".join(sorted(paths)[:MAX_TREE_PATHS])
+
+        packed: Dict[str, str] = {}
+        used = estimate_tokens(project_context)
+        truncated = 0
+        for path in ranked:
+            remaining = self.token_budget - used
+            if remaining < 200:
+                break
+
+            content = candidates[path]
+            limit = min(self.max_file_tokens, remaining)
+            if estimate_tokens(content) > limit:
+                content = self._truncate(content, terms, limit)
+                truncated += 1
+
+            packed[path] = content
+            used += estimate_tokens(content) + estimate_tokens(path) + 8
+
+        allowed = [path for path in packed if path in editable] + self._allowed_patterns(role)
+        stats = {
+            "repo_files": len(paths),
+            "fetched_files": len(candidates),
+            "packed_files": len(packed),
+            "truncated_files": truncated,
+            "estimated_tokens": used
+        }
+        print(f"📦 Packed {len(packed)}/{len(paths)} files (~{used} tokens, {truncated} truncated)")
+
+        sources = {path: candidates[path] for path in packed}
+        return PackedContext(packed, allowed, project_context, stats, sources)
+
+    async def snapshot(self, github_repo: str) -> Dict[str, Dict]:
+        """Repo file listing from GitHub, cached briefly and listed once per repo at a time"""
+        repo = repo_full_name(github_repo)
+
+        entry = self._snapshots.get(repo)
+        if entry and time.monotonic() - entry[0] < CONTEXT_SNAPSHOT_TTL:
+            self._snapshots.move_to_end(repo)
+            return entry[1]
+
+        pending = self._fetching.get(repo)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._fetching[repo] = future
+        try:
+            files = await github_client.list_repo_tree(repo) if github_client else {}
+        except asyncio.CancelledError:
+            self._fetching.pop(repo, None)
+            future.cancel()
+            raise
+        except Exception as e:
+            print(f"⚠️ Could not fetch {repo} for context: {e}")
+            files = {}
+
+        self._fetching.pop(repo, None)
+        future.set_result(files)
+        self._snapshots[repo] = (time.monotonic(), files)
+        self._snapshots.move_to_end(repo)
+        while len(self._snapshots) > CONTEXT_SNAPSHOT_MAX_REPOS:
+            self._snapshots.popitem(last=False)
+
+        return files
+
+    def invalidate(self, github_repo: str):
+        """Drop a cached snapshot (e.g. after pushing changes)"""
+        self._snapshots.pop(repo_full_name(github_repo), None)
+
+    # ---------- fetching ----------
+
+    async def _fetch_ranked(
+        self,
+        github_repo: str,
+        tree: Dict[str, Dict],
+        paths: List[str],
+        editable: Set[str],
+        request_text: str
+    ) -> Dict[str, str]:
+        """
+        Download the paths most likely to be packed, within CONTEXT_FETCH_TOKENS
+
+        Paths naming request terms come first, then what the best of them
+        import, then the remaining editable files, smallest first. Files the
+        role can't edit are fetched only when their path matches.
+        """
+        repo = repo_full_name(github_repo)
+        terms = _terms(request_text)
+        hits = {path: len(terms & _terms(path.replace("/", " ").replace(".", " "))) for path in paths}
+        matching = sorted(
+            (path for path in paths if hits[path]),
+            key=lambda p: (-hits[p], p not in editable, tree[p]["size"], p)
+        )
+
+        room = CONTEXT_FETCH_TOKENS * CHARS_PER_TOKEN
+
+        def take(candidates: List[str]) -> List[str]:
+            nonlocal room
+            chosen = []
+            for path in candidates:
+                if path not in files and tree[path]["size"] <= room:
+                    chosen.append(path)
+                    room -= tree[path]["size"]
+            return chosen
+
+        files: Dict[str, str] = {}
+        files.update(await self._fetch(repo, tree, take(matching)))
+
+        seeds = self._seeds(self._lexical_scores(files, request_text), editable)
+        neighbours = self._import_neighbours(files, seeds, paths=set(paths))
+        files.update(await self._fetch(repo, tree, take(sorted(neighbours, key=lambda p: (neighbours[p], p)))))
+
+        # Body text may still match
+        rest = sorted((path for path in editable if not hits[path]), key=lambda p: (tree[p]["size"], p))
+        files.update(await self._fetch(repo, tree, take(rest)))
+        return files
+
+    async def _fetch(self, repo: str, tree: Dict[str, Dict], paths: List[str]) -> Dict[str, str]:
+        """Contents of paths, from the blob cache or fetched concurrently"""
+        shas = {path: tree[path]["sha"] for path in paths}
+        missing = [sha for sha in shas.values() if sha not in self._blobs]
+        if missing and github_client:
+            fetched = await github_client.fetch_blobs(repo, missing, concurrency=CONTEXT_FETCH_CONCURRENCY)
+            self._blobs.update(fetched)
+            while len(self._blobs) > CONTEXT_BLOB_CACHE_FILES:
+                self._blobs.popitem(last=False)
+
+        files = {}
+        for path, sha in shas.items():
+            if sha in self._blobs:
+                self._blobs.move_to_end(sha)
+                files[path] = self._blobs[sha]
+        return files
+
+    # ---------- scoring ----------
+
+    @staticmethod
+    def _skipped(path: str) -> bool:
+        name = posixpath.basename(path)
+        return (
+            name in SKIPPED_FILES
+            or name.endswith((".min.js", ".map", ".lock"))
+            or any(f"/{part}" in f"/{path}" for part in SKIPPED_DIRS)
+        )
+
+    @staticmethod
+    def _lexical_scores(files: Dict[str, str], request_text: str) -> Dict[str, float]:
+        """Share of request terms found in each file, path matches weighted double"""
+        terms = _terms(request_text)
+        if not terms:
+            return {}
+
+        scores = {}
+        for path, content in files.items():
+            path_terms = _terms(path.replace("/", " ").replace(".", " "))
+            body_terms = _terms(content[:20000])
+            hits = 2 * len(terms & path_terms) + len(terms & body_terms)
+            if hits:
+                scores[path] = hits / (3 * len(terms))
+        return scores
+
+    @staticmethod
+    def _seeds(scores: Dict[str, float], editable: Set[str]) -> List[str]:
+        """The best-scoring editable files"""
+        return sorted((path for path in scores if path in editable), key=lambda p: -scores[p])[:5]
+
+    @staticmethod
+    def _import_neighbours(
+        files: Dict[str, str],
+        seeds: List[str],
+        max_hops: int = 2,
+        paths: Optional[Set[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Files reachable from the seeds through imports (either direction) -> hop count
+
+        Imports are read from the contents in files and resolved against
+        paths (default: the files themselves), so a listed but not yet
+        fetched path can be a neighbour.
+        """
+        if not seeds:
+            return {}
+
+        paths = set(files) if paths is None else paths
+        modules = {
+            path[:-3].replace("/", "."): path
+            for path in paths if path.endswith(".py")
+        }
+        graph: Dict[str, Set[str]] = {path: set() for path in paths}
+
+        for path, content in files.items():
+            directory = posixpath.dirname(path)
+            if path.endswith((".ts", ".tsx", ".js", ".jsx")):
+                for spec in _JS_IMPORT.findall(content):
+                    if spec.startswith("."):
+                        base = posixpath.normpath(posixpath.join(directory, spec))
+                    elif spec.startswith("@/"):
+                        base = spec[2:]
+                    else:
+                        continue  # Package import
+                    for ext in _JS_EXTENSIONS:
+                        for candidate in (base + ext, f"src/{base}{ext}"):
+                            if candidate in paths:
+                                graph[path].add(candidate)
+                                graph[candidate].add(path)
+            elif path.endswith(".py"):
+                for from_module, module in _PY_IMPORT.findall(content):
+                    name = from_module or module
+                    if name.startswith("."):
+                        package = directory.replace("/", ".")
+                        name = f"{package}{name}" if package else name.lstrip(".")
+                    # Match the module itself or any package-relative suffix of it
+                    for key, target in modules.items():
+                        if key == name or key.endswith(f".{name}"):
+                            graph[path].add(target)
+                            graph[target].add(path)
+
+        distances = {}
+        queue = deque((seed, 0) for seed in seeds)
+        seen = set(seeds)
+        while queue:
+            path, hops = queue.popleft()
+            if hops == max_hops:
+                continue
+            for neighbour in graph.get(path, ()):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    distances[neighbour] = hops + 1
+                    queue.append((neighbour, hops + 1))
+        return distances
+
+    @staticmethod
+    def _allowed_patterns(role: Optional[str]) -> List[str]:
+        """The role's glob patterns, so the agent may also create new files"""
+        if role is None:
+            return ["**/*"]
+        return list(get_file_restrictions(role)["allowed"])
+
+    # ---------- truncation ----------
+
+    @staticmethod
+    def _truncate(content: str, terms: Set[str], max_tokens: int) -> str:
+        """
+        Cut a file down to its most useful lines
+
+        Keeps the head (imports), definition signatures and a window around
+        lines mentioning request terms, in file order with elision markers.
+        """
+        lines = content.splitlines()
+        keep: Set[int] = set(range(min(30, len(lines))))
+
+        for i, line in enumerate(lines):
+            lowered = line.lower()
+            if _SIGNATURE.match(line):
+                keep.add(i)
+            if terms and any(term in lowered for term in terms):
+                keep.update(range(max(0, i - 3), min(len(lines), i + 4)))
+
+        budget = max_tokens * CHARS_PER_TOKEN
+        out: List[str] = []
+        size = 0
+        previous = -1
+        for i in sorted(keep):
+            if i != previous + 1:
+                marker = f"... {i - previous - 1} lines omitted ..."
+                out.append(marker)
+                size += len(marker) + 1
+            if size + len(lines[i]) + 1 > budget:
+                out.append(f"... truncated ({len(lines) - i} more lines) ...")
+                return "\n".join(out)
+            out.append(lines[i])
+            size += len(lines[i]) + 1
+            previous = i
+
+        if previous < len(lines) - 1:
+            out.append(f"... {len(lines) - 1 - previous} lines omitted ...")
+        return "\n".join(out)
+
+
+# Global instance
+context_packer = ContextPacker()
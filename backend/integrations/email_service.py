@@ -1,12 +1,10 @@
 """
 Email Service using SendGrid
-More reliable than Resend, works with any email
-Uses requests library to bypass SSL issues on university networks
+SendGrid settings and the OTP / team invite templates; delivery goes through email_outbox
 """
 
 import os
-import requests
-from typing import Optional
+from typing import Tuple
 
 # Initialize SendGrid
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
@@ -18,65 +16,13 @@ else:
     print("WARNING: SENDGRID_API_KEY not set, emails will print to console")
 
 
-def send_email_via_api(to_email: str, subject: str, html_content: str) -> bool:
+def otp_email(otp: str, name: str) -> Tuple[str, str]:
     """
-    Send email using SendGrid API with requests library
-    Bypasses SSL issues that occur with sendgrid-python on university networks
-    """
-    if not SENDGRID_API_KEY:
-        return False
-    
-    url = "https://api.sendgrid.com/v3/mail/send"
-    headers = {
-        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "personalizations": [{
-            "to": [{"email": to_email}]
-        }],
-        "from": {"email": FROM_EMAIL},
-        "subject": subject,
-        "content": [{
-            "type": "text/html",
-            "value": html_content
-        }]
-    }
-    
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        
-        if response.status_code == 202:
-            print(f"Email sent successfully to {to_email} (Status: {response.status_code})")
-            return True
-        else:
-            print(f"SendGrid API error: {response.status_code} - {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"Failed to send email: {str(e)}")
-        return False
-
-
-def send_otp_email(to_email: str, otp: str, name: str) -> bool:
-    """
-    Send OTP email to user
-    
-    Args:
-        to_email: Recipient email
-        otp: 6-digit OTP code
-        name: User's name
+    Subject and HTML body of the OTP email
     
     Returns:
-        True if sent successfully, False otherwise
+        (subject, html_content)
     """
-    if not SENDGRID_API_KEY:
-        print(f"\n{'='*60}")
-        print(f"FALLBACK OTP for {to_email}: {otp}")
-        print(f"{'='*60}\n")
-        return False
-    
     html_content = f"""
     <!DOCTYPE html>
     <html>
@@ -130,55 +76,22 @@ def send_otp_email(to_email: str, otp: str, name: str) -> bool:
     </html>
     """
     
-    result = send_email_via_api(
-        to_email=to_email,
-        subject=f"Your OPS-X Verification Code: {otp}",
-        html_content=html_content
-    )
-    
-    if not result:
-        print(f"\n{'='*60}")
-        print(f"FALLBACK OTP for {to_email}: {otp}")
-        print(f"{'='*60}\n")
-    
-    return result
+    return f"Your OPS-X Verification Code: {otp}", html_content
 
 
-def send_team_invite_email(
-    to_email: str,
+def team_invite_email(
     inviter_name: str,
     project_name: str,
     otp: str,
     role: str,
-    project_id: int,
-    stakeholder_id: int,
-    invite_url: str = "http://localhost:3000"
-) -> bool:
+    join_link: str
+) -> Tuple[str, str]:
     """
-    Send team invitation email with OTP
-    
-    Args:
-        to_email: Recipient email
-        inviter_name: Name of person sending invite
-        project_name: Name of the project
-        otp: 6-digit OTP code
-        role: Team member role
+    Subject and HTML body of the team invitation email
     
     Returns:
-        True if sent successfully, False otherwise
+        (subject, html_content)
     """
-    if not SENDGRID_API_KEY:
-        join_link = f"{invite_url}/join?code={otp}&project={project_id}&stakeholder={stakeholder_id}"
-        print(f"\n{'='*60}")
-        print(f"TEAM INVITE OTP for {to_email}: {otp}")
-        print(f"Project: {project_name} | Role: {role}")
-        print(f"Join Link: {join_link}")
-        print(f"{'='*60}\n")
-        return False
-    
-    # Build the invite link
-    join_link = f"{invite_url}/join?code={otp}&project={project_id}&stakeholder={stakeholder_id}"
-    
     html_content = f"""
     <!DOCTYPE html>
     <html>
@@ -290,16 +203,5 @@ def send_team_invite_email(
     </html>
     """
     
-    result = send_email_via_api(
-        to_email=to_email,
-        subject=f"Join {project_name} on OPS-X as {role}",
-        html_content=html_content
-    )
-    
-    if not result:
-        print(f"\n{'='*60}")
-        print(f"TEAM INVITE OTP for {to_email}: {otp}")
-        print(f"Project: {project_name} | Role: {role}")
-        print(f"{'='*60}\n")
-    
-    return result
+    return f"Join {project_name} on OPS-X as {role}", html_content
+
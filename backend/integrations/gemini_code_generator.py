@@ -5,50 +5,33 @@ Based on official Gemini API docs: https://ai.google.dev/gemini-api/docs/quickst
 
 import os
 import google.generativeai as genai
-from typing import Dict, List
+from typing import Dict, List, Optional
 import re
 import json
 
+from integrations.llm_gateway import llm_gateway
+from integrations.llm_cache import llm_cache
+from integrations.stream_parser import GEMINI, parse_files
 
-class GeminiCodeGenerator:
-    """Generate production-ready code using Gemini 2.5 with thinking mode"""
-    
-    def __init__(self):
-        """Initialize Gemini with API key from environment"""
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment")
-        
-        genai.configure(api_key=api_key)
-        
-        # Use Gemini 2.5 Flash with thinking mode for better reasoning
-        # https://ai.google.dev/gemini-api/docs/thinking
-        self.model = genai.GenerativeModel('gemini-2.0-flash-thinking-exp-01-21')
-        
-        print(f"Initialized Gemini Code Generator with thinking mode")
-    
-    def generate_nextjs_app(self, project_name: str, user_requirements: str) -> Dict[str, str]:
-        """
-        Generate a complete, functional Next.js application
-        
-        Args:
-            project_name: Name of the project
-            user_requirements: What the user wants to build
-            
-        Returns:
-            Dictionary mapping filename -> file content
-        """
-        
-        # Ultra-specific prompt based on Gemini best practices
-        prompt = f"""<ROLE>
+
+def _gemini_usage(response):
+    """(input, output, cached input) token counts when the SDK reports them"""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None:
+        return 0, 0
+    return (
+        metadata.prompt_token_count,
+        metadata.candidates_token_count,
+        getattr(metadata, "cached_content_token_count", 0) or 0
+    )
+
+
+# Ultra-specific prompt based on Gemini best practices.
+# Static instructions only: per-project details are appended after it.
+APP_PROMPT_PREFIX = """<ROLE>
 You are an expert full-stack developer generating a PRODUCTION Next.js 14 application for immediate deployment and live demo at a hackathon.
 </ROLE>
 
-<PROJECT_DETAILS>
-Project Name: {project_name}
-Requirements: {user_requirements}
-</PROJECT_DETAILS>
-
 <CRITICAL_RULES>
 This code will be:
 1. Git pushed to GitHub in 60 seconds
@@ -77,16 +60,14 @@ Use Next.js 14 App Router with:
 Keep it SIMPLE and FUNCTIONAL.
 </ARCHITECTURE>
 
-<WHAT_TO_BUILD>
-{user_requirements}
-
+<BUILD_GUIDELINES>
 If user wants a todo app: Build real CRUD with UUID generation, actual state management
 If user wants an idea generator: Build real random generation with clever algorithms
 If user wants a dashboard: Build real charts with mock but realistic data
 If user wants a game: Build actual game logic that works
 
 Match the vibe they request (dark/gothic/modern/minimal) in the Tailwind classes.
-</WHAT_TO_BUILD>
+</BUILD_GUIDELINES>
 
 <OUTPUT_FORMAT>
 Output ONLY the files, nothing else. Use this EXACT format:
@@ -114,40 +95,40 @@ For a "gothic noir todo app":
 
 ===FILE: app/page.tsx===
 'use client';
-import {{ useState, useEffect }} from 'react';
+import { useState, useEffect } from 'react';
 
-interface Todo {{
+interface Todo {
   id: string;
   text: string;
   done: boolean;
   createdAt: number;
-}}
+}
 
-export default function Home() {{
+export default function Home() {
   const [todos, setTodos] = useState<Todo[]>([]);
   const [input, setInput] = useState('');
   
-  useEffect(() => {{
+  useEffect(() => {
     const saved = localStorage.getItem('todos');
     if (saved) setTodos(JSON.parse(saved));
-  }}, []);
+  }, []);
   
-  const addTodo = () => {{
+  const addTodo = () => {
     if (!input.trim()) return;
-    const newTodo = {{
+    const newTodo = {
       id: crypto.randomUUID(),
       text: input,
       done: false,
       createdAt: Date.now()
-    }};
+    };
     const updated = [newTodo, ...todos];
     setTodos(updated);
     localStorage.setItem('todos', JSON.stringify(updated));
     setInput('');
-  }};
+  };
   
   // ... rest of REAL implementation
-}}
+}
 ===END===
 </EXAMPLE_GOOD>
 
@@ -157,18 +138,51 @@ DON'T DO THIS:
 - // TODO: Implement save logic  ❌ NOT IMPLEMENTED
 - <div>Placeholder content</div>  ❌ PLACEHOLDER
 - Using Prisma without setup  ❌ WON'T WORK
-</EXAMPLE_BAD>
+</EXAMPLE_BAD>"""
 
-Now generate the COMPLETE, WORKING, PRODUCTION-READY app for: {project_name}
-
-Remember: Real demo in 60 seconds. Make it work."""
 
+class GeminiCodeGenerator:
+    """Generate production-ready code using Gemini 2.5 with thinking mode"""
+    
+    def __init__(self):
+        """Initialize Gemini with API key from environment"""
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment")
+        
+        genai.configure(api_key=api_key)
+        
+        # Use Gemini 2.5 Flash with thinking mode for better reasoning
+        # https://ai.google.dev/gemini-api/docs/thinking
+        self.model_name = 'gemini-2.0-flash-thinking-exp-01-21'
+        self.model = genai.GenerativeModel(self.model_name)
+        
+        print(f"Initialized Gemini Code Generator with thinking mode")
+    
+    async def generate_nextjs_app(self, project_name: str, user_requirements: str) -> Dict[str, str]:
+        """
+        Generate a complete, functional Next.js application
+        
+        Args:
+            project_name: Name of the project
+            user_requirements: What the user wants to build
+            
+        Returns:
+            Dictionary mapping filename -> file content
+        """
+        
+        prompt = self._build_app_prompt(project_name, user_requirements)
+        
         try:
             print(f"Generating code for '{project_name}'...")
             print(f"Requirements: {user_requirements[:100]}...")
             
             # Generate content - Gemini will use its thinking mode internally
-            response = self.model.generate_content(prompt)
+            response = await llm_gateway.call(
+                "gemini",
+                lambda: self.model.generate_content_async(prompt),
+                usage=_gemini_usage
+            )
             
             if not response or not response.text:
                 raise ValueError("Gemini returned empty response")
@@ -194,6 +208,28 @@ Remember: Real demo in 60 seconds. Make it work."""
             print(f"ERROR generating with Gemini: {e}")
             raise
     
+    def _build_app_prompt(self, project_name: str, user_requirements: str) -> str:
+        """
+        Full-app generation prompt
+        
+        The long instructions are a constant prefix and the project details
+        come last, so repeat builds share a cacheable prompt prefix.
+        """
+        return f"""{APP_PROMPT_PREFIX}
+
+<PROJECT_DETAILS>
+Project Name: {project_name}
+Requirements: {user_requirements}
+</PROJECT_DETAILS>
+
+<WHAT_TO_BUILD>
+{user_requirements}
+</WHAT_TO_BUILD>
+
+Now generate the COMPLETE, WORKING, PRODUCTION-READY app for: {project_name}
+
+Remember: Real demo in 60 seconds. Make it work."""
+    
     def _parse_files(self, response_text: str) -> Dict[str, str]:
         """
         Parse files from Gemini response using our specific format
@@ -203,17 +239,8 @@ Remember: Real demo in 60 seconds. Make it work."""
         content
         ===END===
         """
-        files = {}
-        
-        # Pattern to match our file format
-        pattern = r'===FILE:\s*([^\n]+)\s*===\n(.*?)\n===END==='
-        matches = re.findall(pattern, response_text, re.DOTALL)
-        
-        if matches:
-            for filename, content in matches:
-                filename = filename.strip()
-                content = content.strip()
-                files[filename] = content
+        files = parse_files(response_text, formats=(GEMINI,))
+        if files:
             return files
         
         # Fallback: Try to find code blocks
@@ -243,23 +270,33 @@ Remember: Real demo in 60 seconds. Make it work."""
         
         return files
     
-    def generate_text(self, prompt: str) -> str:
+    async def generate_text(self, prompt: str, cache_ttl: Optional[float] = None) -> str:
         """
         Generate simple text response (for suggestions, etc.)
         
         Args:
             prompt: The prompt to send to Gemini
+            cache_ttl: Reuse the answer to an identical prompt for this many seconds
             
         Returns:
             Generated text response
         """
-        try:
-            response = self.model.generate_content(prompt)
+        async def generate() -> str:
+            response = await llm_gateway.call(
+                "gemini",
+                lambda: self.model.generate_content_async(prompt),
+                usage=_gemini_usage
+            )
             
             if not response or not response.text:
                 raise ValueError("Gemini returned empty response")
             
             return response.text
+        
+        try:
+            if cache_ttl:
+                return await llm_cache.get_or_compute("gemini", self.model_name, prompt, generate, ttl=cache_ttl)
+            return await generate()
             
         except Exception as e:
             print(f"ERROR generating text with Gemini: {e}")
@@ -5,8 +5,12 @@ Handles repo creation, branches, commits, and PRs
 
 import os
 import base64
+import asyncio
 import httpx
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
+
+# Never fetched as text
+BINARY_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.ico', '.woff', '.woff2', '.ttf', '.eot', '.svg')
 
 
 class GitHubAPIClient:
@@ -65,6 +69,35 @@ class GitHubAPIClient:
                     "error": error_msg
                 }
     
+    async def wait_until_ready(self, repo_full_name: str, timeout: float = 15.0) -> bool:
+        """
+        Poll until a freshly created repo is served by the API
+        
+        Replaces fixed sleeps after create_repo: returns as soon as GitHub
+        answers for the repo (usually immediately), backing off up to 2s.
+        """
+        deadline = asyncio.get_running_loop().time() + timeout
+        delay = 0.25
+        
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            while True:
+                try:
+                    response = await client.get(
+                        f"{self.base_url}/repos/{repo_full_name}",
+                        headers=self.headers
+                    )
+                    if response.status_code == 200:
+                        return True
+                except httpx.HTTPError:
+                    pass
+        
+                if asyncio.get_running_loop().time() + delay > deadline:
+                    print(f"⚠ {repo_full_name} not ready after {timeout:.0f}s")
+                    return False
+        
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 2.0)
+        
     async def initialize_empty_repo(self, repo_full_name: str) -> Dict:
         """Initialize an empty repo with a minimal README"""
         
@@ -333,7 +366,7 @@ class GitHubAPIClient:
                     for item in items:
                         if item["type"] == "file":
                             # Skip binary files
-                            if any(item["name"].endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.gif', '.ico', '.woff', '.woff2', '.ttf', '.eot', '.svg']):
+                            if item["name"].endswith(BINARY_EXTENSIONS):
                                 continue
                             
                             # Fetch file content individually (GitHub doesn't include content in directory listings)
@@ -371,6 +404,81 @@ class GitHubAPIClient:
             print(f"✓ Fetched {len(files)} files from {repo_full_name}")
             return files
     
+    async def list_repo_tree(self, repo_full_name: str, branch: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        List every file in a repository without downloading any of them
+
+        One git trees call (recursive) instead of a contents call per directory.
+
+        Args:
+            repo_full_name: Repository in format "username/repo-name"
+            branch: Branch to list (default: the repo's default branch)
+
+        Returns:
+            Dict of {file_path: {"sha": blob_sha, "size": bytes}}
+        """
+        async with httpx.AsyncClient(timeout=15.0) as client:
+            if branch is None:
+                repo_response = await client.get(f"{self.base_url}/repos/{repo_full_name}", headers=self.headers)
+                if repo_response.status_code != 200:
+                    print(f"❌ Repo not found: {repo_response.status_code}")
+                    return {}
+                branch = repo_response.json().get("default_branch", "main")
+
+            response = await client.get(
+                f"{self.base_url}/repos/{repo_full_name}/git/trees/{branch}?recursive=1",
+                headers=self.headers
+            )
+            if response.status_code != 200:
+                print(f"❌ Could not list {repo_full_name}@{branch}: HTTP {response.status_code}")
+                return {}
+
+            data = response.json()
+            if data.get("truncated"):
+                print(f"⚠️ Tree of {repo_full_name} truncated by GitHub; listing is partial")
+
+            return {
+                item["path"]: {"sha": item["sha"], "size": item.get("size", 0)}
+                for item in data.get("tree", [])
+                if item["type"] == "blob" and not item["path"].endswith(BINARY_EXTENSIONS)
+            }
+
+    async def fetch_blobs(self, repo_full_name: str, shas: Iterable[str], concurrency: int = 8) -> Dict[str, str]:
+        """
+        Download file contents by blob SHA, a few at a time
+
+        Args:
+            repo_full_name: Repository in format "username/repo-name"
+            shas: Blob SHAs from list_repo_tree
+            concurrency: Requests in flight at once
+
+        Returns:
+            Dict of {blob_sha: text}; binary or failed blobs are left out
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        blobs: Dict[str, str] = {}
+
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            async def fetch(sha: str):
+                async with semaphore:
+                    try:
+                        response = await client.get(
+                            f"{self.base_url}/repos/{repo_full_name}/git/blobs/{sha}",
+                            headers=self.headers
+                        )
+                        if response.status_code != 200:
+                            print(f"  ✗ blob {sha[:8]}: HTTP {response.status_code}")
+                            return
+                        blobs[sha] = base64.b64decode(response.json()["content"]).decode("utf-8")
+                    except UnicodeDecodeError:
+                        pass  # Binary file
+                    except Exception as e:
+                        print(f"  ✗ blob {sha[:8]}: {str(e)}")
+
+            await asyncio.gather(*(fetch(sha) for sha in set(shas)))
+
+        return blobs
+
     async def create_pull_request(
         self,
         repo_full_name: str,
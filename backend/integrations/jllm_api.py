@@ -4,9 +4,10 @@ Role-aware AI assistant for team chat rooms
 """
 
 import os
-import httpx
 from typing import List, Dict, Optional
 
+from integrations.llm_gateway import llm_gateway
+
 # JLLM Configuration
 JLLM_ENDPOINT = os.getenv("JLLM_API_ENDPOINT", "https://janitorai.com/hackathon/completions")
 JLLM_API_KEY = os.getenv("JLLM_API_KEY", "calhacks2047")
@@ -25,7 +26,8 @@ class JLLMAgent:
         message: str,
         chat_history: List[Dict[str, str]] = None,
         project_context: Optional[str] = None,
-        team_members: Optional[List[Dict]] = None
+        team_members: Optional[List[Dict]] = None,
+        system_context: Optional[str] = None
     ) -> str:
         """
         Get JLLM response to a message
@@ -35,12 +37,14 @@ class JLLMAgent:
             chat_history: Previous messages [{"role": "user", "content": "..."}]
             project_context: Project description
             team_members: List of team members with roles
+            system_context: Pre-rendered system context (skips rebuilding it)
         
         Returns:
             JLLM's response text
         """
         # Build context-aware system message
-        system_context = self._build_system_context(project_context, team_members)
+        if system_context is None:
+            system_context = self._build_system_context(project_context, team_members)
         
         # Build messages array
         messages = []
@@ -67,27 +71,26 @@ class JLLMAgent:
         })
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.endpoint,
-                    headers={
-                        "Authorization": self.api_key,
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "messages": messages,
-                        "max_tokens": 500
-                    },
-                    timeout=30.0
-                )
+            response = await llm_gateway.post(
+                "jllm",
+                self.endpoint,
+                headers={
+                    "Authorization": self.api_key,
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "messages": messages,
+                    "max_tokens": 500
+                }
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                return data["choices"][0]["message"]["content"]
+            else:
+                print(f"JLLM API error: {response.status_code} - {response.text}")
+                return "I'm having trouble responding right now. Please try again."
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    return data["choices"][0]["message"]["content"]
-                else:
-                    print(f"JLLM API error: {response.status_code} - {response.text}")
-                    return "I'm having trouble responding right now. Please try again."
-                    
         except Exception as e:
             print(f"JLLM error: {str(e)}")
             return "Sorry, I encountered an error. Please try again."
@@ -97,12 +100,24 @@ class JLLMAgent:
         project_context: Optional[str],
         team_members: Optional[List[Dict]]
     ) -> str:
-        """Build context string for JLLM"""
+        """
+        Build context string for JLLM
+        
+        Instructions shared by every project come first and project/team
+        details last, so the provider can reuse the common prompt prefix.
+        """
         context_parts = []
         
         context_parts.append("You are JLLM, an AI assistant helping a software development team collaborate on a startup MVP.")
         context_parts.append("You are role-aware and understand each team member's expertise.")
         
+        context_parts.append("\nYour job is to:")
+        context_parts.append("- Answer questions about the project")
+        context_parts.append("- Suggest task assignments based on roles")
+        context_parts.append("- Help resolve technical discussions")
+        context_parts.append("- Provide guidance on best practices")
+        context_parts.append("- Be concise and actionable")
+        
         if project_context:
             context_parts.append(f"\nPROJECT: {project_context}")
         
@@ -113,13 +128,6 @@ class JLLMAgent:
             ])
             context_parts.append(f"\nTEAM MEMBERS:\n{members_str}")
         
-        context_parts.append("\nYour job is to:")
-        context_parts.append("- Answer questions about the project")
-        context_parts.append("- Suggest task assignments based on roles")
-        context_parts.append("- Help resolve technical discussions")
-        context_parts.append("- Provide guidance on best practices")
-        context_parts.append("- Be concise and actionable")
-        
         return "\n".join(context_parts)
 
 
@@ -0,0 +1,290 @@
+"""
+LLM Response Cache - Disk-backed prompt/response cache for opt-in call sites
+Keyed by provider, model, normalized prompt and parameters, with TTL, LRU size bound and single-flight
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+# Defaults to backend/data/cache/llm regardless of the working directory
+LLM_CACHE_DIR = os.getenv(
+    "LLM_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cache", "llm")
+)
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+LLM_CACHE_DEFAULT_TTL = float(os.getenv("LLM_CACHE_DEFAULT_TTL", "86400"))
+
+
+def normalize_prompt(prompt: Any) -> Any:
+    """
+    Canonical form of a prompt for keying
+
+    Strips trailing whitespace per line, collapses blank-line runs and
+    surrounding whitespace, so reformatting a template doesn't miss the cache.
+    Works on strings, message lists and dicts.
+    """
+    if isinstance(prompt, str):
+        lines = [line.rstrip() for line in prompt.strip().splitlines()]
+        return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+    if isinstance(prompt, (list, tuple)):
+        return [normalize_prompt(p) for p in prompt]
+    if isinstance(prompt, dict):
+        return {k: normalize_prompt(v) for k, v in prompt.items()}
+    return prompt
+
+
+class LLMCache:
+    """
+    Prompt/response cache persisted under data/cache
+
+    One JSON file per entry, named <key>.<expires_at>.json so the index can be
+    rebuilt from a directory listing. Hits refresh the file mtime, which is the
+    LRU order used when the size bound is exceeded. Concurrent misses for the
+    same key share a single upstream call.
+    """
+
+    def __init__(
+        self,
+        directory: str = LLM_CACHE_DIR,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        default_ttl: float = LLM_CACHE_DEFAULT_TTL,
+        enabled: bool = LLM_CACHE_ENABLED
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+        # key -> (path, size, expires_at), least recently used first
+        self._index: Optional["OrderedDict[str, Tuple[str, int, float]]"] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "writes": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: Any, params: Optional[Dict] = None) -> str:
+        payload = json.dumps(
+            {
+                "provider": provider,
+                "model": model,
+                "prompt": normalize_prompt(prompt),
+                "params": params or {}
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get_or_compute(
+        self,
+        provider: str,
+        model: str,
+        prompt: Any,
+        compute: Callable[[], Awaitable[Any]],
+        params: Optional[Dict] = None,
+        ttl: Optional[float] = None
+    ) -> Any:
+        """
+        Return the cached response or compute, store and return it
+
+        Args:
+            provider: Provider name ("gemini", "v0", "jllm", ...)
+            model: Model identifier
+            prompt: Prompt text or message list (normalized for the key)
+            compute: Zero-arg coroutine factory making the real call; its
+                result must be JSON-serializable
+            params: Generation parameters that affect the output
+            ttl: Seconds to keep the entry (default LLM_CACHE_DEFAULT_TTL)
+
+        Errors from compute are never cached.
+        """
+        if not self.enabled:
+            return await compute()
+
+        key = self.make_key(provider, model, prompt, params)
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            hit, value = await asyncio.to_thread(self._read, key)
+            if hit:
+                self.stats["hits"] += 1
+                return value
+            # A concurrent miss may have started while we were reading
+            pending = self._inflight.get(key)
+
+        # Someone is already asking upstream: wait for their answer
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._inflight.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+
+        self._inflight.pop(key, None)
+        future.set_result(value)
+
+        try:
+            await asyncio.to_thread(self._write, key, value, ttl or self.default_ttl)
+        except Exception as e:
+            print(f"⚠️ LLM cache write failed: {e}")
+
+        return value
+
+    async def get(self, provider: str, model: str, prompt: Any, params: Optional[Dict] = None) -> Tuple[bool, Any]:
+        """
+        Look up a response without computing it
+
+        For streaming call sites that consume the response incrementally and
+        store the assembled result with put() afterwards.
+        """
+        if not self.enabled:
+            return False, None
+
+        hit, value = await asyncio.to_thread(self._read, self.make_key(provider, model, prompt, params))
+        self.stats["hits" if hit else "misses"] += 1
+        return hit, value
+
+    async def put(
+        self,
+        provider: str,
+        model: str,
+        prompt: Any,
+        value: Any,
+        params: Optional[Dict] = None,
+        ttl: Optional[float] = None
+    ):
+        """Store a response assembled outside get_or_compute()"""
+        if not self.enabled:
+            return
+
+        key = self.make_key(provider, model, prompt, params)
+        try:
+            await asyncio.to_thread(self._write, key, value, ttl or self.default_ttl)
+        except Exception as e:
+            print(f"⚠️ LLM cache write failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._index) if self._index is not None else None
+            size = self._bytes
+        return {**self.stats, "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._ensure_index()
+            for path, _, _ in self._index.values():
+                self._remove(path)
+            self._index.clear()
+            self._bytes = 0
+
+    # ---------- disk (worker threads) ----------
+
+    def _ensure_index(self):
+        if self._index is not None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            parts = name.split(".")
+            if len(parts) != 3 or parts[2] != "json":
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                expires_at = float(parts[1])
+                stat = os.stat(path)
+            except (ValueError, OSError):
+                continue
+            if expires_at <= now:
+                self._remove(path)
+                continue
+            found.append((stat.st_mtime, parts[0], path, stat.st_size, expires_at))
+
+        found.sort()
+        self._index = OrderedDict((key, (path, size, expires_at)) for _, key, path, size, expires_at in found)
+        self._bytes = sum(size for _, _, _, size, _ in found)
+
+    def _read(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            self._ensure_index()
+            entry = self._index.get(key)
+            if entry is None:
+                return False, None
+
+            path, size, expires_at = entry
+            if expires_at <= time.time():
+                self._drop(key)
+                return False, None
+
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+                os.utime(path)  # LRU survives restarts
+            except (OSError, ValueError):
+                self._drop(key)
+                return False, None
+
+            self._index.move_to_end(key)
+            return True, value
+
+    def _write(self, key: str, value: Any, ttl: float):
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        expires_at = int(time.time() + ttl)
+        path = os.path.join(self.directory, f"{key}.{expires_at}.json")
+
+        with self._lock:
+            self._ensure_index()
+            if key in self._index:
+                self._drop(key)
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self._index[key] = (path, len(data), expires_at)
+            self._bytes += len(data)
+            self.stats["writes"] += 1
+
+            while self._bytes > self.max_bytes and len(self._index) > 1:
+                oldest = next(iter(self._index))
+                self._drop(oldest)
+                self.stats["evictions"] += 1
+
+    def _drop(self, key: str):
+        path, size, _ = self._index.pop(key)
+        self._bytes -= size
+        self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Global instance
+llm_cache = LLMCache()
@@ -0,0 +1,436 @@
+"""
+LLM Gateway - Single async entry point for Claude, Gemini, v0 and JLLM
+Per-provider concurrency limits, timeouts, jittered retries, circuit breakers and metrics
+"""
+
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+# Retry policy (applies to timeouts, connection errors, 429 and 5xx)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "8"))
+
+# Circuit breaker: open after N consecutive failed calls, probe again after the reset window
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# provider -> (max concurrent calls, timeout seconds); override with LLM_<PROVIDER>_CONCURRENCY / _TIMEOUT
+LLM_PROVIDER_DEFAULTS = {
+    "claude": (4, 120.0),
+    "gemini": (4, 120.0),
+    "v0": (4, 180.0),
+    "jllm": (8, 30.0),
+}
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+LATENCY_WINDOW = 500  # Recent samples kept for percentiles
+
+
+class LLMGatewayError(Exception):
+    """Base error raised by the gateway itself"""
+
+
+class CircuitOpenError(LLMGatewayError):
+    """Provider is failing; calls are rejected until the breaker resets"""
+
+
+class LLMTimeoutError(LLMGatewayError):
+    """Provider call exceeded its timeout on every attempt"""
+
+
+class _RetryableStatus(Exception):
+    """HTTP response with a retryable status code"""
+
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError, _RetryableStatus)):
+        return True
+    # SDK errors (anthropic, google) carry a status code or a telling class name
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in RETRYABLE_STATUS:
+        return True
+    name = type(error).__name__
+    return any(marker in name for marker in ("Timeout", "Connection", "RateLimit", "Overloaded", "Unavailable"))
+
+
+class _Provider:
+    """Limits, breaker state and metrics for one provider"""
+
+    def __init__(self, name: str, concurrency: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+        # Circuit breaker
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+        # Metrics
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "input_tokens": 0,          # All prompt tokens, cached or not
+            "output_tokens": 0,
+            "cached_input_tokens": 0,   # Prompt tokens served from the provider's prefix cache
+            "cache_write_tokens": 0,    # Prompt tokens written to it (Anthropic bills these extra)
+            "cache_hits": 0,            # Calls that read anything from the cache
+        }
+        self.in_flight = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= LLM_BREAKER_RESET:
+            return "half_open"
+        return "open"
+
+    def admit(self) -> bool:
+        """
+        Reject the call if the breaker is open (one probe is let through when half-open)
+
+        Returns:
+            True if this call is the half-open probe; the caller must end the
+            probe (end_probe) however the call finishes
+        """
+        state = self.state
+        if state == "open" or (state == "half_open" and self.probing):
+            self.counters["rejected"] += 1
+            raise CircuitOpenError(f"{self.name} circuit open after {self.consecutive_failures} failures")
+        if state == "half_open":
+            self.probing = True
+            return True
+        return False
+
+    def end_probe(self):
+        """Let the next call probe again (e.g. the probe was cancelled before an outcome)"""
+        self.probing = False
+
+    def record_reachable(self):
+        """Probe ended in a non-retryable error: the provider answered, so close the breaker"""
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probing = False
+        # A failed half-open probe re-opens the breaker for another reset window
+        if self.opened_at is not None or self.consecutive_failures >= LLM_BREAKER_THRESHOLD:
+            if self.opened_at is None:
+                print(f"⚡ {self.name} circuit opened ({self.consecutive_failures} consecutive failures)")
+            self.opened_at = time.monotonic()
+
+    def add_usage(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cached_input_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ):
+        self.counters["input_tokens"] += input_tokens or 0
+        self.counters["output_tokens"] += output_tokens or 0
+        self.counters["cached_input_tokens"] += cached_input_tokens or 0
+        self.counters["cache_write_tokens"] += cache_write_tokens or 0
+        if cached_input_tokens:
+            self.counters["cache_hits"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self.latencies)
+        input_tokens = self.counters["input_tokens"]
+
+        def percentile(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 1)
+
+        return {
+            **self.counters,
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "timeout_s": self.timeout,
+            "circuit": self.state,
+            "latency_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(samples[-1], 1) if samples else None,
+            },
+            "prompt_cache": {
+                "hit_ratio": round(self.counters["cached_input_tokens"] / input_tokens, 3) if input_tokens else None,
+                "call_hit_ratio": round(self.counters["cache_hits"] / self.counters["successes"], 3) if self.counters["successes"] else None,
+            },
+            "last_error": self.last_error,
+        }
+
+
+class LLMGateway:
+    """
+    All model calls go through here
+
+    call() wraps an awaitable factory from a provider SDK; post() and stream()
+    send HTTP requests on a shared connection pool. Every attempt holds a
+    provider slot, is bounded by the provider timeout, and feeds the metrics.
+    Only transient failures are retried and counted toward the breaker.
+    """
+
+    def __init__(self):
+        self.providers: Dict[str, _Provider] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def provider(self, name: str) -> _Provider:
+        provider = self.providers.get(name)
+        if provider is None:
+            concurrency, timeout = LLM_PROVIDER_DEFAULTS.get(name, (4, 60.0))
+            provider = _Provider(
+                name,
+                int(os.getenv(f"LLM_{name.upper()}_CONCURRENCY", concurrency)),
+                float(os.getenv(f"LLM_{name.upper()}_TIMEOUT", timeout))
+            )
+            self.providers[name] = provider
+        return provider
+
+    async def call(
+        self,
+        provider_name: str,
+        fn: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        usage: Optional[Callable[[Any], Tuple[int, ...]]] = None
+    ) -> Any:
+        """
+        Run a provider call with limits, retries and metrics
+
+        Args:
+            provider_name: "claude", "gemini", "v0", "jllm", ...
+            fn: Zero-arg factory returning a fresh awaitable per attempt
+            timeout: Per-attempt timeout (defaults to the provider's)
+            retries: Extra attempts for transient failures
+            usage: Extracts (input_tokens, output_tokens[, cached_input_tokens,
+                cache_write_tokens]) from the result
+
+        Returns:
+            Whatever fn's awaitable returns
+
+        Raises:
+            CircuitOpenError, LLMTimeoutError, or the provider's own error
+        """
+        provider = self.provider(provider_name)
+        probe = provider.admit()
+        try:
+            return await self._call(provider, probe, fn, timeout, retries, usage)
+        finally:
+            if probe:
+                provider.end_probe()
+
+    async def _call(
+        self,
+        provider: _Provider,
+        probe: bool,
+        fn: Callable[[], Awaitable[Any]],
+        timeout: Optional[float],
+        retries: Optional[int],
+        usage: Optional[Callable[[Any], Tuple[int, ...]]]
+    ) -> Any:
+        provider_name = provider.name
+        provider.counters["calls"] += 1
+
+        timeout = timeout or provider.timeout
+        retries = LLM_MAX_RETRIES if retries is None else retries
+
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            try:
+                async with provider.semaphore:
+                    provider.in_flight += 1
+                    try:
+                        result = await asyncio.wait_for(fn(), timeout)
+                    finally:
+                        provider.in_flight -= 1
+            except Exception as e:
+                provider.latencies.append((time.perf_counter() - started) * 1000)
+                provider.last_error = f"{type(e).__name__}: {e}"[:300]
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                if timed_out:
+                    provider.counters["timeouts"] += 1
+
+                if not _is_retryable(e):
+                    provider.counters["failures"] += 1
+                    if probe:
+                        provider.record_reachable()
+                    raise
+
+                if attempt == retries:
+                    provider.counters["failures"] += 1
+                    provider.record_failure()
+                    if timed_out:
+                        raise LLMTimeoutError(f"{provider_name} timed out after {timeout:.0f}s") from e
+                    raise
+
+                provider.counters["retries"] += 1
+                delay = min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))  # Full jitter
+                continue
+
+            provider.latencies.append((time.perf_counter() - started) * 1000)
+            provider.counters["successes"] += 1
+            provider.record_success()
+
+            if usage:
+                try:
+                    provider.add_usage(*usage(result))
+                except Exception:
+                    pass  # Usage is best-effort
+
+            return result
+
+    async def post(
+        self,
+        provider_name: str,
+        url: str,
+        headers: Dict[str, str],
+        json: Dict[str, Any],
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None
+    ) -> httpx.Response:
+        """
+        POST a JSON request to an HTTP model API
+
+        Returns the final response; retryable statuses (429/5xx) are retried
+        and, if they persist, returned to the caller like any other status.
+        """
+        async def send():
+            response = await self._client().post(url, headers=headers, json=json, timeout=timeout or self.provider(provider_name).timeout)
+            if response.status_code in RETRYABLE_STATUS:
+                raise _RetryableStatus(response)
+            return response
+
+        try:
+            return await self.call(
+                provider_name,
+                send,
+                timeout=timeout,
+                retries=retries,
+                usage=_openai_usage
+            )
+        except _RetryableStatus as e:
+            return e.response
+
+    @asynccontextmanager
+    async def hold(self, provider_name: str):
+        """
+        Hold a provider slot around a streaming SDK call
+
+        For streams the caller drives itself (Anthropic messages.stream,
+        Gemini stream=True). Streams are not retried (chunks may already
+        have been consumed), but they count toward limits, breaker and metrics.
+        """
+        provider = self.provider(provider_name)
+        probe = provider.admit()
+        provider.counters["calls"] += 1
+
+        started = time.perf_counter()
+        try:
+            async with provider.semaphore:
+                provider.in_flight += 1
+                try:
+                    yield provider
+                except Exception as e:
+                    provider.counters["failures"] += 1
+                    provider.last_error = f"{type(e).__name__}: {e}"[:300]
+                    if _is_retryable(e):
+                        provider.record_failure()
+                    elif probe:
+                        provider.record_reachable()
+                    raise
+                else:
+                    provider.counters["successes"] += 1
+                    provider.record_success()
+                finally:
+                    provider.in_flight -= 1
+                    provider.latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            # Cancelled (or failed waiting for a slot) without an outcome
+            if probe:
+                provider.end_probe()
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        provider_name: str,
+        url: str,
+        headers: Dict[str, str],
+        json: Dict[str, Any],
+        timeout: Optional[float] = None
+    ):
+        """Stream a POST response while holding a provider slot"""
+        timeout = timeout or self.provider(provider_name).timeout
+
+        async with self.hold(provider_name):
+            async with self._client().stream("POST", url, headers=headers, json=json, timeout=timeout) as response:
+                yield response
+
+    def record_usage(
+        self,
+        provider_name: str,
+        input_tokens: int,
+        output_tokens: int,
+        cached_input_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ):
+        """Add token usage reported at the end of a stream"""
+        self.provider(provider_name).add_usage(input_tokens, output_tokens, cached_input_tokens, cache_write_tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-provider metrics"""
+        return {name: provider.snapshot() for name, provider in self.providers.items()}
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _client(self) -> httpx.AsyncClient:
+        # One pooled client for all HTTP providers (keeps TLS connections warm)
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            )
+        return self._http
+
+
+def _openai_usage(response: httpx.Response) -> Tuple[int, int, int]:
+    """Token usage (input, output, cached input) from an OpenAI-compatible JSON body"""
+    if response.status_code != 200:
+        return 0, 0, 0
+    usage = response.json().get("usage") or {}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), cached
+
+
+# Global instance
+llm_gateway = LLMGateway()
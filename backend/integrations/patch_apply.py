@@ -0,0 +1,190 @@
+"""
+Patch Apply - Local application of search/replace edits from code agents
+Lets models return small edits instead of whole files; failed edits are reported for full-file fallback
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Tuple
+
+from integrations.stream_parser import CLAUDE, parse_files
+
+# ---EDIT: path--- ... ---END EDIT---, containing one or more of:
+# <<<<<<< SEARCH / ======= / >>>>>>> REPLACE
+_EDIT_START = re.compile(r'^---EDIT:\s*(.+?)\s*-*\s*$')
+_EDIT_END = "---END EDIT---"
+_SEARCH = re.compile(r'^<{5,9} SEARCH\s*$')
+_DIVIDER = re.compile(r'^={5,9}\s*$')
+_REPLACE = re.compile(r'^>{5,9} REPLACE\s*$')
+
+EDIT_FORMAT_INSTRUCTIONS = """For files shown under CURRENT BACKEND FILES, return only the changed regions as edit blocks:
+---EDIT: path/to/file.py---
+<<<<<<< SEARCH
+[exact lines copied from the current file, enough to be unique]
+=======
+[replacement lines]
+>>>>>>> REPLACE
+---END EDIT---
+
+Rules for edits:
+- SEARCH text must match the current file exactly (including indentation) and occur once
+- Never include "... lines omitted ..." markers in SEARCH text
+- Use several SEARCH/REPLACE pairs in one EDIT block for several changes to the same file
+
+For NEW files, or when most of a file changes, return the complete file instead:
+---FILE: path/to/new_file.py---
+[complete file content here]
+---END FILE---
+"""
+
+
+class PatchError(Exception):
+    """An edit block could not be applied to its file"""
+
+
+class SearchReplace(NamedTuple):
+    search: str
+    replace: str
+
+
+def parse_edit_blocks(text: str) -> Tuple[Dict[str, List[SearchReplace]], Dict[str, str]]:
+    """
+    Parse ---EDIT--- blocks from a model response
+
+    Returns:
+        ({path: [SearchReplace, ...]}, {path: error}) - a file with a
+        malformed block is reported as an error instead of half-applied
+    """
+    edits: Dict[str, List[SearchReplace]] = {}
+    errors: Dict[str, str] = {}
+    path = None
+    state = None  # None, "search" or "replace" inside a block
+    search: List[str] = []
+    replace: List[str] = []
+
+    def malformed(reason: str):
+        errors[path] = reason
+
+    for line in text.split("\n"):
+        stripped = line.strip()
+
+        if path is None:
+            match = _EDIT_START.match(stripped)
+            if match:
+                path = match.group(1).strip()
+                edits.setdefault(path, [])
+            continue
+
+        if stripped == _EDIT_END:
+            if state is not None:
+                malformed("edit block ended inside SEARCH/REPLACE")
+            path, state = None, None
+            continue
+
+        if state is None:
+            if _SEARCH.match(stripped):
+                state, search, replace = "search", [], []
+        elif state == "search":
+            if _DIVIDER.match(stripped):
+                state = "replace"
+            elif _REPLACE.match(stripped):
+                malformed("SEARCH block without ======= divider")
+                state = None
+            else:
+                search.append(line)
+        else:
+            if _REPLACE.match(stripped):
+                edits[path].append(SearchReplace("\n".join(search), "\n".join(replace)))
+                state = None
+            else:
+                replace.append(line)
+
+    if state is not None:
+        malformed("response ended inside an edit block")
+
+    edits = {p: blocks for p, blocks in edits.items() if blocks and p not in errors}
+    return edits, errors
+
+
+def apply_edits(original: str, edits: List[SearchReplace]) -> str:
+    """
+    Apply search/replace edits in order
+
+    Each SEARCH must match exactly once. If it doesn't match verbatim, a
+    match ignoring trailing whitespace is tried before giving up.
+
+    Raises:
+        PatchError: A SEARCH matches zero or several times
+    """
+    content = original
+
+    for number, edit in enumerate(edits, 1):
+        if not edit.search.strip():
+            # Empty SEARCH on an empty file means "create with this content"
+            if content.strip():
+                raise PatchError(f"edit {number}: empty SEARCH on a non-empty file")
+            content = edit.replace
+            continue
+
+        count = content.count(edit.search)
+        if count == 1:
+            content = content.replace(edit.search, edit.replace, 1)
+            continue
+        if count > 1:
+            raise PatchError(f"edit {number}: SEARCH matches {count} times")
+
+        span = _fuzzy_find(content, edit.search)
+        if span is None:
+            raise PatchError(f"edit {number}: SEARCH text not found")
+        start, end = span
+        content = content[:start] + edit.replace + content[end:]
+
+    return content
+
+
+def apply_response(text: str, base_files: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Turn an agent response with EDIT and/or FILE blocks into new file contents
+
+    Args:
+        text: Model response
+        base_files: Full current contents the edits apply to
+
+    Returns:
+        (files, failed): new contents for every file that was changed, and
+        {path: reason} for edits that need a full-file fallback
+    """
+    files = parse_files(text, formats=(CLAUDE,))
+    edits, failed = parse_edit_blocks(text)
+
+    for path in list(failed):
+        if path in files:
+            del failed[path]  # The full file wins over edits to it
+
+    for path, blocks in edits.items():
+        if path in files:
+            continue
+        try:
+            files[path] = apply_edits(base_files.get(path, ""), blocks)
+        except PatchError as e:
+            failed[path] = str(e)
+
+    return files, failed
+
+
+def _fuzzy_find(content: str, search: str):
+    """(start, end) of the unique line-aligned match ignoring trailing whitespace, else None"""
+    lines = content.split("\n")
+    wanted = [line.rstrip() for line in search.strip("\n").split("\n")]
+    stripped = [line.rstrip() for line in lines]
+
+    matches = [
+        i for i in range(len(lines) - len(wanted) + 1)
+        if stripped[i:i + len(wanted)] == wanted
+    ]
+    if len(matches) != 1:
+        return None
+
+    start_line = matches[0]
+    start = sum(len(line) + 1 for line in lines[:start_line])
+    end = start + sum(len(line) + 1 for line in lines[start_line:start_line + len(wanted)]) - 1
+    return start, end
@@ -0,0 +1,171 @@
+"""
+Incremental multi-file parser for streamed LLM output
+Emits each file as soon as its end marker or closing fence arrives
+"""
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# Supported output formats
+CLAUDE = "claude"   # ---FILE: path--- ... ---END FILE---
+GEMINI = "gemini"   # ===FILE: path=== ... ===END===
+V0 = "v0"           # ```lang file="path" ... ```  (or a fence containing a // path comment line)
+ALL_FORMATS = (CLAUDE, GEMINI, V0)
+
+_CLAUDE_START = re.compile(r'^---FILE:\s*(.+?)\s*-*\s*$')
+_CLAUDE_END = "---END FILE---"
+_GEMINI_START = re.compile(r'^===FILE:\s*(.+?)\s*=*\s*$')
+_GEMINI_END = "===END==="
+_FENCE_WITH_FILE = re.compile(r'^```[\w.+-]*\s+file="([^"]+)"')
+_FENCE_OPEN = re.compile(r'^```[\w.+-]*\s*$')
+_FILENAME_COMMENT = re.compile(r'^(?://|#)\s*([^\s]+\.(?:tsx?|jsx?|json|css|js|ts|py|md|html))\b')
+
+
+class ParsedBlock(NamedTuple):
+    """One complete file from the model output"""
+    path: str
+    content: str
+    kind: str  # Format it was found in: claude, gemini or v0
+
+
+class StreamingFileParser:
+    """
+    Line-based incremental parser
+
+    feed() takes arbitrary chunks and returns the files completed by them;
+    finish() flushes the tail. Only complete lines are inspected, so a marker
+    split across chunks is still recognized, and each character is scanned
+    once instead of re-running DOTALL regexes over the whole response.
+    """
+
+    def __init__(self, formats: Iterable[str] = ALL_FORMATS):
+        self.formats = set(formats)
+        self._buffer = ""
+        self._kind: Optional[str] = None   # Open block format, None when outside a block
+        self._path: Optional[str] = None   # None for a fence that has not named its file yet
+        self._lines: List[str] = []
+        self.files: Dict[str, str] = {}
+
+    def feed(self, chunk: str) -> List[ParsedBlock]:
+        """Consume a chunk; return files whose end arrived in it"""
+        self._buffer += chunk
+        if "\n" not in self._buffer:
+            return []
+
+        *lines, self._buffer = self._buffer.split("\n")
+        completed = []
+        for line in lines:
+            block = self._line(line)
+            if block:
+                completed.append(block)
+        return completed
+
+    def finish(self) -> List[ParsedBlock]:
+        """Flush the last partial line and any block that may end without a marker"""
+        completed = []
+        if self._buffer:
+            block = self._line(self._buffer)
+            self._buffer = ""
+            if block:
+                completed.append(block)
+
+        # Claude's format tolerates a missing final ---END FILE---
+        if self._kind == CLAUDE:
+            block = self._close()
+            if block:
+                completed.append(block)
+        self._kind = None
+        self._lines = []
+        return completed
+
+    # ---------- internals ----------
+
+    def _line(self, line: str) -> Optional[ParsedBlock]:
+        if self._kind is None:
+            self._open(line)
+            return None
+
+        stripped = line.strip()
+
+        if self._kind == CLAUDE:
+            if _CLAUDE_END in line:
+                self._lines.append(line.split(_CLAUDE_END, 1)[0])
+                return self._close()
+            match = _CLAUDE_START.match(stripped)
+            if match:
+                # Next file started without an end marker
+                block = self._close()
+                self._start(CLAUDE, match.group(1))
+                return block
+
+        elif self._kind == GEMINI:
+            if stripped == _GEMINI_END:
+                return self._close()
+            match = _GEMINI_START.match(stripped)
+            if match:
+                self._kind = None
+                self._lines = []
+                self._start(GEMINI, match.group(1))
+                return None
+
+        elif self._kind == V0:
+            if stripped == "```":
+                # A fence that never named its file is dropped by _close()
+                return self._close()
+            if self._path is None:
+                # Unnamed fence: the first // path comment line names it,
+                # even after a blank or 'use client' line
+                match = _FILENAME_COMMENT.match(line)
+                if match:
+                    self._path = match.group(1)
+
+        self._lines.append(line)
+        return None
+
+    def _open(self, line: str):
+        stripped = line.strip()
+
+        if CLAUDE in self.formats:
+            match = _CLAUDE_START.match(stripped)
+            if match:
+                self._start(CLAUDE, match.group(1))
+                return
+
+        if GEMINI in self.formats:
+            match = _GEMINI_START.match(stripped)
+            if match:
+                self._start(GEMINI, match.group(1))
+                return
+
+        if V0 in self.formats:
+            match = _FENCE_WITH_FILE.match(stripped)
+            if match:
+                self._start(V0, match.group(1))
+                return
+            if _FENCE_OPEN.match(stripped):
+                self._start(V0, None)
+
+    def _start(self, kind: str, path: Optional[str]):
+        self._kind = kind
+        self._path = path.strip() if path else path
+        self._lines = []
+
+    def _close(self) -> Optional[ParsedBlock]:
+        kind, path, content = self._kind, self._path, "\n".join(self._lines).strip()
+        self._kind = None
+        self._path = None
+        self._lines = []
+
+        if not path:
+            return None
+        self.files[path] = content
+        return ParsedBlock(path, content, kind)
+
+
+def parse_files(text: str, formats: Iterable[str] = ALL_FORMATS) -> Dict[str, str]:
+    """Parse a complete response into {path: content}"""
+    parser = StreamingFileParser(formats)
+    parser.feed(text)
+    parser.finish()
+    return parser.files
+
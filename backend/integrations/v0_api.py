@@ -4,10 +4,15 @@ Uses V0's Model API for React/Next.js component generation
 """
 
 import os
-import httpx
+import asyncio
 from typing import Dict, List, Optional, Callable
 import json
 
+from integrations.llm_gateway import llm_gateway
+
+# Pages generated at once per app (the gateway's v0 limit still applies across apps)
+V0_PAGE_CONCURRENCY = int(os.getenv("V0_PAGE_CONCURRENCY", "4"))
+
 
 class V0Generator:
     """V0 API client for generating React/Next.js UI components"""
@@ -41,30 +46,30 @@ class V0Generator:
             # Enable streaming if callback provided
             stream = stream_callback is not None
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                if stream:
-                    # Streaming request
-                    response = await client.post(
-                        url,
-                        headers={
-                            "Authorization": f"Bearer {self.api_key}",
-                            "Content-Type": "application/json",
-                        },
-                        json={
-                            "model": "v0",
-                            "messages": [
-                                {
-                                    "role": "user",
-                                    "content": prompt
-                                }
-                            ],
-                            "max_tokens": 4096,
-                            "stream": True
-                        }
-                    )
-                    
+            if stream:
+                # Streaming request (holds a v0 slot until the stream is consumed)
+                full_content = ""
+                async with llm_gateway.stream(
+                    "v0",
+                    url,
+                    headers={
+                        "Authorization": f"Bearer {self.api_key}",
+                        "Content-Type": "application/json",
+                    },
+                    json={
+                        "model": "v0",
+                        "messages": [
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ],
+                        "max_tokens": 4096,
+                        "stream": True
+                    },
+                    timeout=60.0
+                ) as response:
                     # Process streaming response
-                    full_content = ""
                     async for line in response.aiter_lines():
                         if line.startswith("data: "):
                             data_str = line[6:]
@@ -89,76 +94,78 @@ class V0Generator:
                                             })
                             except json.JSONDecodeError:
                                 continue
+                
+                # Process final content
+                content = full_content
+                
+                # Clean up content
+                if content:
+                    # Remove thinking tags if present
+                    import re
+                    content = re.sub(r'<Thinking>.*?</Thinking>', '', content, flags=re.DOTALL)
+                    # Extract code from markdown blocks if present
+                    code_match = re.search(r'```(?:tsx|typescript|jsx|javascript)?\n(.*?)```', content, re.DOTALL)
+                    if code_match:
+                        content = code_match.group(1).strip()
                     
-                    # Process final content
-                    content = full_content
-                    
-                    # Clean up content
-                    if content:
-                        # Remove thinking tags if present
-                        import re
-                        content = re.sub(r'<Thinking>.*?</Thinking>', '', content, flags=re.DOTALL)
-                        # Extract code from markdown blocks if present
-                        code_match = re.search(r'```(?:tsx|typescript|jsx|javascript)?\n(.*?)```', content, re.DOTALL)
-                        if code_match:
-                            content = code_match.group(1).strip()
-                        
-                        return {
-                            "filename": f"components/{component_name}.tsx",
-                            "content": content,
-                            "preview_url": "",
-                        }
-                    else:
-                        print("V0 streaming returned no content")
-                        return None
-                        
+                    return {
+                        "filename": f"components/{component_name}.tsx",
+                        "content": content,
+                        "preview_url": "",
+                    }
                 else:
-                    # Non-streaming request
-                    response = await client.post(
-                        url,
-                        headers={
-                            "Authorization": f"Bearer {self.api_key}",
-                            "Content-Type": "application/json",
-                        },
-                        json={
-                            "model": "v0",
-                            "messages": [
-                                {
-                                    "role": "user",
-                                    "content": prompt
-                                }
-                            ],
-                            "max_tokens": 4096
-                        }
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        # V0 uses OpenAI format - extract from choices
-                        choices = data.get("choices", [])
-                        if choices and len(choices) > 0:
-                            content = choices[0].get("message", {}).get("content", "")
-                            if content:
-                                # Remove thinking tags if present
-                                import re
-                                # Remove <Thinking>...</Thinking> blocks
-                                content = re.sub(r'<Thinking>.*?</Thinking>', '', content, flags=re.DOTALL)
-                                # Extract code from markdown blocks if present
-                                code_match = re.search(r'```(?:tsx|typescript|jsx|javascript)?\n(.*?)```', content, re.DOTALL)
-                                if code_match:
-                                    content = code_match.group(1).strip()
-                                
-                                return {
-                                    "filename": f"components/{component_name}.tsx",
-                                    "content": content,
-                                    "preview_url": "",  # V0 doesn't return preview URL in this format
-                                }
-                        print("V0 API returned no content")
-                        return None
-                    else:
-                        print(f"V0 API error: {response.status_code} - {response.text}")
-                        return None
+                    print("V0 streaming returned no content")
+                    return None
                     
+            else:
+                # Non-streaming request
+                response = await llm_gateway.post(
+                    "v0",
+                    url,
+                    headers={
+                        "Authorization": f"Bearer {self.api_key}",
+                        "Content-Type": "application/json",
+                    },
+                    json={
+                        "model": "v0",
+                        "messages": [
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ],
+                        "max_tokens": 4096
+                    },
+                    timeout=60.0
+                )
+                
+                if response.status_code == 200:
+                    data = response.json()
+                    # V0 uses OpenAI format - extract from choices
+                    choices = data.get("choices", [])
+                    if choices and len(choices) > 0:
+                        content = choices[0].get("message", {}).get("content", "")
+                        if content:
+                            # Remove thinking tags if present
+                            import re
+                            # Remove <Thinking>...</Thinking> blocks
+                            content = re.sub(r'<Thinking>.*?</Thinking>', '', content, flags=re.DOTALL)
+                            # Extract code from markdown blocks if present
+                            code_match = re.search(r'```(?:tsx|typescript|jsx|javascript)?\n(.*?)```', content, re.DOTALL)
+                            if code_match:
+                                content = code_match.group(1).strip()
+                            
+                            return {
+                                "filename": f"components/{component_name}.tsx",
+                                "content": content,
+                                "preview_url": "",  # V0 doesn't return preview URL in this format
+                            }
+                    print("V0 API returned no content")
+                    return None
+                else:
+                    print(f"V0 API error: {response.status_code} - {response.text}")
+                    return None
+                
         except Exception as e:
             print(f"V0 API exception: {e}")
             return None
@@ -184,48 +191,99 @@ class V0Generator:
         if not self.api_key:
             return {}
         
-        files = {}
+        standard_files = self._generate_standard_files(project_name)
+        design_context = self._design_context(project_name, pages)
         
-        # Generate main page
-        main_page_prompt = f"""
+        # (route file, component name, prompt) per page, main page first;
+        # pages sharing a route are generated once
+        jobs = [(
+            "src/app/page.tsx",
+            "page",
+            f"""
         Create the main landing page for {project_name}.
         Requirements: {prompt}
         Use shadcn/ui components, Tailwind CSS, and Lucide icons.
         Make it modern, responsive, and visually appealing.
+        {design_context}
         """
-        
-        main_page = await self.generate_ui_component(
-            prompt=main_page_prompt,
-            component_name="page",
-            stream_callback=stream_callback
-        )
-        
-        if main_page:
-            files["src/app/page.tsx"] = main_page["content"]
-        
-        # Generate additional pages
+        )]
+        routes = {"src/app/page.tsx"}
         for page_name in pages:
-            if page_name.lower() != "home":
-                page_prompt = f"""
+            slug = page_name.lower().replace(" ", "-")
+            route = f"src/app/{slug}/page.tsx"
+            if slug == "home" or route in routes:
+                continue
+            routes.add(route)
+            jobs.append((
+                route,
+                slug,
+                f"""
                 Create the {page_name} page for {project_name}.
                 Requirements: {prompt}
                 Use shadcn/ui components, Tailwind CSS, and Lucide icons.
+                {design_context}
                 """
-                
-                page_component = await self.generate_ui_component(
+            ))
+        
+        # Pages are independent given the shared context, so fan them out;
+        # the app takes about as long as its slowest page
+        semaphore = asyncio.Semaphore(V0_PAGE_CONCURRENCY)
+        
+        async def generate_page(component_name: str, page_prompt: str) -> Optional[Dict[str, str]]:
+            async with semaphore:
+                return await self.generate_ui_component(
                     prompt=page_prompt,
-                    component_name=page_name.lower(),
-                    stream_callback=stream_callback
+                    component_name=component_name,
+                    stream_callback=self._page_callback(stream_callback, component_name)
                 )
-                
-                if page_component:
-                    files[f"src/app/{page_name.lower()}/page.tsx"] = page_component["content"]
+        
+        results = await asyncio.gather(*[
+            generate_page(component_name, page_prompt)
+            for _, component_name, page_prompt in jobs
+        ])
+        
+        # Merge in job order (not completion order) so output is deterministic
+        files = {}
+        for (route, _, _), page_component in zip(jobs, results):
+            if page_component:
+                files[route] = page_component["content"]
         
         # Add standard Next.js files
-        files.update(self._generate_standard_files(project_name))
+        files.update(standard_files)
         
         return files
     
+    def _design_context(self, project_name: str, pages: List[str]) -> str:
+        """
+        Shared instructions prepended to every page prompt
+        
+        Pages are generated independently, so they share the theme tokens and
+        root layout from _generate_standard_files plus the route map for
+        navigation instead of seeing each other's output.
+        """
+        routes = ["/"] + [
+            f"/{name.lower().replace(' ', '-')}" for name in pages if name.lower() != "home"
+        ]
+        
+        return f"""
+        Shared design system for {project_name} (all pages must follow it):
+        - Root layout (src/app/layout.tsx) already renders <html>, <body> and the Inter font; export only the page component
+        - Theme colors come from CSS variables: use bg-background, text-foreground, bg-card, text-card-foreground, bg-primary, text-primary-foreground
+        - Border radius uses rounded-lg / rounded-md / rounded-sm (driven by --radius); support the .dark class
+        - App routes for navigation links: {", ".join(routes)}
+        """
+    
+    @staticmethod
+    def _page_callback(stream_callback: Optional[Callable], page: str) -> Optional[Callable]:
+        """Tag streaming updates with their page, since pages now stream concurrently"""
+        if stream_callback is None:
+            return None
+        
+        async def callback(update: Dict):
+            await stream_callback({**update, "page": page})
+        
+        return callback
+    
     def _generate_standard_files(self, project_name: str) -> Dict[str, str]:
         """Generate standard Next.js configuration files"""
         
@@ -8,10 +8,16 @@ NO Gemini. NO Prisma. JUST V0.
 
 import os
 import httpx
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 import json
 import re
 
+from integrations.llm_gateway import llm_gateway, LLMTimeoutError
+from integrations.llm_cache import llm_cache
+from integrations.stream_parser import V0, ParsedBlock, StreamingFileParser, parse_files
+
+FULL_APP_MAX_TOKENS = 16000  # Plenty for a full app
+
 
 class V0CleanGenerator:
     """Pure V0 code generator using official V0 Model API"""
@@ -32,7 +38,8 @@ class V0CleanGenerator:
         self,
         project_name: str,
         user_requirements: str,
-        pages: List[str] = None
+        pages: List[str] = None,
+        cache_ttl: Optional[float] = None
     ) -> Dict[str, str]:
         """
         Generate a complete Next.js app using ONLY V0
@@ -41,6 +48,7 @@ class V0CleanGenerator:
             project_name: Name of the project
             user_requirements: What the user wants to build
             pages: Optional list of pages to generate
+            cache_ttl: Reuse the result of an identical prompt for this many seconds
             
         Returns:
             Dictionary mapping filename -> file content
@@ -49,9 +57,93 @@ class V0CleanGenerator:
         if pages is None:
             pages = ["Home", "Dashboard"]
         
-        # Craft V0-specific prompt based on their docs
-        # V0 is framework-aware and optimized for Next.js
-        prompt = f"""Create a complete, SELF-CONTAINED, production-ready Next.js 14 application called "{project_name}".
+        prompt = self._build_full_app_prompt(project_name, user_requirements, pages)
+        
+        try:
+            print(f"Generating full app with V0 for '{project_name}'...")
+            print(f"Using model: {self.model}")
+            
+            # Identical build prompts can opt in to the response cache
+            if cache_ttl:
+                return await llm_cache.get_or_compute(
+                    "v0",
+                    self.model,
+                    prompt,
+                    lambda: self._request_files(prompt),
+                    params={"max_completion_tokens": FULL_APP_MAX_TOKENS},
+                    ttl=cache_ttl
+                )
+            
+            return await self._request_files(prompt)
+        
+        except (httpx.TimeoutException, LLMTimeoutError):
+            print("V0 request timed out")
+            raise Exception("V0 request timed out after 120 seconds")
+        except Exception as e:
+            print(f"V0 generation error: {e}")
+            raise
+    
+    async def stream_full_app(
+        self,
+        project_name: str,
+        user_requirements: str,
+        pages: List[str] = None,
+        cache_ttl: Optional[float] = None
+    ) -> AsyncIterator[ParsedBlock]:
+        """
+        Streaming variant of generate_full_app
+        
+        Yields each file as soon as v0 finishes it, so a build pipeline can
+        push and index early files while later ones are still generating.
+        Shares cache entries with generate_full_app.
+        """
+        if pages is None:
+            pages = ["Home", "Dashboard"]
+        
+        prompt = self._build_full_app_prompt(project_name, user_requirements, pages)
+        params = {"max_completion_tokens": FULL_APP_MAX_TOKENS}
+        
+        if cache_ttl:
+            hit, cached = await llm_cache.get("v0", self.model, prompt, params=params)
+            if hit:
+                print(f"Reusing cached V0 build for '{project_name}' ({len(cached)} files)")
+                for path, content in cached.items():
+                    yield ParsedBlock(path, content, V0)
+                return
+        
+        print(f"Streaming full app with V0 for '{project_name}'...")
+        parser = StreamingFileParser(formats=(V0,))
+        accumulated = ""
+        
+        async for content in self._stream_text(prompt, max_completion_tokens=FULL_APP_MAX_TOKENS):
+            accumulated += content
+            for block in parser.feed(content):
+                yield block
+        
+        for block in parser.finish():
+            yield block
+        
+        files = dict(parser.files)
+        
+        # Same fallback as _parse_v0_response, for files v0 didn't fence
+        if len(files) < 3:
+            for path, content in self._extract_core_nextjs_files(accumulated).items():
+                if path not in files:
+                    files[path] = content
+                    yield ParsedBlock(path, content, V0)
+        
+        if not files:
+            print("Response preview:", accumulated[:500])
+            raise Exception("Failed to parse files from V0 response")
+        
+        print(f"V0 streamed {len(files)} files")
+        
+        if cache_ttl:
+            await llm_cache.put("v0", self.model, prompt, files, params=params, ttl=cache_ttl)
+    
+    def _build_full_app_prompt(self, project_name: str, user_requirements: str, pages: List[str]) -> str:
+        """Full-app prompt (V0 is framework-aware and optimized for Next.js)"""
+        return f"""Create a complete, SELF-CONTAINED, production-ready Next.js 14 application called "{project_name}".
 
 USER REQUIREMENTS: {user_requirements}
 
@@ -90,63 +182,55 @@ Generate ALL necessary files for a working Next.js app:
 Make it beautiful, functional, and ready to deploy immediately to Vercel.
 
 Output the complete code for each file."""
-
-        try:
-            print(f"Generating full app with V0 for '{project_name}'...")
-            print(f"Using model: {self.model}")
-            
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": prompt
-                            }
-                        ],
-                        "stream": False,  # Non-streaming for simplicity
-                        "max_completion_tokens": 16000  # Plenty for a full app
+    
+    async def _request_files(self, prompt: str) -> Dict[str, str]:
+        """Send one full-app prompt to v0 and parse the files out of the reply"""
+        response = await llm_gateway.post(
+            "v0",
+            f"{self.base_url}/chat/completions",
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self.model,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
                     }
-                )
-                
-                if response.status_code != 200:
-                    error_text = response.text
-                    print(f"V0 API error ({response.status_code}): {error_text}")
-                    raise Exception(f"V0 API error: {error_text}")
-                
-                result = response.json()
-                
-                # Extract content from OpenAI-compatible response
-                content = result["choices"][0]["message"]["content"]
-                
-                print(f"V0 response length: {len(content)} characters")
-                
-                # Parse files from V0's response
-                files = self._parse_v0_response(content)
-                
-                if not files:
-                    print("WARNING: No files parsed from V0 response")
-                    print("Response preview:", content[:500])
-                    raise Exception("Failed to parse files from V0 response")
-                
-                print(f"Successfully parsed {len(files)} files from V0:")
-                for filename in files.keys():
-                    print(f"  ✓ {filename}")
-                
-                return files
+                ],
+                "stream": False,  # Non-streaming for simplicity
+                "max_completion_tokens": FULL_APP_MAX_TOKENS
+            },
+            timeout=120.0
+        )
         
-        except httpx.TimeoutException:
-            print("V0 request timed out")
-            raise Exception("V0 request timed out after 120 seconds")
-        except Exception as e:
-            print(f"V0 generation error: {e}")
-            raise
+        if response.status_code != 200:
+            error_text = response.text
+            print(f"V0 API error ({response.status_code}): {error_text}")
+            raise Exception(f"V0 API error: {error_text}")
+        
+        result = response.json()
+        
+        # Extract content from OpenAI-compatible response
+        content = result["choices"][0]["message"]["content"]
+        
+        print(f"V0 response length: {len(content)} characters")
+        
+        # Parse files from V0's response
+        files = self._parse_v0_response(content)
+        
+        if not files:
+            print("WARNING: No files parsed from V0 response")
+            print("Response preview:", content[:500])
+            raise Exception("Failed to parse files from V0 response")
+        
+        print(f"Successfully parsed {len(files)} files from V0:")
+        for filename in files.keys():
+            print(f"  ✓ {filename}")
+        
+        return files
     
     def _parse_v0_response(self, content: str) -> Dict[str, str]:
         """
@@ -154,26 +238,8 @@ Output the complete code for each file."""
         
         V0 typically returns code in markdown blocks with filenames
         """
-        files = {}
-        
-        # Method 1: Look for ```language file="path/to/file.ext"
-        file_pattern = r'```[\w]+\s+file="([^"]+)"\n(.*?)```'
-        matches = re.findall(file_pattern, content, re.DOTALL)
-        
-        for filename, code in matches:
-            files[filename] = code.strip()
-        
-        # Method 2: Look for standard markdown blocks with filename comments
-        # ```typescript
-        # // app/page.tsx
-        if not files:
-            blocks = re.findall(r'```[\w]*\n(.*?)```', content, re.DOTALL)
-            for block in blocks:
-                # Try to extract filename from comment
-                filename_match = re.search(r'^(?://|#)\s*([^\n]+\.(?:tsx?|jsx?|json|css|js|ts))', block, re.MULTILINE)
-                if filename_match:
-                    filename = filename_match.group(1).strip()
-                    files[filename] = block.strip()
+        # ```lang file="path" blocks, or plain fences whose first line is a // path comment
+        files = parse_files(content, formats=(V0,))
         
         # Method 3: If V0 structured it differently, look for common Next.js files
         if not files or len(files) < 3:
@@ -230,48 +296,61 @@ Generate a complete, working app with:
 Output all necessary files."""
 
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "stream": True
-                    }
-                ) as response:
-                    accumulated = ""
-                    
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data_str = line[6:]
-                            
-                            if data_str == "[DONE]":
-                                break
-                            
-                            try:
-                                chunk = json.loads(data_str)
-                                delta = chunk["choices"][0].get("delta", {})
-                                content = delta.get("content", "")
-                                
-                                if content:
-                                    accumulated += content
-                                    # Call callback with progress
-                                    await stream_callback(content, accumulated)
-                            
-                            except json.JSONDecodeError:
-                                continue
-                    
-                    # Parse final result
-                    return self._parse_v0_response(accumulated)
+            parser = StreamingFileParser(formats=(V0,))
+            accumulated = ""
+            
+            async for content in self._stream_text(prompt):
+                accumulated += content
+                parser.feed(content)
+                # Call callback with progress
+                await stream_callback(content, accumulated)
+            
+            parser.finish()
+            files = dict(parser.files)
+            if len(files) < 3:
+                files.update(self._extract_core_nextjs_files(accumulated))
+            return files
         
         except Exception as e:
             print(f"V0 streaming error: {e}")
             raise
+    
+    async def _stream_text(self, prompt: str, max_completion_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield content deltas from a streaming v0 completion"""
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True
+        }
+        if max_completion_tokens:
+            payload["max_completion_tokens"] = max_completion_tokens
+        
+        async with llm_gateway.stream(
+            "v0",
+            f"{self.base_url}/chat/completions",
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            json=payload,
+            timeout=120.0
+        ) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                
+                data_str = line[6:]
+                if data_str == "[DONE]":
+                    break
+                
+                try:
+                    chunk = json.loads(data_str)
+                except json.JSONDecodeError:
+                    continue
+                
+                content = chunk["choices"][0].get("delta", {}).get("content", "")
+                if content:
+                    yield content
 
 
 # Singleton instance
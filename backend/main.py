@@ -5,6 +5,7 @@ Main FastAPI application with MCP endpoint registration
 
 import os
 import sys
+import asyncio
 from pathlib import Path
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
@@ -70,10 +71,53 @@ async def lifespan(app: FastAPI):
         print(f"WARNING: Database initialization failed: {e}")
         print("Make sure PostgreSQL is running and DATABASE_URL is correct")
     
+    # Start the refinement workers (jobs left pending by a previous run are picked up);
+    # their status changes are pushed from worker threads onto this loop and relayed to other workers
+    from refinement_queue import refinement_queue
+    from refinement_events import refinement_events
+    await refinement_events.start()
+    await refinement_queue.start()
+    
+    # Apply stored GitHub webhook deliveries in the background
+    from webhook_queue import webhook_queue
+    await webhook_queue.start()
+    
+    # Deliver queued OTP / invite emails
+    from email_outbox import email_outbox
+    await email_outbox.start()
+    
+    # Periodic sweep of expired OTPs / invite codes
+    from ttl_store import ttl_store
+    await ttl_store.start()
+    
     yield
     
     # Cleanup on shutdown
     print(" Shutting down OPS-X Backend Server...")
+    
+    # Stop the refinement, webhook and email workers, persist MCP room counters, flush chat messages
+    # still waiting for a group commit, then finish indexing queued chat memory
+    from chat_rooms import chat_room_store
+    from chat_writer import chat_writer
+    from integrations.chat_memory import chat_memory
+    await refinement_queue.stop()
+    await refinement_events.close()
+    await webhook_queue.stop()
+    await email_outbox.stop()
+    await chat_room_store.close()
+    await chat_writer.close()
+    await chat_memory.close()
+    
+    # Stop the TTL sweep and release its Redis connection (if any)
+    await ttl_store.close()
+    
+    # Close pooled LLM provider connections
+    from integrations.llm_gateway import llm_gateway
+    await llm_gateway.close()
+    
+    # Release pooled database connections
+    from database import close_db
+    await close_db()
 
 
 # Create FastAPI app
@@ -91,8 +135,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Primary-Until"],  # Read-your-writes pin (database.py)
 )
 
+# Per-request query count / DB time (headers in dev, /metrics always)
+from database import engine, async_engine, replica_router, ReadYourWritesMiddleware
+from query_budget import query_monitor, QueryBudgetMiddleware
+query_monitor.install(engine)
+query_monitor.install(async_engine.sync_engine)
+for replica_engine in replica_router.engines:
+    query_monitor.install(replica_engine.sync_engine)
+app.add_middleware(QueryBudgetMiddleware)
+
+# Read replicas: clients that just wrote keep reading from the primary
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Create Socket.IO server for real-time chat
 sio = socketio.AsyncServer(
     async_mode='asgi',
@@ -144,6 +201,40 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Runtime metrics: LLM providers, chat write path, caches and per-route DB queries"""
+    from integrations.llm_gateway import llm_gateway
+    from integrations.llm_cache import llm_cache
+    from chat_writer import chat_writer
+    from project_context import project_context_cache
+    from chat_replay import chat_replay
+    from refinement_queue import refinement_queue
+    from query_budget import query_monitor
+    from refinement_events import refinement_events
+    from database import replica_router
+    from ttl_store import ttl_store
+    from auth_sessions import session_resolver
+    from webhook_queue import webhook_queue
+    from email_outbox import email_outbox
+    
+    return {
+        "llm": llm_gateway.snapshot(),
+        "llm_cache": llm_cache.snapshot(),
+        "chat_writer": chat_writer.stats,
+        "project_context_cache": project_context_cache.stats,
+        "chat_replay": chat_replay.stats,
+        "refinement_queue": refinement_queue.stats,
+        "refinement_events": refinement_events.stats,
+        "webhook_queue": webhook_queue.stats,
+        "email_outbox": email_outbox.stats,
+        "ttl_store": ttl_store.snapshot(),
+        "auth_sessions": session_resolver.snapshot(),
+        "db_queries": query_monitor.snapshot(),
+        "db_replicas": replica_router.snapshot()
+    }
+
+
 # Socket.IO event handlers
 @sio.event
 async def connect(sid, environ):
@@ -157,10 +248,67 @@ async def disconnect(sid):
 
 @sio.event
 async def join_room(sid, data):
-    """Join a project chat room"""
+    """
+    Join a project chat room
+    
+    Reconnecting clients pass last_seen_id (highest message id they have) and
+    receive only the messages they missed as chat:replay events. Each chunk
+    must be acknowledged before the next is sent; if one is not, the replay
+    stops there. The return value is the ack for the join itself, with the
+    cursor of the last acknowledged chunk.
+    """
+    from chat_replay import chat_replay, chunk_messages, CHAT_REPLAY_ACK_TIMEOUT
+    
     room_id = data.get('room_id')
+    last_seen_id = data.get('last_seen_id')
     await sio.enter_room(sid, room_id)
     print(f"👥 Client {sid} joined room {room_id}")
+    
+    if last_seen_id is None:
+        return {"room_id": room_id, "replayed": 0, "cursor": None}
+    
+    try:
+        last_seen_id = int(last_seen_id)
+    except (TypeError, ValueError):
+        return {"room_id": room_id, "replayed": 0, "cursor": None, "error": "Invalid last_seen_id"}
+    
+    replay = await chat_replay.replay(str(room_id), last_seen_id)
+    messages = replay["messages"]
+    project_id = int(room_id) if str(room_id).isdigit() else room_id
+    
+    cursor = last_seen_id
+    replayed = 0
+    for chunk in chunk_messages(messages):
+        try:
+            await sio.call(
+                "chat:replay",
+                {
+                    "project_id": project_id,
+                    "messages": chunk,
+                    "cursor": chunk[-1]["id"],
+                    "source": replay["source"],
+                    "truncated": replay["truncated"]
+                },
+                to=sid,
+                timeout=CHAT_REPLAY_ACK_TIMEOUT
+            )
+        except socketio.exceptions.SocketIOError as e:
+            # Unacknowledged: the client rejoins with its own cursor
+            print(f"⚠️ Replay to {sid} stopped at cursor {cursor}: {e!r}")
+            break
+        cursor = chunk[-1]["id"]
+        replayed += len(chunk)
+    
+    print(f"🔁 Replayed {replayed}/{len(messages)} messages to {sid} from {replay['source']}")
+    
+    return {
+        "room_id": room_id,
+        "replayed": replayed,
+        "cursor": cursor,
+        "source": replay["source"],
+        "truncated": replay["truncated"]
+    }
+
 
 @sio.event
 async def leave_room(sid, data):
@@ -95,7 +95,7 @@ async def build_app(request: AppBuildRequest, background_tasks: BackgroundTasks)
         else:
             generator = gemini_code_generator
         
-        files = generator.generate_nextjs_app(project_name, full_prompt)
+        files = await generator.generate_nextjs_app(project_name, full_prompt)
         
         if not files:
             raise HTTPException(
@@ -132,8 +132,8 @@ async def build_app(request: AppBuildRequest, background_tasks: BackgroundTasks)
         # Step 3: Push files to GitHub
         print(f"Pushing code to GitHub: {repo_full_name}")
         
-        # Give GitHub a moment to initialize the repo
-        await asyncio.sleep(2)
+        # Wait until GitHub serves the new repo (instead of a fixed delay)
+        await github_client.wait_until_ready(repo_full_name)
         
         push_result = await github_client.push_multiple_files(
             repo_full_name=repo_full_name,
@@ -163,7 +163,7 @@ async def build_app_hybrid_stream(request: AppBuildRequest):
                 generator = gemini_code_generator
             
             # Generate with Gemini
-            gemini_files = generator.generate_nextjs_app(
+            gemini_files = await generator.generate_nextjs_app(
                 project_name=project_name,
                 user_requirements=gemini_prompt
             )
@@ -244,7 +244,7 @@ async def build_app_hybrid_stream(request: AppBuildRequest):
                 "progress": 85
             })
             
-            await asyncio.sleep(2)  # Give GitHub time to initialize
+            await github_client.wait_until_ready(repo_full_name)
             
             push_result = await github_client.push_multiple_files(
                 repo_full_name=repo_full_name,
@@ -5,12 +5,14 @@ Based on https://v0.app/docs/api/model
 This is the clean, simple, working solution.
 """
 
+import os
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 import asyncio
 import json
+import time
 from datetime import datetime
 
 from integrations.v0_clean import v0_clean_generator
@@ -20,6 +22,12 @@ from integrations.chroma_client import chroma_search, generate_embedding
 
 router = APIRouter()
 
+# Rebuilding with an identical prompt reuses the generated files
+BUILD_CACHE_TTL = float(os.getenv("BUILD_CACHE_TTL", "3600"))
+
+# Files buffered between pipeline stages before generation waits for push/indexing
+BUILD_PIPELINE_QUEUE_SIZE = int(os.getenv("BUILD_PIPELINE_QUEUE_SIZE", "8"))
+
 # Request/Response models
 class AppSpec(BaseModel):
     pages: List[str] = ["Home", "Dashboard"]
@@ -82,7 +90,8 @@ async def build_app_with_v0_only(request: V0BuildRequest):
         files = await v0_clean_generator.generate_full_app(
             project_name=project_name,
             user_requirements=requirements,
-            pages=pages
+            pages=pages,
+            cache_ttl=BUILD_CACHE_TTL
         )
         
         if not files:
@@ -180,10 +189,51 @@ async def build_app_with_v0_only(request: V0BuildRequest):
         )
 
 
+class _StageTimer:
+    """Start/finish offsets per pipeline stage, reported in SSE events"""
+    
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages: Dict[str, Dict[str, Optional[int]]] = {}
+    
+    def start(self, stage: str):
+        self.stages[stage] = {"started_ms": self._now(), "finished_ms": None, "duration_ms": None}
+    
+    def finish(self, stage: str) -> int:
+        entry = self.stages.setdefault(stage, {"started_ms": self._now()})
+        entry["finished_ms"] = self._now()
+        entry["duration_ms"] = entry["finished_ms"] - entry["started_ms"]
+        return entry["duration_ms"]
+    
+    def snapshot(self) -> Dict:
+        return {
+            "total_ms": self._now(),
+            "stages": {stage: dict(entry) for stage, entry in self.stages.items()}
+        }
+    
+    def _now(self) -> int:
+        return round((time.perf_counter() - self.origin) * 1000)
+
+
+def _index_file(project_id: str, file_path: str, content: str):
+    """Embed and store one generated file in Chroma (runs in a worker thread)"""
+    chroma_search.add_code_file(
+        project_id=project_id,
+        file_path=file_path,
+        content=content,
+        embedding=generate_embedding(content)
+    )
+
+
 @router.post("/mcp/app/build/v0/stream")
 async def build_app_with_v0_streaming(request: V0BuildRequest):
     """
     Build app with V0 and stream progress updates
+    
+    Runs as a pipeline: the GitHub repo is created while V0 is still
+    generating, and each file is pushed and indexed as soon as it is parsed
+    from the stream. Stages hand files over through bounded queues, so a
+    slow push applies backpressure instead of buffering the whole app.
     """
     
     if not v0_clean_generator:
@@ -196,206 +246,285 @@ async def build_app_with_v0_streaming(request: V0BuildRequest):
         """Generate SSE events for build progress"""
         
         project_id = f"v0-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        stored_project_id = str(request.project_id or project_id)
         
-        try:
-            # Start
-            yield create_sse_event({
+        events: asyncio.Queue = asyncio.Queue()
+        timer = _StageTimer()
+        all_files: Dict[str, str] = {}
+        result = {"github_url": None}
+        
+        push_enabled = bool(github_client and request.deploy_vercel)
+        push_queue = asyncio.Queue(maxsize=BUILD_PIPELINE_QUEUE_SIZE) if push_enabled else None
+        index_queue = asyncio.Queue(maxsize=BUILD_PIPELINE_QUEUE_SIZE) if chroma_search else None
+        
+        def emit(data: dict):
+            events.put_nowait(create_sse_event(data))
+        
+        async def create_repository() -> Optional[str]:
+            """Stage: create and initialize the repo (overlaps generation)"""
+            timer.start("github_repo")
+            emit({
                 "type": "status",
-                "phase": "started",
-                "message": f"Starting V0 build for {request.project_name}...",
-                "progress": 0
+                "phase": "github",
+                "message": "Creating GitHub repository...",
+                "progress": 5
             })
             
-            await asyncio.sleep(0.5)
+            try:
+                repo_name = request.project_name.lower().replace(' ', '-').replace('_', '-')
+                repo_result = await github_client.create_repo(
+                    name=repo_name,
+                    description=f"Generated by OPS-X with V0: {request.requirements[:100]}",
+                    private=False
+                )
+                
+                if not repo_result.get("success"):
+                    timer.finish("github_repo")
+                    emit({
+                        "type": "status",
+                        "phase": "github_failed",
+                        "message": "Warning: GitHub repo creation failed",
+                        "timings": timer.snapshot()
+                    })
+                    return None
+                
+                result["github_url"] = repo_result.get("repo_url")
+                repo_full_name = repo_result.get("repo_name")
+                emit({
+                    "type": "status",
+                    "phase": "github_created",
+                    "message": f"Repository created: {result['github_url']}",
+                    "github_url": result["github_url"]
+                })
+                
+                # Initialize empty repo with README (required for first push)
+                await github_client.wait_until_ready(repo_full_name)
+                init_result = await github_client.initialize_empty_repo(repo_full_name)
+                duration = timer.finish("github_repo")
+                
+                if not init_result.get("success"):
+                    emit({
+                        "type": "status",
+                        "phase": "github_failed",
+                        "message": "Warning: GitHub repo initialization failed",
+                        "timings": timer.snapshot()
+                    })
+                    return None
+                
+                emit({
+                    "type": "status",
+                    "phase": "github_init",
+                    "message": f"Repository ready in {duration} ms",
+                    "timings": timer.snapshot()
+                })
+                return repo_full_name
             
-            # V0 Generation
-            yield create_sse_event({
+            except Exception as gh_error:
+                timer.finish("github_repo")
+                emit({
+                    "type": "status",
+                    "phase": "github_error",
+                    "message": f"GitHub error: {str(gh_error)}"
+                })
+                return None
+        
+        async def generate():
+            """Stage: stream files out of V0 and hand them to the consumers"""
+            timer.start("generate")
+            emit({
                 "type": "status",
                 "phase": "generating",
                 "message": "Generating code with V0...",
                 "progress": 10
             })
             
-            all_files = {}
-            
-            # Stream callback for V0 progress
-            async def v0_progress_callback(chunk: str, accumulated: str):
-                yield create_sse_event({
-                    "type": "v0_progress",
-                    "chunk": chunk,
-                    "progress": min(10 + len(accumulated) // 100, 80)
-                })
-            
-            files = await v0_clean_generator.generate_full_app(
+            async for block in v0_clean_generator.stream_full_app(
                 project_name=request.project_name,
                 user_requirements=request.requirements,
-                pages=request.spec.pages if request.spec else ["Home"]
-            )
+                pages=request.spec.pages if request.spec else ["Home"],
+                cache_ttl=BUILD_CACHE_TTL
+            ):
+                all_files[block.path] = block.content
+                emit({
+                    "type": "file_generated",
+                    "path": block.path,
+                    "progress": min(10 + 5 * len(all_files), 80)
+                })
+                for queue in (push_queue, index_queue):
+                    if queue is not None:
+                        await queue.put(block)
+            
+            for queue in (push_queue, index_queue):
+                if queue is not None:
+                    await queue.put(None)
             
-            all_files.update(files)
+            if not all_files:
+                raise Exception("V0 failed to generate any files")
             
-            yield create_sse_event({
+            duration = timer.finish("generate")
+            emit({
                 "type": "status",
                 "phase": "generated",
-                "message": f"V0 generated {len(files)} files!",
+                "message": f"V0 generated {len(all_files)} files in {duration} ms!",
                 "progress": 85,
-                "files": list(files.keys())
+                "files": list(all_files.keys()),
+                "timings": timer.snapshot()
             })
             
             # Generate preview HTML
-            preview_html = generate_v0_preview_html(all_files, request.project_name)
-            yield create_sse_event({
+            emit({
                 "type": "preview_ready",
-                "html": preview_html,
+                "html": generate_v0_preview_html(all_files, request.project_name),
                 "progress": 87
             })
-            
-            # GitHub + Vercel (if requested)
-            github_url = None
-            if github_client and request.deploy_vercel:
-                yield create_sse_event({
+        
+        async def push_files(repo_task: asyncio.Task):
+            """Stage: push each file as it arrives (one writer keeps commits ordered)"""
+            repo_full_name = await repo_task
+            pushed, failed = 0, []
+            if repo_full_name:
+                timer.start("github_push")
+                emit({
                     "type": "status",
-                    "phase": "github",
-                    "message": "Creating GitHub repository...",
-                    "progress": 90
+                    "phase": "github_push",
+                    "message": "Pushing files to GitHub...",
+                    "progress": 88
                 })
+            
+            while True:
+                block = await push_queue.get()
+                if block is None:
+                    break
+                if not repo_full_name:
+                    continue  # Keep draining so generation never blocks
                 
                 try:
-                    repo_name = request.project_name.lower().replace(' ', '-').replace('_', '-')
-                    repo_result = await github_client.create_repo(
-                        name=repo_name,
-                        description=f"Generated by OPS-X with V0: {request.requirements[:100]}",
-                        private=False
+                    push_result = await github_client.create_or_update_file(
+                        repo_full_name,
+                        block.path,
+                        block.content,
+                        f"Initial commit: {request.project_name} (generated by V0)"
                     )
-                    
-                    if repo_result.get("success"):
-                        github_url = repo_result.get("repo_url")
-                        repo_full_name = repo_result.get("repo_name")
-                        
-                        yield create_sse_event({
-                            "type": "status",
-                            "phase": "github_created",
-                            "message": f"Repository created: {github_url}",
-                            "progress": 91,
-                            "github_url": github_url
-                        })
-                        
-                        # Initialize empty repo with README (required for first push)
-                        yield create_sse_event({
-                            "type": "status",
-                            "phase": "github_init",
-                            "message": "Initializing repository...",
-                            "progress": 92
-                        })
-                        
-                        await github_client.initialize_empty_repo(repo_full_name)
-                        
-                        # Push files
-                        yield create_sse_event({
-                            "type": "status",
-                            "phase": "github_push",
-                            "message": "Pushing files to GitHub...",
-                            "progress": 93
-                        })
-                        
-                        push_result = await github_client.push_multiple_files(
-                            repo_full_name=repo_full_name,
-                            files=all_files,
-                            commit_message=f"Initial commit: {request.project_name} (generated by V0)"
-                        )
-                        
-                        if push_result.get("success"):
-                            yield create_sse_event({
-                                "type": "status",
-                                "phase": "github_pushed",
-                                "message": f"Pushed {len(all_files)} files to GitHub!",
-                                "progress": 95
-                            })
-                        else:
-                            yield create_sse_event({
-                                "type": "status",
-                                "phase": "github_push_failed",
-                                "message": f"Warning: GitHub push failed",
-                                "progress": 95
-                            })
-                    else:
-                        yield create_sse_event({
-                            "type": "status",
-                            "phase": "github_failed",
-                            "message": "Warning: GitHub repo creation failed",
-                            "progress": 95
-                        })
-                except Exception as gh_error:
-                    yield create_sse_event({
-                        "type": "status",
-                        "phase": "github_error",
-                        "message": f"GitHub error: {str(gh_error)}",
-                        "progress": 95
-                    })
+                except Exception as e:
+                    push_result = {"success": False, "error": str(e)}
+                
+                if push_result["success"]:
+                    pushed += 1
+                    emit({"type": "file_pushed", "path": block.path})
+                else:
+                    print(f"    ✗ {block.path}: {push_result.get('error', 'Unknown error')}")
+                    failed.append(block.path)
+            
+            if not repo_full_name:
+                return
             
-            # Store codebase in Chroma for semantic search
-            stored_project_id = request.project_id or project_id
-            if chroma_search:
-                yield create_sse_event({
+            duration = timer.finish("github_push")
+            if not failed:
+                emit({
                     "type": "status",
-                    "phase": "chroma_storing",
-                    "message": "Storing code embeddings in Chroma...",
-                    "progress": 96
+                    "phase": "github_pushed",
+                    "message": f"Pushed {pushed} files to GitHub in {duration} ms!",
+                    "progress": 95,
+                    "timings": timer.snapshot()
                 })
-                
+            else:
+                emit({
+                    "type": "status",
+                    "phase": "github_push_failed",
+                    "message": f"Warning: GitHub push failed for {len(failed)} file(s)",
+                    "progress": 95,
+                    "failed_files": failed,
+                    "timings": timer.snapshot()
+                })
+        
+        async def index_files():
+            """Stage: store code embeddings in Chroma for semantic search"""
+            timer.start("chroma_index")
+            stored_count, errors = 0, 0
+            
+            while True:
+                block = await index_queue.get()
+                if block is None:
+                    break
                 try:
-                    stored_count = 0
-                    for file_path, content in all_files.items():
-                        # Generate embedding
-                        embedding = generate_embedding(content)
-                        
-                        # Store in Chroma
-                        chroma_search.add_code_file(
-                            project_id=str(stored_project_id),
-                            file_path=file_path,
-                            content=content,
-                            embedding=embedding
-                        )
-                        stored_count += 1
-                    
-                    print(f"Stored {stored_count} files in Chroma for project {stored_project_id}")
-                    
-                    yield create_sse_event({
-                        "type": "status",
-                        "phase": "chroma_stored",
-                        "message": f"Stored {stored_count} files in Chroma for semantic search!",
-                        "progress": 98
-                    })
-                    
+                    await asyncio.to_thread(_index_file, stored_project_id, block.path, block.content)
+                    stored_count += 1
                 except Exception as storage_error:
-                    print(f"Warning: Could not store in Chroma: {storage_error}")
-                    yield create_sse_event({
-                        "type": "status",
-                        "phase": "chroma_warning",
-                        "message": "Warning: Chroma storage failed",
-                        "progress": 98
-                    })
-            else:
-                print(f"Chroma not available, skipping embedding storage")
+                    print(f"Warning: Could not store {block.path} in Chroma: {storage_error}")
+                    errors += 1
+            
+            duration = timer.finish("chroma_index")
+            print(f"Stored {stored_count} files in Chroma for project {stored_project_id}")
             
-            # Complete
-            yield create_sse_event({
-                "type": "complete",
-                "phase": "done",
-                "message": "Build complete!",
-                "progress": 100,
-                "project_id": stored_project_id,
-                "files_count": len(all_files),
-                "github_url": github_url
+            emit({
+                "type": "status",
+                "phase": "chroma_warning" if errors else "chroma_stored",
+                "message": (
+                    "Warning: Chroma storage failed"
+                    if errors else f"Stored {stored_count} files in Chroma for semantic search!"
+                ),
+                "progress": 98,
+                "timings": timer.snapshot()
             })
         
-        except Exception as e:
-            yield create_sse_event({
-                "type": "error",
-                "phase": "failed",
-                "message": str(e),
-                "error": str(e)
+        async def run_pipeline():
+            """Run all stages concurrently; a generation failure cancels the rest"""
+            emit({
+                "type": "status",
+                "phase": "started",
+                "message": f"Starting V0 build for {request.project_name}...",
+                "progress": 0
             })
+            
+            tasks = [asyncio.create_task(generate())]
+            if push_enabled:
+                repo_task = asyncio.create_task(create_repository())
+                tasks += [repo_task, asyncio.create_task(push_files(repo_task))]
+            if index_queue is not None:
+                tasks.append(asyncio.create_task(index_files()))
+            else:
+                print(f"Chroma not available, skipping embedding storage")
+            
+            try:
+                await asyncio.gather(*tasks)
+                
+                # Complete
+                emit({
+                    "type": "complete",
+                    "phase": "done",
+                    "message": "Build complete!",
+                    "progress": 100,
+                    "project_id": stored_project_id,
+                    "files_count": len(all_files),
+                    "github_url": result["github_url"],
+                    "timings": timer.snapshot()
+                })
+            
+            except Exception as e:
+                for task in tasks:
+                    task.cancel()
+                emit({
+                    "type": "error",
+                    "phase": "failed",
+                    "message": str(e),
+                    "error": str(e),
+                    "timings": timer.snapshot()
+                })
+            
+            finally:
+                events.put_nowait(None)
+        
+        pipeline = asyncio.create_task(run_pipeline())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            # Client went away: stop generating and pushing
+            if not pipeline.done():
+                pipeline.cancel()
     
     return StreamingResponse(
         event_generator(),
@@ -6,19 +6,23 @@ Handles multi-user chat with JLLM (25k context)
 import os
 import httpx
 from typing import List, Dict, Optional
-from datetime import datetime
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from chat_rooms import chat_room_store
+from integrations.llm_gateway import llm_gateway, LLMGatewayError
+from integrations.llm_cache import llm_cache
+
 router = APIRouter()
 
 # Configuration
 JANITOR_API_ENDPOINT = os.getenv("JANITOR_API_ENDPOINT", "https://janitorai.com/hackathon/completions")
 JANITOR_API_KEY = os.getenv("JANITOR_API_KEY", "calhacks2047")
+# Re-summarizing an unchanged window of messages reuses the previous summary
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "3600"))
+SUMMARY_SYSTEM_PROMPT = "You are a technical facilitator summarizing a multiplayer development discussion."
 
-# In-memory storage for demo (use Redis/DB in production)
-chat_rooms: Dict[str, List[Dict]] = {}
-user_contexts: Dict[str, Dict] = {}
+# Room history, counters and summaries live in chat_room_store (bounded, persisted)
 
 
 class ChatMessage(BaseModel):
@@ -44,24 +48,19 @@ class MultiUserPrompt(BaseModel):
 async def send_message(message: ChatMessage):
     """Send a message to the multiplayer chat room"""
     
-    # Initialize room if doesn't exist
-    if message.room_id not in chat_rooms:
-        chat_rooms[message.room_id] = []
-    
-    # Add message to room history
-    chat_entry = {
-        "timestamp": datetime.utcnow().isoformat(),
-        "user_id": message.user_id,
-        "role": message.role,
-        "content": message.content
-    }
-    chat_rooms[message.room_id].append(chat_entry)
+    # Add message to room history (creates the room on first use)
+    message_id, chat_entry = await chat_room_store.append(
+        message.room_id,
+        message.user_id,
+        message.role,
+        message.content
+    )
     
     # Get AI response for multiplayer context
     ai_response = await get_ai_response_for_room(message)
     
     return {
-        "message_id": len(chat_rooms[message.room_id]) - 1,
+        "message_id": message_id,
         "ai_response": ai_response,
         "timestamp": chat_entry["timestamp"]
     }
@@ -71,53 +70,61 @@ async def send_message(message: ChatMessage):
 async def summarize_chat(request: ChatSummaryRequest):
     """Summarize chat for context management (25k limit)"""
     
-    if request.room_id not in chat_rooms:
+    room = await chat_room_store.get_room(request.room_id)
+    if room is None:
         raise HTTPException(status_code=404, detail="Chat room not found")
     
-    messages = chat_rooms[request.room_id][-request.max_messages:]
+    messages = chat_room_store.recent(room, request.max_messages)
     
     # Create summary prompt
     summary_prompt = create_summary_prompt(messages)
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                JANITOR_API_ENDPOINT,
-                headers={
-                    "Authorization": JANITOR_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "messages": [
-                        {"role": "system", "content": "You are a technical facilitator summarizing a multiplayer development discussion."},
-                        {"role": "user", "content": summary_prompt}
-                    ]
-                },
-                timeout=30.0
-            )
+    conversation = [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": summary_prompt}
+    ]
+    
+    async def request_summary() -> str:
+        response = await llm_gateway.post(
+            "jllm",
+            JANITOR_API_ENDPOINT,
+            headers={
+                "Authorization": JANITOR_API_KEY,
+                "Content-Type": "application/json"
+            },
+            json={"messages": conversation}
+        )
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Janitor AI error")
+        
+        data = response.json()
+        return data.get('choices', [{}])[0].get('message', {}).get('content', '')
+    
+    try:
+        summary = await llm_cache.get_or_compute(
+            "jllm",
+            "jllm-v1",
+            conversation,
+            request_summary,
+            ttl=SUMMARY_CACHE_TTL
+        )
+        
+        # Store summary for context
+        await chat_room_store.set_summary(request.room_id, summary)
+        
+        return {"summary": summary, "messages_processed": len(messages)}
             
-            if response.status_code == 200:
-                data = response.json()
-                summary = data.get('choices', [{}])[0].get('message', {}).get('content', '')
-                
-                # Store summary for context
-                if request.room_id not in user_contexts:
-                    user_contexts[request.room_id] = {}
-                user_contexts[request.room_id]["summary"] = summary
-                
-                return {"summary": summary, "messages_processed": len(messages)}
-            else:
-                raise HTTPException(status_code=response.status_code, detail="Janitor AI error")
-                
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=503, detail=f"API connection error: {str(e)}")
+    except (httpx.RequestError, LLMGatewayError) as e:
+        raise HTTPException(status_code=503, detail=f"API connection error: {str(e)}")
 
 
 async def get_ai_response_for_room(message: ChatMessage) -> Dict:
     """Get AI response considering multiplayer context"""
     
     # Build context from recent messages
-    recent_messages = chat_rooms[message.room_id][-10:]  # Last 10 messages
+    room = await chat_room_store.get_room(message.room_id, create=True)
+    recent_messages = chat_room_store.recent(room, 10)  # Last 10 messages
     
     # Create multiplayer-aware prompt
     system_prompt = f"""You are facilitating a startup development session.
@@ -145,41 +152,40 @@ Respond appropriately considering:
         "content": f"[{message.role}] {message.content}"
     })
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                JANITOR_API_ENDPOINT,
-                headers={
-                    "Authorization": JANITOR_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={"messages": conversation},
-                timeout=30.0
+    try:
+        response = await llm_gateway.post(
+            "jllm",
+            JANITOR_API_ENDPOINT,
+            headers={
+                "Authorization": JANITOR_API_KEY,
+                "Content-Type": "application/json"
+            },
+            json={"messages": conversation}
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            ai_content = data.get('choices', [{}])[0].get('message', {}).get('content', '')
+            
+            # Store AI response in chat history
+            await chat_room_store.append(
+                message.room_id,
+                "facilitator",
+                "Facilitator",
+                ai_content,
+                is_ai=True
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                ai_content = data.get('choices', [{}])[0].get('message', {}).get('content', '')
-                
-                # Store AI response in chat history
-                chat_rooms[message.room_id].append({
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "user_id": "facilitator",
-                    "role": "Facilitator",
-                    "content": ai_content,
-                    "ai_response": True
-                })
-                
-                return {
-                    "content": ai_content,
-                    "role": "Facilitator",
-                    "considers_role": message.role
-                }
-            else:
-                return {"error": f"API error: {response.status_code}"}
-                
-        except Exception as e:
-            return {"error": f"Connection error: {str(e)}"}
+            return {
+                "content": ai_content,
+                "role": "Facilitator",
+                "considers_role": message.role
+            }
+        else:
+            return {"error": f"API error: {response.status_code}"}
+            
+    except Exception as e:
+        return {"error": f"Connection error: {str(e)}"}
 
 
 def create_summary_prompt(messages: List[Dict]) -> str:
@@ -209,29 +215,21 @@ def create_summary_prompt(messages: List[Dict]) -> str:
 @router.get("/chat/rooms")
 async def list_rooms():
     """List all active chat rooms"""
-    return {
-        "rooms": [
-            {
-                "room_id": room_id,
-                "message_count": len(messages),
-                "participants": len(set(msg['user_id'] for msg in messages))
-            }
-            for room_id, messages in chat_rooms.items()
-        ]
-    }
+    return {"rooms": await chat_room_store.list_rooms()}
 
 
 @router.get("/chat/room/{room_id}")
 async def get_room_messages(room_id: str, limit: int = 50):
     """Get recent messages from a room"""
     
-    if room_id not in chat_rooms:
+    room = await chat_room_store.get_room(room_id)
+    if room is None:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    messages = chat_rooms[room_id][-limit:]
+    messages = chat_room_store.recent(room, limit)
     
     return {
         "room_id": room_id,
         "messages": messages,
-        "total_messages": len(chat_rooms[room_id])
+        "total_messages": room.message_count
     }
@@ -3,7 +3,7 @@ SQLAlchemy Models for OPS-X
 PostgreSQL database schema
 """
 
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, event, inspect
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -117,7 +117,7 @@ class ChatMessage(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # NULL for AI and MCP messages
     message = Column(Text, nullable=False)
     role = Column(String(50))  # User role at time of message
     is_ai = Column(Boolean, default=False)  # Is this from an AI agent?
@@ -129,6 +129,19 @@ class ChatMessage(Base):
     user = relationship("User", back_populates="chat_messages")
 
 
+class ChatRoom(Base):
+    """MCP multiplayer chat rooms with incrementally maintained counters"""
+    __tablename__ = "mcp_chat_rooms"
+    
+    room_id = Column(String(255), primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)  # Set when room_id is a project id
+    message_count = Column(Integer, default=0, nullable=False)
+    participants = Column(JSON)  # Distinct participant ids
+    summary = Column(Text)  # Latest JLLM summary of the room
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
 class CodeEmbedding(Base):
     """Code embeddings for semantic search (stored reference to Chroma)"""
     __tablename__ = "code_embeddings"
@@ -162,6 +175,10 @@ class Refinement(Base):
     coderabbit_score = Column(Integer)  # 1-10 severity score
     status = Column(String(20), default="pending")  # pending, processing, completed, failed, re-refining
     error_message = Column(Text)
+    attempts = Column(Integer, default=0, nullable=False)  # Worker claims so far
+    available_at = Column(DateTime(timezone=True))  # Not claimable before this (retry backoff)
+    lease_expires_at = Column(DateTime(timezone=True))  # Visibility timeout of the current claim
+    status_version = Column(Integer, default=1, server_default="1", nullable=False)  # Bumped on every visible change
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True))
     
@@ -170,6 +187,58 @@ class Refinement(Base):
     stakeholder = relationship("Stakeholder")
 
 
+# Columns in a refinement status event; bulk updates of them must bump status_version themselves
+REFINEMENT_EVENT_FIELDS = ("status", "ai_model_used", "pr_url", "files_changed", "error_message", "completed_at")
+
+
+@event.listens_for(Refinement, "before_update")
+def _bump_status_version(mapper, connection, target):
+    """Version long-poll and SSE clients compare, shared by every worker through the row"""
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in REFINEMENT_EVENT_FIELDS):
+        target.status_version = (target.status_version or 0) + 1
+
+
+class WebhookDelivery(Base):
+    """Raw GitHub webhook deliveries, stored once per X-GitHub-Delivery and processed by the webhook queue"""
+    __tablename__ = "webhook_deliveries"
+    
+    id = Column(String(100), primary_key=True)  # X-GitHub-Delivery (or body hash)
+    event = Column(String(50), nullable=False)  # X-GitHub-Event
+    payload = Column(Text, nullable=False)  # Raw request body
+    status = Column(String(20), default="pending", nullable=False)  # pending, processed, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    error_message = Column(Text)
+    available_at = Column(DateTime(timezone=True))  # Not processed before this (retry backoff)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True))
+
+
+class EmailOutbox(Base):
+    """Outgoing emails, queued by API handlers and delivered in batches by the email outbox worker"""
+    __tablename__ = "email_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String(255), nullable=False)
+    template = Column(String(50), nullable=False)  # otp, team_invite
+    params = Column(JSON, nullable=False)  # Template parameters
+    status = Column(String(20), default="pending", nullable=False)  # pending, sending, sent, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    error_message = Column(Text)
+    available_at = Column(DateTime(timezone=True))  # Retry backoff, or lease end while sending
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True))
+
+
+class TTLEntry(Base):
+    """Short-lived key-value entries shared by all workers (OTPs, invite codes)"""
+    __tablename__ = "ttl_entries"
+    
+    key = Column(String(255), primary_key=True)
+    value = Column(JSON, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
 # Index for faster queries
 from sqlalchemy import Index
 
@@ -178,4 +247,16 @@ Index('idx_project_branches', Branch.project_id)
 Index('idx_project_chat', ChatMessage.project_id)
 Index('idx_code_embeddings_project', CodeEmbedding.project_id)
 Index('idx_github_repo', Project.github_repo)
+Index('idx_refinements_queue', Refinement.status, Refinement.available_at)
+Index('idx_refinements_pr_url', Refinement.pr_url)
+Index('idx_webhook_deliveries_queue', WebhookDelivery.status, WebhookDelivery.received_at)
+Index('idx_email_outbox_queue', EmailOutbox.status, EmailOutbox.available_at)
+
+# Keyset pagination: list endpoints order by (created_at, id) within a project
+Index('idx_projects_created', Project.created_at, Project.id)
+Index('idx_stakeholders_project_created', Stakeholder.project_id, Stakeholder.created_at, Stakeholder.id)
+Index('idx_branches_project_created', Branch.project_id, Branch.created_at, Branch.id)
+Index('idx_refinements_project_created', Refinement.project_id, Refinement.created_at, Refinement.id)
 
+# TTL store sweep deletes by expiry
+Index('idx_ttl_entries_expires', TTLEntry.expires_at)
@@ -0,0 +1,139 @@
+"""
+Per-project team context cache
+Stakeholder roster, project details and the rendered JLLM system context
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models import Project, Stakeholder
+from integrations.jllm_api import jllm_agent
+
+# Entries are invalidated on writes; the TTL only bounds staleness across workers
+PROJECT_CONTEXT_TTL = float(os.getenv("PROJECT_CONTEXT_TTL", "300"))
+PROJECT_CONTEXT_MAX_ENTRIES = int(os.getenv("PROJECT_CONTEXT_MAX_ENTRIES", "1000"))
+
+
+class ProjectContext:
+    """Chat-relevant snapshot of a project and its team"""
+
+    def __init__(self, project: Project, stakeholders: List[Stakeholder]):
+        self.project_id = project.id
+        self.name = project.name
+        self.prompt = project.prompt
+
+        # Roster keyed by stakeholder id
+        self.stakeholders: Dict[int, Dict] = {
+            s.id: {
+                "id": s.id,
+                "user_id": s.user_id,
+                "name": s.name,
+                "email": s.email,
+                "role": s.role
+            }
+            for s in stakeholders
+        }
+
+        # Display names for chat history (user id -> stakeholder name)
+        self.names_by_user: Dict[int, str] = {
+            s["user_id"]: s["name"]
+            for s in self.stakeholders.values()
+            if s["user_id"]
+        }
+
+        self.team_members = [
+            {"name": s["name"], "email": s["email"], "role": s["role"]}
+            for s in self.stakeholders.values()
+        ]
+        self.project_context = f"{self.name}: {self.prompt}"
+        self.system_context = jllm_agent._build_system_context(
+            self.project_context,
+            self.team_members
+        )
+        self.loaded_at = time.monotonic()
+
+
+def chat_author_name(
+    is_ai: bool,
+    user_id: Optional[int],
+    extra_data: Optional[Dict],
+    names_by_user: Dict[int, str]
+) -> str:
+    """Display name for a chat_messages row"""
+    if is_ai:
+        return "Janitor AI"
+    if user_id:
+        return names_by_user.get(user_id, "Unknown")
+    # Posted through the MCP chat rooms, which carry their own user ids
+    mcp_user_id = (extra_data or {}).get("mcp_user_id")
+    if mcp_user_id:
+        return f"{mcp_user_id} (MCP)"
+    return "System"
+
+
+class ProjectContextCache:
+    """LRU cache of ProjectContext entries, invalidated by project/team writes"""
+
+    def __init__(
+        self,
+        ttl: float = PROJECT_CONTEXT_TTL,
+        max_entries: int = PROJECT_CONTEXT_MAX_ENTRIES
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, ProjectContext]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def get(self, db: AsyncSession, project_id: int) -> Optional[ProjectContext]:
+        """
+        Get the cached context for a project, loading it on a miss
+
+        Returns:
+            ProjectContext, or None if the project does not exist
+        """
+        entry = self._entries.get(project_id)
+        if entry and time.monotonic() - entry.loaded_at < self.ttl:
+            self._entries.move_to_end(project_id)
+            self.stats["hits"] += 1
+            return entry
+
+        self.stats["misses"] += 1
+
+        project = await db.get(Project, project_id)
+        if not project:
+            self._entries.pop(project_id, None)
+            return None
+
+        stakeholders = (await db.scalars(
+            select(Stakeholder).where(Stakeholder.project_id == project_id)
+        )).all()
+
+        entry = ProjectContext(project, stakeholders)
+        if db.bind is not async_engine:
+            # Loaded from a read replica: may predate the write that invalidated it
+            return entry
+
+        self._entries[project_id] = entry
+        self._entries.move_to_end(project_id)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        return entry
+
+    def invalidate(self, project_id: int):
+        """Drop a project's context after its project row or team changed"""
+        self._entries.pop(project_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Global instance
+project_context_cache = ProjectContextCache()
@@ -0,0 +1,191 @@
+"""
+Per-request SQL query budget
+Counts queries and DB time per request from engine events and flags repeated statements (N+1 suspects)
+"""
+
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+APP_ENV = os.getenv("APP_ENV", "development")
+# X-DB-* response headers; on by default outside production, metrics are always kept
+DB_QUERY_HEADERS = os.getenv("DB_QUERY_HEADERS", str(APP_ENV != "production")).lower() == "true"
+# Same statement this many times in one request = likely N+1
+DB_QUERY_REPEAT_THRESHOLD = int(os.getenv("DB_QUERY_REPEAT_THRESHOLD", "3"))
+DB_QUERY_WARN_COUNT = int(os.getenv("DB_QUERY_WARN_COUNT", "25"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_budget", default=None)
+
+
+class QueryStats:
+    """Queries issued while serving one request"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.db_ms = 0.0
+        self.statements: Counter = Counter()
+
+    def add(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.db_ms += elapsed_ms
+        self.statements[_WHITESPACE.sub(" ", statement).strip()] += 1
+
+    def repeated(self, threshold: int = DB_QUERY_REPEAT_THRESHOLD) -> Dict[str, int]:
+        """Statements run at least threshold times (same SQL, any parameters)"""
+        return {sql: n for sql, n in self.statements.items() if n >= threshold}
+
+    def report(self) -> str:
+        lines = [f"{self.label or 'request'}: {self.count} queries in {self.db_ms:.1f} ms"]
+        for sql, n in self.statements.most_common():
+            lines.append(f"  {n}x {sql[:300]}")
+        return "\n".join(lines)
+
+
+class QueryMonitor:
+    """
+    Engine-event query counter scoped to the current request
+
+    The stats object lives in a ContextVar, so queries made from worker
+    threads started with asyncio.to_thread and from AsyncSession greenlets
+    are attributed to the request that issued them. Queries outside a
+    request (background workers) are not counted.
+    """
+
+    def __init__(self, repeat_threshold: int = DB_QUERY_REPEAT_THRESHOLD):
+        self.repeat_threshold = repeat_threshold
+        self._engines = set()
+        self._routes: Dict[str, Dict] = {}
+        self._sinks: List[List[QueryStats]] = []
+        self.stats = {"requests": 0, "queries": 0, "n_plus_one": 0, "over_warn": 0}
+
+    def install(self, engine):
+        """Attach the cursor listeners to a (sync) Engine; safe to call twice"""
+        if id(engine) in self._engines:
+            return
+        self._engines.add(id(engine))
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    @staticmethod
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("query_budget_start", []).append(time.perf_counter())
+
+    @staticmethod
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        if stats is None:
+            return
+        started = conn.info.get("query_budget_start")
+        elapsed_ms = (time.perf_counter() - started.pop()) * 1000 if started else 0.0
+        stats.add(statement, elapsed_ms)
+
+    @contextmanager
+    def track(self, label: str = ""):
+        """Count the queries made inside the block (and its to_thread calls)"""
+        stats = QueryStats(label)
+        token = _current.set(stats)
+        try:
+            yield stats
+        finally:
+            _current.reset(token)
+
+    def record(self, route: str, stats: QueryStats):
+        """Fold a finished request into the per-route metrics"""
+        repeated = stats.repeated(self.repeat_threshold)
+
+        self.stats["requests"] += 1
+        self.stats["queries"] += stats.count
+        if repeated:
+            self.stats["n_plus_one"] += 1
+            worst_sql, worst_count = max(repeated.items(), key=lambda item: item[1])
+            print(f"⚠️ Possible N+1 in {route}: {worst_count}x {worst_sql[:160]}")
+        if stats.count > DB_QUERY_WARN_COUNT:
+            self.stats["over_warn"] += 1
+            print(f"⚠️ {route} ran {stats.count} queries ({stats.db_ms:.0f} ms)")
+
+        entry = self._routes.setdefault(route, {
+            "requests": 0, "queries": 0, "max_queries": 0, "db_ms": 0.0, "n_plus_one": 0
+        })
+        entry["requests"] += 1
+        entry["queries"] += stats.count
+        entry["max_queries"] = max(entry["max_queries"], stats.count)
+        entry["db_ms"] += stats.db_ms
+        if repeated:
+            entry["n_plus_one"] += 1
+
+        for sink in self._sinks:
+            sink.append(stats)
+
+    @contextmanager
+    def capture(self):
+        """Collect the QueryStats of every request finished inside the block (tests)"""
+        finished: List[QueryStats] = []
+        self._sinks.append(finished)
+        try:
+            yield finished
+        finally:
+            self._sinks.remove(finished)
+
+    def snapshot(self) -> Dict:
+        routes = {
+            route: {
+                **entry,
+                "avg_queries": round(entry["queries"] / entry["requests"], 2),
+                "avg_db_ms": round(entry["db_ms"] / entry["requests"], 2),
+                "db_ms": round(entry["db_ms"], 1)
+            }
+            for route, entry in self._routes.items()
+        }
+        return {**self.stats, "routes": routes}
+
+
+class QueryBudgetMiddleware:
+    """
+    ASGI middleware: one QueryStats per HTTP request
+
+    Adds X-DB-Query-Count / X-DB-Time-Ms / X-DB-Repeated-Statements headers
+    when DB_QUERY_HEADERS is on. Streaming responses report the queries made
+    before their first byte in the headers; metrics get the full count.
+    """
+
+    def __init__(self, app, monitor: "QueryMonitor" = None, headers: bool = DB_QUERY_HEADERS):
+        self.app = app
+        self.monitor = monitor or query_monitor
+        self.headers = headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with self.monitor.track(f"{scope['method']} {scope['path']}") as stats:
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start" and self.headers:
+                    repeated = stats.repeated(self.monitor.repeat_threshold)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-db-query-count", str(stats.count).encode()),
+                        (b"x-db-time-ms", f"{stats.db_ms:.1f}".encode()),
+                        (b"x-db-repeated-statements", str(len(repeated)).encode())
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                # Route template, so /projects/1 and /projects/2 share an entry
+                path = getattr(scope.get("route"), "path", None) or "<unmatched>"
+                self.monitor.record(f"{scope['method']} {path}", stats)
+
+
+# Global instance
+query_monitor = QueryMonitor()
@@ -0,0 +1,232 @@
+"""
+Refinement status event bus
+Pushes refinement state transitions to Socket.IO project rooms, SSE subscribers and long-poll waiters,
+relayed between workers over Redis pub/sub when REDIS_URL is set
+"""
+
+import os
+import json
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+# Queued events per SSE subscriber before the oldest are dropped
+REFINEMENT_EVENTS_QUEUE_SIZE = int(os.getenv("REFINEMENT_EVENTS_QUEUE_SIZE", "100"))
+# Refinements whose latest event is remembered for long-poll clients
+REFINEMENT_EVENTS_MAX_TRACKED = int(os.getenv("REFINEMENT_EVENTS_MAX_TRACKED", "10000"))
+# Workers share events through this channel; without Redis each worker only sees its own
+REDIS_URL = os.getenv("REDIS_URL")
+REFINEMENT_EVENTS_CHANNEL = os.getenv("REFINEMENT_EVENTS_CHANNEL", "opsx:refinement-events")
+
+
+def refinement_event(refinement) -> Dict[str, Any]:
+    """Status payload of a refinement row"""
+    completed_at = refinement.completed_at
+    return {
+        "refinement_id": refinement.id,
+        "project_id": refinement.project_id,
+        "status": refinement.status,
+        "ai_model_used": refinement.ai_model_used,
+        "pr_url": refinement.pr_url,
+        "files_changed": refinement.files_changed,
+        "error_message": refinement.error_message,
+        "completed_at": completed_at.isoformat() if isinstance(completed_at, datetime) else None,
+        "version": refinement.status_version
+    }
+
+
+class RefinementEventBus:
+    """
+    Fan-out of refinement status changes to this worker's clients
+
+    Events carry the row's status_version, which every worker sees the same
+    way; an event no newer than the last one seen for its refinement is
+    dropped, so relayed copies and repeats are harmless. Long-poll clients
+    wait for the version to move past the one they have; SSE clients get a
+    per-project queue; the project's Socket.IO room on this worker gets a
+    "refinement:status" event. With REDIS_URL set, published events are
+    relayed to every worker, each delivering to its own clients. Without it
+    other workers' changes reach long polls only when they re-read the row.
+    publish() may be called from worker threads.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = REFINEMENT_EVENTS_QUEUE_SIZE,
+        max_tracked: int = REFINEMENT_EVENTS_MAX_TRACKED,
+        redis_url: Optional[str] = REDIS_URL
+    ):
+        self.queue_size = queue_size
+        self.max_tracked = max_tracked
+        self.redis_url = redis_url
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # refinement id -> latest event (with "version"), least recently updated first
+        self._latest: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # refinement id -> [Event set on the next change, number of waiters]
+        self._changed: Dict[int, List] = {}
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"published": 0, "relayed": 0, "dropped": 0, "subscribers": 0, "waiters": 0}
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Remember the event loop that serves subscribers (called on startup)"""
+        self._loop = loop
+
+    async def start(self):
+        """Bind to the running loop and start relaying through Redis (if configured)"""
+        self.bind(asyncio.get_running_loop())
+        if not self.redis_url or self._listener is not None:
+            return
+        try:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        except Exception as e:
+            print(f"⚠️ Redis unavailable for refinement events ({e}), events stay in this worker")
+            return
+        self._listener = asyncio.create_task(self._listen())
+        print("✅ Refinement events relayed through Redis")
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def version(self, refinement_id: int) -> int:
+        """Latest status version this worker has seen (0 = none); the row's status_version is authoritative"""
+        latest = self._latest.get(refinement_id)
+        return latest["version"] if latest else 0
+
+    def publish(self, refinement):
+        """Announce a refinement's current state; call after the change is committed"""
+        event = refinement_event(refinement)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is not None:
+            self._loop = loop
+            self._publish(event)
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._publish, event)
+
+    def _publish(self, event: Dict[str, Any]):
+        if self._dispatch(event) and self._redis is not None:
+            self._spawn(self._relay(event))
+
+    def _dispatch(self, event: Dict[str, Any]) -> bool:
+        """Deliver an event to this worker's clients; False when it is not newer than the last one"""
+        refinement_id = event["refinement_id"]
+        project_id = event["project_id"]
+
+        if event["version"] <= self.version(refinement_id):
+            return False
+
+        self._latest[refinement_id] = event
+        self._latest.move_to_end(refinement_id)
+        while len(self._latest) > self.max_tracked:
+            self._latest.popitem(last=False)
+
+        waiting = self._changed.pop(refinement_id, None)
+        if waiting is not None:
+            waiting[0].set()
+
+        for queue in self._subscribers.get(project_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.stats["dropped"] += 1
+            queue.put_nowait(event)
+
+        self.stats["published"] += 1
+        self._spawn(self._emit(project_id, event))
+        return True
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _relay(self, event: Dict[str, Any]):
+        try:
+            await self._redis.publish(REFINEMENT_EVENTS_CHANNEL, json.dumps(event))
+        except Exception as e:
+            print(f"⚠️ refinement event relay failed: {e}")
+
+    async def _listen(self):
+        """Deliver events published by other workers (our own come back as duplicates and are dropped)"""
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(REFINEMENT_EVENTS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message" and self._dispatch(json.loads(message["data"])):
+                            self.stats["relayed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Refinement event relay disconnected ({e}), retrying")
+                await asyncio.sleep(1)
+
+    async def _emit(self, project_id: int, event: Dict[str, Any]):
+        try:
+            from main import sio
+            await sio.emit("refinement:status", event, room=str(project_id))
+        except Exception as e:
+            print(f"⚠️ refinement:status broadcast failed: {e}")
+
+    async def wait(self, refinement_id: int, version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Block until this worker sees the refinement's status version pass version
+
+        Returns:
+            The latest event, or None on timeout
+        """
+        if self.version(refinement_id) > version:
+            return self._latest.get(refinement_id)
+
+        waiting = self._changed.get(refinement_id)
+        if waiting is None:
+            waiting = self._changed[refinement_id] = [asyncio.Event(), 0]
+
+        waiting[1] += 1
+        self.stats["waiters"] += 1
+        try:
+            await asyncio.wait_for(waiting[0].wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiting[1] -= 1
+            self.stats["waiters"] -= 1
+            if waiting[1] == 0 and self._changed.get(refinement_id) is waiting:
+                del self._changed[refinement_id]
+        return self._latest.get(refinement_id)
+
+    def subscribe(self, project_id: int) -> asyncio.Queue:
+        """Queue receiving every event of a project until unsubscribe()"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(project_id, set()).add(queue)
+        self.stats["subscribers"] += 1
+        return queue
+
+    def unsubscribe(self, project_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(project_id)
+        if subscribers and queue in subscribers:
+            subscribers.discard(queue)
+            self.stats["subscribers"] -= 1
+            if not subscribers:
+                del self._subscribers[project_id]
+
+
+# Global instance
+refinement_events = RefinementEventBus()
@@ -0,0 +1,304 @@
+"""
+Durable refinement job queue
+DB-backed queue on refinements.status, drained by an async worker pool
+"""
+
+import os
+import random
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+
+from database import AsyncSessionLocal, SessionLocal
+from models import Refinement
+from refinement_events import refinement_events
+
+REFINEMENT_WORKERS = int(os.getenv("REFINEMENT_WORKERS", "4"))
+REFINEMENT_POLL_INTERVAL = float(os.getenv("REFINEMENT_POLL_INTERVAL", "2"))
+REFINEMENT_VISIBILITY_TIMEOUT = float(os.getenv("REFINEMENT_VISIBILITY_TIMEOUT", "600"))
+REFINEMENT_MAX_ATTEMPTS = int(os.getenv("REFINEMENT_MAX_ATTEMPTS", "3"))
+REFINEMENT_BACKOFF_BASE = float(os.getenv("REFINEMENT_BACKOFF_BASE", "5"))
+REFINEMENT_BACKOFF_MAX = float(os.getenv("REFINEMENT_BACKOFF_MAX", "300"))
+# Concurrent jobs per provider in this process, e.g. "claude=2,v0=2,gemini=2"
+REFINEMENT_PROVIDER_LIMITS = os.getenv("REFINEMENT_PROVIDER_LIMITS", "claude=2,v0=2,gemini=2")
+# Provider for jobs that don't name one
+DEFAULT_PROVIDER = "claude"
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            provider, limit = part.split("=", 1)
+            limits[provider.strip()] = max(1, int(limit))
+    return limits
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class RefinementQueue:
+    """
+    Worker pool for refinement jobs
+
+    A job is a refinements row with status "pending". Workers claim jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED, so several processes can share the
+    table. A claim sets status "processing" and a lease; a job whose lease
+    expires (crashed worker) becomes claimable again. Failed attempts are
+    retried with exponential backoff until REFINEMENT_MAX_ATTEMPTS; a failed
+    final attempt marks the job failed. Jobs without ai_model_used run (and
+    are throttled) as "claude".
+    """
+
+    def __init__(
+        self,
+        workers: int = REFINEMENT_WORKERS,
+        poll_interval: float = REFINEMENT_POLL_INTERVAL,
+        visibility_timeout: float = REFINEMENT_VISIBILITY_TIMEOUT,
+        max_attempts: int = REFINEMENT_MAX_ATTEMPTS,
+        provider_limits: Optional[Dict[str, int]] = None
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.provider_limits = provider_limits if provider_limits is not None else _parse_limits(REFINEMENT_PROVIDER_LIMITS)
+        self._in_flight: Dict[str, int] = {}
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._stopping = False
+        self.stats = {"claimed": 0, "completed": 0, "retried": 0, "failed": 0}
+
+    async def start(self):
+        """Start the worker pool"""
+        if self._tasks:
+            return
+        self._stopping = False
+        self._claim_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"🧵 Refinement queue started: {self.workers} workers, limits {self.provider_limits}")
+
+    async def stop(self):
+        """Stop claiming jobs and cancel running ones (their leases expire and they are retried)"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after a job was enqueued"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ---------- worker ----------
+
+    async def _worker(self, index: int):
+        while not self._stopping:
+            try:
+                job = await self._claim_next()
+            except Exception as e:
+                print(f"⚠️ Refinement worker {index} claim failed: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            refinement_id, provider, attempt = job
+            try:
+                await self._process(refinement_id, provider, attempt)
+            finally:
+                self._in_flight[provider] -= 1
+                # A provider slot just freed up
+                self.notify()
+
+    async def _claim_next(self) -> Optional[Tuple[int, str, int]]:
+        async with self._claim_lock:
+            saturated = [
+                provider for provider, limit in self.provider_limits.items()
+                if self._in_flight.get(provider, 0) >= limit
+            ]
+            job = await asyncio.to_thread(self._claim, saturated)
+            if job is not None:
+                provider = job[1]
+                self._in_flight[provider] = self._in_flight.get(provider, 0) + 1
+                self.stats["claimed"] += 1
+            return job
+
+    def _claim(self, saturated_providers) -> Optional[Tuple[int, str, int]]:
+        """Claim the oldest available job (runs in a worker thread)"""
+        db = SessionLocal()
+        try:
+            while True:
+                now = _utcnow()
+                query = db.query(Refinement).filter(
+                    or_(
+                        and_(
+                            Refinement.status == "pending",
+                            or_(Refinement.available_at.is_(None), Refinement.available_at <= now)
+                        ),
+                        # Lease expired: the worker that held it is gone
+                        and_(
+                            Refinement.status == "processing",
+                            Refinement.lease_expires_at.isnot(None),
+                            Refinement.lease_expires_at < now
+                        )
+                    )
+                )
+                if saturated_providers:
+                    # Same default provider as the returned job below
+                    provider = func.coalesce(Refinement.ai_model_used, DEFAULT_PROVIDER)
+                    query = query.filter(provider.notin_(saturated_providers))
+
+                refinement = query.order_by(
+                    Refinement.created_at.asc(),
+                    Refinement.id.asc()
+                ).with_for_update(skip_locked=True).first()
+
+                if refinement is None:
+                    return None
+
+                if (refinement.attempts or 0) >= self.max_attempts:
+                    refinement.status = "failed"
+                    refinement.error_message = refinement.error_message or "Exceeded max attempts"
+                    refinement.lease_expires_at = None
+                    refinement.completed_at = now
+                    db.commit()
+                    refinement_events.publish(refinement)
+                    self.stats["failed"] += 1
+                    continue
+
+                refinement.status = "processing"
+                refinement.attempts = (refinement.attempts or 0) + 1
+                refinement.lease_expires_at = now + timedelta(seconds=self.visibility_timeout)
+                db.commit()
+                refinement_events.publish(refinement)
+
+                return refinement.id, refinement.ai_model_used or DEFAULT_PROVIDER, refinement.attempts
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _process(self, refinement_id: int, provider: str, attempt: int):
+        from api.chat import execute_refinement_task
+
+        final_attempt = attempt >= self.max_attempts
+        heartbeat = asyncio.create_task(self._heartbeat(refinement_id))
+
+        # Each job owns its (async) session for its whole run
+        db = AsyncSessionLocal()
+        try:
+            await execute_refinement_task(
+                refinement_id,
+                provider,
+                db,
+                attempt=attempt,
+                final_attempt=final_attempt
+            )
+            self.stats["completed"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await db.rollback()
+            if final_attempt:
+                print(f"❌ Refinement {refinement_id} failed on attempt {attempt}: {e}")
+                await asyncio.to_thread(self._fail, refinement_id, str(e))
+                return
+            self.stats["retried"] += 1
+            delay = min(REFINEMENT_BACKOFF_MAX, REFINEMENT_BACKOFF_BASE * 2 ** (attempt - 1))
+            delay *= random.uniform(0.5, 1.0)
+            print(f"🔁 Refinement {refinement_id} attempt {attempt} failed ({e}); retrying in {delay:.0f}s")
+            await asyncio.to_thread(self._release, refinement_id, str(e), delay)
+            self.notify()
+        finally:
+            heartbeat.cancel()
+            await db.close()
+
+    async def _heartbeat(self, refinement_id: int):
+        """Extend the lease while the job is still running"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await asyncio.to_thread(self._extend_lease, refinement_id)
+            except Exception as e:
+                print(f"⚠️ Lease renewal failed for refinement {refinement_id}: {e}")
+
+    def _extend_lease(self, refinement_id: int):
+        db = SessionLocal()
+        try:
+            db.query(Refinement).filter(
+                Refinement.id == refinement_id,
+                Refinement.status == "processing"
+            ).update(
+                {Refinement.lease_expires_at: _utcnow() + timedelta(seconds=self.visibility_timeout)},
+                synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _fail(self, refinement_id: int, error: str):
+        """Mark a job failed after its final attempt errored"""
+        db = SessionLocal()
+        try:
+            updated = db.query(Refinement).filter(
+                Refinement.id == refinement_id,
+                Refinement.status == "processing"
+            ).update(
+                {
+                    Refinement.status: "failed",
+                    Refinement.error_message: error,
+                    Refinement.lease_expires_at: None,
+                    Refinement.completed_at: _utcnow(),
+                    Refinement.status_version: Refinement.status_version + 1
+                },
+                synchronize_session=False
+            )
+            db.commit()
+            if not updated:
+                return
+            self.stats["failed"] += 1
+
+            refinement = db.get(Refinement, refinement_id)
+            if refinement is not None:
+                refinement_events.publish(refinement)
+        finally:
+            db.close()
+
+    def _release(self, refinement_id: int, error: str, delay: float):
+        """Put a failed attempt back on the queue after a backoff"""
+        db = SessionLocal()
+        try:
+            db.query(Refinement).filter(Refinement.id == refinement_id).update(
+                {
+                    Refinement.status: "pending",
+                    Refinement.error_message: error,
+                    Refinement.lease_expires_at: None,
+                    Refinement.available_at: _utcnow() + timedelta(seconds=delay),
+                    Refinement.status_version: Refinement.status_version + 1
+                },
+                synchronize_session=False
+            )
+            db.commit()
+
+            refinement = db.get(Refinement, refinement_id)
+            if refinement is not None:
+                refinement_events.publish(refinement)
+        finally:
+            db.close()
+
+
+# Global instance
+refinement_queue = RefinementQueue()
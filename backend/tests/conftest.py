@@ -0,0 +1,45 @@
+"""
+Shared pytest fixtures
+"""
+
+from contextlib import contextmanager
+from typing import Optional
+
+import pytest
+
+from database import engine, async_engine
+from query_budget import query_monitor, DB_QUERY_REPEAT_THRESHOLD
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Assert per-endpoint SQL query budgets
+
+    Usage:
+        def test_chat_history(client, query_budget):
+            with query_budget(max_queries=3):
+                client.get("/api/projects/1/chat/messages")
+
+    Every request made inside the block (through an app with
+    QueryBudgetMiddleware, e.g. main.app) must stay within max_queries
+    statements and must not run the same statement max_repeats times (N+1).
+    """
+    query_monitor.install(engine)
+    query_monitor.install(async_engine.sync_engine)
+
+    @contextmanager
+    def budget(max_queries: int, max_repeats: Optional[int] = DB_QUERY_REPEAT_THRESHOLD):
+        with query_monitor.capture() as finished:
+            yield finished
+
+        assert finished, "No requests were recorded; is QueryBudgetMiddleware installed on the app?"
+        for stats in finished:
+            assert stats.count <= max_queries, (
+                f"Query budget exceeded ({stats.count} > {max_queries})\n{stats.report()}"
+            )
+            if max_repeats:
+                repeated = stats.repeated(max_repeats)
+                assert not repeated, f"Repeated statements (N+1?)\n{stats.report()}"
+
+    return budget
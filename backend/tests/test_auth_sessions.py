@@ -0,0 +1,86 @@
+"""
+Stateless session tokens resolve from their claims, without the users table
+"""
+
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+import auth_sessions
+from auth_sessions import SessionResolver
+from database import AsyncSessionLocal, async_engine, init_db
+from models import User
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tables():
+    init_db()
+
+
+@pytest.fixture
+def resolvers(monkeypatch):
+    """Two workers' resolvers sharing the signing secret"""
+    monkeypatch.setattr(auth_sessions, "SESSION_TOKEN_SECRET", "test-secret")
+    return SessionResolver(stateless=True), SessionResolver(stateless=True)
+
+
+@contextmanager
+def statements():
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+async def _user(db, name: str) -> User:
+    user = User(email=f"session-{uuid.uuid4().hex[:8]}@example.com", name=name)
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+@pytest.mark.asyncio
+async def test_stateless_token_resolves_without_reading_users(resolvers):
+    issuing, other = resolvers
+    async with AsyncSessionLocal() as db:
+        user = await _user(db, "Claims")
+        token = await issuing.issue(db, user)
+
+        with statements() as seen:
+            info = await other.resolve(db, token)
+        assert info["email"] == user.email and info["name"] == "Claims"
+        assert not [s for s in seen if "FROM users" in s]
+
+        # Revocation and profile misses are remembered: a later miss costs no query
+        other._cache.clear()
+        with statements() as seen:
+            assert (await other.resolve(db, token))["id"] == user.id
+        assert seen == []
+
+
+@pytest.mark.asyncio
+async def test_profile_change_and_revocation(resolvers):
+    issuing, other = resolvers
+    async with AsyncSessionLocal() as db:
+        user = await _user(db, "Before")
+        token = await issuing.issue(db, user)
+
+        user.name = "After"
+        await db.commit()
+        await issuing.invalidate_user(user.id)
+
+        # Claims predate the change, so the profile comes from users
+        assert (await other.resolve(db, token))["name"] == "After"
+
+        await issuing.revoke(db, token)
+        other._cache.clear()
+        assert await other.resolve(db, token) is None
@@ -0,0 +1,71 @@
+"""
+Context packer fetches only ranked paths from the repo tree
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import integrations.context_packer as context_packer_module
+from integrations.context_packer import ContextPacker
+
+
+class FakeGitHub:
+    """Serves a repo from memory and records which blobs were downloaded"""
+
+    def __init__(self, files):
+        self.files = files
+        self.fetched = []
+
+    async def list_repo_tree(self, repo):
+        return {
+            path: {"sha": f"sha-{path}", "size": len(content)}
+            for path, content in self.files.items()
+        }
+
+    async def fetch_blobs(self, repo, shas, concurrency=8):
+        shas = list(shas)
+        self.fetched.extend(shas)
+        return {sha: self.files[sha[len("sha-"):]] for sha in shas}
+
+
+@pytest.fixture
+def github(monkeypatch):
+    files = {
+        "app/billing/invoice.tsx": "import { money } from '../../lib/money'\nexport function Invoice() {}\n",
+        "lib/money.ts": "export function money(cents: number) { return cents / 100 }\n",
+        "node_modules/react/index.js": "module.exports = {}\n",
+        "package-lock.json": "{}\n",
+        "docs/huge.md": "x" * 400_000,
+    }
+    files.update({f"app/other/page{i}.tsx": f"export default function Page{i}() {{}}\n" for i in range(20)})
+    fake = FakeGitHub(files)
+    monkeypatch.setattr(context_packer_module, "github_client", fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_skipped_and_oversized_paths_are_never_downloaded(github, monkeypatch):
+    monkeypatch.setattr(context_packer_module, "CONTEXT_FETCH_TOKENS", 40)
+    project = SimpleNamespace(name="Shop", prompt="A shop", github_repo="https://github.com/acme/shop.git")
+
+    context = await ContextPacker().pack(project, "Show the invoice total in the billing page")
+
+    fetched = {sha[len("sha-"):] for sha in github.fetched}
+    # The path match, then its import; the budget leaves no room for the rest
+    assert fetched == {"app/billing/invoice.tsx", "lib/money.ts"}
+    assert {"app/billing/invoice.tsx", "lib/money.ts"} <= set(context.files)
+    assert "docs/huge.md" in context.project_context  # Listed, just not downloaded
+
+
+@pytest.mark.asyncio
+async def test_blobs_are_cached_between_refinements(github):
+    packer = ContextPacker()
+    project = SimpleNamespace(name="Shop", prompt="A shop", github_repo="acme/shop")
+
+    await packer.pack(project, "billing invoice")
+    first = len(github.fetched)
+    packer.invalidate(project.github_repo)
+    await packer.pack(project, "billing invoice")
+
+    assert first and len(github.fetched) == first
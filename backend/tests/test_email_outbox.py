@@ -0,0 +1,84 @@
+"""
+Email outbox delivery through the in-memory sink
+"""
+
+import uuid
+
+import pytest
+
+from database import SessionLocal, init_db
+from email_outbox import EmailOutboxWorker, EmailSendError, MemorySink
+from models import EmailOutbox
+
+
+class RejectingSink(MemorySink):
+    """Rejects any batch that contains a blocked address, like a SendGrid 400"""
+
+    def __init__(self, blocked: str):
+        super().__init__()
+        self.blocked = blocked
+
+    async def send(self, template, messages):
+        if any(m["to_email"] == self.blocked for m in messages):
+            raise EmailSendError("Invalid recipient", retryable=False)
+        await super().send(template, messages)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tables():
+    init_db()
+
+
+def _address(label: str) -> str:
+    return f"{label}-{uuid.uuid4().hex[:8]}@example.com"
+
+
+def _statuses(ids):
+    db = SessionLocal()
+    try:
+        return {row.id: row.status for row in db.query(EmailOutbox).filter(EmailOutbox.id.in_(ids))}
+    finally:
+        db.close()
+
+
+@pytest.mark.asyncio
+async def test_delivers_queued_emails_in_one_call_per_template():
+    sink = MemorySink()
+    worker = EmailOutboxWorker(sink=sink)
+
+    recipients = [_address("otp-a"), _address("otp-b"), _address("invite")]
+    ids = [
+        await worker.enqueue(recipients[0], "otp", {"otp": "111111", "name": "A"}),
+        await worker.enqueue(recipients[1], "otp", {"otp": "222222", "name": "B"}),
+        await worker.enqueue(recipients[2], "team_invite", {
+            "inviter_name": "Founder",
+            "project_name": "Outbox",
+            "otp": "333333",
+            "role": "FE",
+            "join_link": "http://localhost:3000/join?code=333333"
+        }),
+    ]
+
+    await worker._deliver_batch()
+
+    sent = {m["to_email"]: m for m in sink.sent}
+    assert set(recipients) <= set(sent)
+    assert "222222" in sent[recipients[1]]["html_content"]
+    assert sent[recipients[2]]["subject"] == "Join Outbox on OPS-X as FE"
+    assert worker.stats["api_calls"] == 2
+    assert set(_statuses(ids).values()) == {"sent"}
+
+
+@pytest.mark.asyncio
+async def test_rejected_batch_is_retried_per_message():
+    bad = _address("bad")
+    sink = RejectingSink(blocked=bad)
+    worker = EmailOutboxWorker(sink=sink)
+
+    good_id = await worker.enqueue(_address("good"), "otp", {"otp": "444444", "name": "G"})
+    bad_id = await worker.enqueue(bad, "otp", {"otp": "555555", "name": "B"})
+
+    await worker._deliver_batch()
+
+    assert _statuses([good_id, bad_id]) == {good_id: "sent", bad_id: "failed"}
+    assert bad not in {m["to_email"] for m in sink.sent}
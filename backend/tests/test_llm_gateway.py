@@ -0,0 +1,82 @@
+"""
+LLM gateway circuit breaker: half-open probes always end
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from integrations.llm_gateway import LLMGateway, CircuitOpenError, LLM_BREAKER_RESET
+
+
+def _half_open(gateway: LLMGateway, name: str):
+    provider = gateway.provider(name)
+    provider.consecutive_failures = 5
+    provider.opened_at = time.monotonic() - LLM_BREAKER_RESET - 1
+    assert provider.state == "half_open"
+    return provider
+
+
+async def _ok():
+    return "ok"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_probe_lets_the_next_call_probe():
+    gateway = LLMGateway()
+    provider = _half_open(gateway, "test")
+
+    task = asyncio.create_task(gateway.call("test", lambda: asyncio.sleep(60), retries=0))
+    await asyncio.sleep(0.01)
+    with pytest.raises(CircuitOpenError):
+        await gateway.call("test", _ok)  # Probe in flight
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert not provider.probing
+    assert await gateway.call("test", _ok) == "ok"
+    assert provider.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_hold_probe_lets_the_next_call_probe():
+    gateway = LLMGateway()
+    provider = _half_open(gateway, "test")
+
+    async def stream():
+        async with gateway.hold("test"):
+            await asyncio.sleep(60)
+
+    task = asyncio.create_task(stream())
+    await asyncio.sleep(0.01)
+    assert provider.probing
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert not provider.probing
+    assert await gateway.call("test", _ok) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_probe_failure_closes_the_breaker():
+    gateway = LLMGateway()
+    provider = _half_open(gateway, "test")
+
+    async def bad_request():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await gateway.call("test", bad_request)
+    assert not provider.probing
+    assert provider.state == "closed"
+
+    provider = _half_open(gateway, "stream")
+    with pytest.raises(ValueError):
+        async with gateway.hold("stream"):
+            raise ValueError("bad request")
+    assert not provider.probing
+    assert provider.state == "closed"
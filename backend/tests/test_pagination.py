@@ -0,0 +1,75 @@
+"""
+List endpoints return everything unless a page size is asked for
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from database import SessionLocal, init_db
+from models import Branch, Project, Stakeholder, User
+
+BRANCHES = 60  # More than API_DEFAULT_PAGE_SIZE
+
+
+@pytest.fixture(scope="module")
+def project_id():
+    init_db()
+    db = SessionLocal()
+    try:
+        suffix = uuid.uuid4().hex[:8]
+        user = User(email=f"pages-{suffix}@example.com", name="Pager")
+        db.add(user)
+        db.flush()
+
+        project = Project(name=f"Pages {suffix}", prompt="Pagination fixture", owner_id=user.id)
+        db.add(project)
+        db.flush()
+
+        stakeholder = Stakeholder(project_id=project.id, user_id=user.id, name=user.name, email=user.email, role="Founder")
+        db.add(stakeholder)
+        db.flush()
+
+        # Explicit timestamps: SQLite's now() default drops the microseconds the cursor compares
+        start = datetime(2024, 1, 1)
+        db.add_all([
+            Branch(
+                project_id=project.id,
+                stakeholder_id=stakeholder.id,
+                branch_name=f"feature/page-{i}",
+                created_at=start + timedelta(seconds=i)
+            )
+            for i in range(BRANCHES)
+        ])
+        db.commit()
+        return project.id
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def test_without_limit_the_whole_list_is_returned(client, project_id):
+    body = client.get(f"/api/projects/{project_id}/branches").json()
+
+    assert len(body["data"]) == BRANCHES
+    assert body["next_cursor"] is None
+
+
+def test_limit_pages_through_every_row_once(client, project_id):
+    names = []
+    url = f"/api/projects/{project_id}/branches?limit=25"
+    body = client.get(url).json()
+    while True:
+        names += [b["branch_name"] for b in body["data"]]
+        if not body["next_cursor"]:
+            break
+        body = client.get(f"{url}&cursor={body['next_cursor']}").json()
+
+    assert names == [f"feature/page-{i}" for i in range(BRANCHES)]
@@ -0,0 +1,82 @@
+"""
+SQL query budgets for the hot read endpoints
+"""
+
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from database import SessionLocal, init_db
+from models import Branch, ChatMessage, Project, Stakeholder, User
+
+
+@pytest.fixture(scope="module")
+def project_id():
+    """A project with a few members, 30 chat messages and 12 branches"""
+    init_db()
+    db = SessionLocal()
+    try:
+        suffix = uuid.uuid4().hex[:8]
+        users = [User(email=f"budget-{i}-{suffix}@example.com", name=f"User {i}") for i in range(3)]
+        db.add_all(users)
+        db.flush()
+
+        project = Project(name=f"Budget {suffix}", prompt="Query budget fixture", owner_id=users[0].id)
+        db.add(project)
+        db.flush()
+
+        stakeholders = [
+            Stakeholder(project_id=project.id, user_id=u.id, name=u.name, email=u.email, role=role)
+            for u, role in zip(users, ["Founder", "FE", "BE"])
+        ]
+        db.add_all(stakeholders)
+        db.flush()
+
+        db.add_all([
+            ChatMessage(
+                project_id=project.id,
+                user_id=None if i % 5 == 0 else users[i % 3].id,
+                message=f"message {i}",
+                role=stakeholders[i % 3].role,
+                is_ai=i % 5 == 0
+            )
+            for i in range(30)
+        ])
+        db.add_all([
+            Branch(
+                project_id=project.id,
+                stakeholder_id=stakeholders[i % 3].id,
+                branch_name=f"feature/budget-{i}"
+            )
+            for i in range(12)
+        ])
+        db.commit()
+        return project.id
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="module")
+def client():
+    # No lifespan: the background workers are not needed for reads
+    return TestClient(app)
+
+
+def test_chat_messages_query_budget(client, project_id, query_budget):
+    with query_budget(max_queries=4):
+        response = client.get(f"/api/projects/{project_id}/chat/messages")
+
+    body = response.json()
+    assert body["success"]
+    assert len(body["data"]) == 30
+
+
+def test_project_branches_query_budget(client, project_id, query_budget):
+    with query_budget(max_queries=3):
+        response = client.get(f"/api/projects/{project_id}/branches?limit=50")
+
+    body = response.json()
+    assert body["success"]
+    assert len(body["data"]) == 12
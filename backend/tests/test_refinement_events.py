@@ -0,0 +1,122 @@
+"""
+Refinement status versions come from the row, so every worker agrees on them
+"""
+
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.refinements
+from main import app
+from database import SessionLocal, init_db
+from models import Project, Refinement, Stakeholder, User
+from refinement_events import RefinementEventBus
+from refinement_queue import refinement_queue
+
+
+@pytest.fixture(scope="module")
+def refinement_id():
+    init_db()
+    db = SessionLocal()
+    try:
+        suffix = uuid.uuid4().hex[:8]
+        user = User(email=f"events-{suffix}@example.com", name="Events")
+        db.add(user)
+        db.flush()
+
+        project = Project(name=f"Events {suffix}", prompt="Event fixture", owner_id=user.id)
+        db.add(project)
+        db.flush()
+
+        stakeholder = Stakeholder(project_id=project.id, user_id=user.id, name=user.name, email=user.email, role="BE")
+        db.add(stakeholder)
+        db.flush()
+
+        refinement = Refinement(
+            project_id=project.id,
+            stakeholder_id=stakeholder.id,
+            request_text="Add a health check",
+            status="pending"
+        )
+        db.add(refinement)
+        db.commit()
+        return refinement.id
+    finally:
+        db.close()
+
+
+def _set_status(refinement_id: int, status: str) -> int:
+    """Change the row the way another worker would: no event reaches this process"""
+    db = SessionLocal()
+    try:
+        refinement = db.get(Refinement, refinement_id)
+        refinement.status = status
+        db.commit()
+        return refinement.status_version
+    finally:
+        db.close()
+
+
+def _version(refinement_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.get(Refinement, refinement_id).status_version
+    finally:
+        db.close()
+
+
+def test_visible_changes_bump_the_row_version(refinement_id):
+    before = _version(refinement_id)
+    assert _set_status(refinement_id, "processing") == before + 1
+
+    # Lease bookkeeping is not a status change
+    db = SessionLocal()
+    try:
+        db.get(Refinement, refinement_id).attempts += 1
+        db.commit()
+    finally:
+        db.close()
+    assert _version(refinement_id) == before + 1
+
+    # Bulk updates bump it too
+    refinement_queue._release(refinement_id, "retry", 0)
+    assert _version(refinement_id) == before + 2
+
+
+def test_long_poll_sees_changes_made_by_other_workers(refinement_id, monkeypatch):
+    monkeypatch.setattr(api.refinements, "REFINEMENT_LONG_POLL_RECHECK", 0.1)
+    client = TestClient(app)
+    version = client.get(f"/api/refinements/{refinement_id}").json()["data"]["version"]
+
+    timer = threading.Timer(0.3, _set_status, (refinement_id, "completed"))
+    timer.start()
+    started = time.monotonic()
+    data = client.get(f"/api/refinements/{refinement_id}?wait=10&version={version}").json()["data"]
+    timer.join()
+
+    assert time.monotonic() - started < 5
+    assert data["status"] == "completed"
+    assert data["version"] == version + 1
+
+    # Already past the client's version: answered without waiting
+    started = time.monotonic()
+    data = client.get(f"/api/refinements/{refinement_id}?wait=10&version={version}").json()["data"]
+    assert time.monotonic() - started < 1
+    assert data["version"] == version + 1
+
+
+@pytest.mark.asyncio
+async def test_stale_and_repeated_events_are_dropped():
+    bus = RefinementEventBus(redis_url=None)
+    queue = bus.subscribe(7)
+    event = {"refinement_id": 1, "project_id": 7, "status": "processing", "version": 3}
+
+    assert bus._dispatch(event)
+    assert not bus._dispatch(event)  # Our own event relayed back
+    assert not bus._dispatch({**event, "status": "pending", "version": 2})
+
+    assert bus.version(1) == 3
+    assert queue.qsize() == 1
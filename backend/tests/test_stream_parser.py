@@ -0,0 +1,60 @@
+"""
+Streaming file parser parity with the regex parser it replaced
+"""
+
+import re
+
+import pytest
+
+from integrations.stream_parser import V0, StreamingFileParser, parse_files
+
+
+def _regex_v0_files(content: str) -> dict:
+    """The old V0CleanGenerator._parse_v0_response, methods 1 and 2"""
+    files = {}
+    for filename, code in re.findall(r'```[\w]+\s+file="([^"]+)"\n(.*?)```', content, re.DOTALL):
+        files[filename] = code.strip()
+    if not files:
+        for block in re.findall(r'```[\w]*\n(.*?)```', content, re.DOTALL):
+            match = re.search(r'^(?://|#)\s*([^\n]+\.(?:tsx?|jsx?|json|css|js|ts))', block, re.MULTILINE)
+            if match:
+                files[match.group(1).strip()] = block.strip()
+    return files
+
+
+COMMENT_FENCES = [
+    # Leading blank line
+    "Here you go:\n\n```tsx\n\n// app/page.tsx\nexport default function Page() {\n  return <main />\n}\n```\n",
+    # 'use client' before the path comment
+    "```tsx\n'use client'\n\n// components/counter.tsx\nexport function Counter() {}\n```\n",
+    # Trailing description after the path
+    "```tsx\n// app/page.tsx - main page\nexport default function Page() {}\n```\n",
+    # Several blocks, one of them without any filename
+    "```bash\nnpm install\n```\n\n```ts\n// lib/utils.ts\nexport const x = 1\n```\n"
+    "```css\n/* no name */\n```\n```css\n// app/globals.css\nbody {}\n```\n",
+]
+
+
+@pytest.mark.parametrize("text", COMMENT_FENCES)
+def test_v0_comment_fences_match_regex_parser(text):
+    assert parse_files(text, formats=[V0]) == _regex_v0_files(text)
+
+
+@pytest.mark.parametrize("text", COMMENT_FENCES)
+def test_v0_comment_fences_in_small_chunks(text):
+    parser = StreamingFileParser([V0])
+    for i in range(0, len(text), 3):
+        parser.feed(text[i:i + 3])
+    parser.finish()
+    assert parser.files == _regex_v0_files(text)
+
+
+def test_v0_comment_keeps_full_extension():
+    # The regex parser matched "js" before "json" and produced package.js
+    text = "```json\n// package.json\n{}\n```\n"
+    assert parse_files(text, formats=[V0]) == {"package.json": "// package.json\n{}"}
+
+
+def test_v0_file_attribute_fence():
+    text = 'Intro\n```tsx file="app/layout.tsx"\nexport default function Layout() {}\n```\n'
+    assert parse_files(text, formats=[V0]) == _regex_v0_files(text)
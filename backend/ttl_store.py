@@ -0,0 +1,265 @@
+"""
+Shared TTL key-value store
+Short-lived entries (OTPs, invite codes) visible to every worker, in Postgres or Redis, with a local LRU read-through
+"""
+
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import AsyncSessionLocal
+from models import TTLEntry
+
+# Set to use Redis (or a compatible server) instead of the ttl_entries table
+REDIS_URL = os.getenv("REDIS_URL")
+TTL_STORE_REDIS_PREFIX = os.getenv("TTL_STORE_REDIS_PREFIX", "opsx:ttl:")
+# Local read-through: bounds how stale another worker's write can look
+TTL_STORE_LOCAL_TTL = float(os.getenv("TTL_STORE_LOCAL_TTL", "2"))
+TTL_STORE_LOCAL_MAX = int(os.getenv("TTL_STORE_LOCAL_MAX", "10000"))
+TTL_STORE_SWEEP_INTERVAL = float(os.getenv("TTL_STORE_SWEEP_INTERVAL", "60"))
+
+
+class _DatabaseBackend:
+    """ttl_entries table; expired rows are hidden on read and deleted by sweep()"""
+
+    name = "database"
+
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(TTLEntry.value, TTLEntry.expires_at)
+                .where(TTLEntry.key == key, TTLEntry.expires_at > datetime.now(timezone.utc))
+            )).first()
+        if row is None:
+            return None
+        return json.dumps(row.value), _epoch(row.expires_at)
+
+    async def set(self, key: str, value: str, ttl: float):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        async with AsyncSessionLocal() as db:
+            dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+            stmt = dialect.insert(TTLEntry).values(key=key, value=json.loads(value), expires_at=expires_at)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[TTLEntry.key],
+                set_={"value": stmt.excluded.value, "expires_at": stmt.excluded.expires_at}
+            )
+            await db.execute(stmt)
+            await db.commit()
+
+    async def pop(self, key: str) -> Optional[str]:
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                delete(TTLEntry)
+                .where(TTLEntry.key == key)
+                .returning(TTLEntry.value, TTLEntry.expires_at)
+            )).first()
+            await db.commit()
+        if row is None or _epoch(row.expires_at) <= time.time():
+            return None
+        return json.dumps(row.value)
+
+    async def sweep(self) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(TTLEntry).where(TTLEntry.expires_at <= datetime.now(timezone.utc))
+            )
+            await db.commit()
+        return result.rowcount or 0
+
+    async def close(self):
+        pass
+
+
+class _RedisBackend:
+    """Redis keys with native expiry; nothing to sweep"""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = TTL_STORE_REDIS_PREFIX):
+        import redis.asyncio as aioredis
+
+        self.client = aioredis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            value, ttl_ms = await pipe.get(self.prefix + key).pttl(self.prefix + key).execute()
+        if value is None:
+            return None
+        return value, time.time() + max(ttl_ms, 0) / 1000
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def pop(self, key: str) -> Optional[str]:
+        return await self.client.getdel(self.prefix + key)
+
+    async def sweep(self) -> int:
+        return 0
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class TTLStore:
+    """
+    Key-value entries that disappear after their TTL
+
+    Values must be JSON-serializable. Reads go through a small per-process
+    LRU kept for at most TTL_STORE_LOCAL_TTL seconds (never past the entry's
+    own expiry), so another worker's overwrite may be seen that much later.
+    pop() always goes to the backend and is atomic: of several workers
+    consuming the same key, exactly one gets the value.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = REDIS_URL,
+        local_ttl: float = TTL_STORE_LOCAL_TTL,
+        local_max: int = TTL_STORE_LOCAL_MAX,
+        sweep_interval: float = TTL_STORE_SWEEP_INTERVAL
+    ):
+        self.redis_url = redis_url
+        self.local_ttl = local_ttl
+        self.local_max = local_max
+        self.sweep_interval = sweep_interval
+        self._backend = None
+        # key -> (JSON value or None for a remembered miss, entry expiry epoch, local copy valid until monotonic)
+        self._local: "OrderedDict[str, Tuple[Optional[str], float, float]]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {"local_hits": 0, "reads": 0, "writes": 0, "pops": 0, "swept": 0}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if self.redis_url:
+                try:
+                    self._backend = _RedisBackend(self.redis_url)
+                    print("✅ TTL store using Redis")
+                except Exception as e:
+                    print(f"⚠️ Redis unavailable for TTL store ({e}), using the database")
+            if self._backend is None:
+                self._backend = _DatabaseBackend()
+        return self._backend
+
+    async def get(self, key: str, fresh: bool = False, remember_missing: float = 0) -> Optional[Any]:
+        """
+        Value of a live entry, or None when missing or expired
+
+        fresh=True skips the local copy (e.g. before comparing a code the
+        user may just have re-requested through another worker).
+        remember_missing=N keeps a miss locally for N seconds, for keys that
+        are almost always absent (e.g. revocations); a set() here replaces it
+        at once, one on another worker shows up within N seconds.
+        """
+        cached = None if fresh else self._local.get(key)
+        if cached is not None:
+            value, expires_at, valid_until = cached
+            if time.monotonic() < valid_until and time.time() < expires_at:
+                self._local.move_to_end(key)
+                self.stats["local_hits"] += 1
+                return json.loads(value) if value is not None else None
+            del self._local[key]
+
+        self.stats["reads"] += 1
+        found = await self.backend.get(key)
+        if found is None:
+            self._local.pop(key, None)
+            if remember_missing > 0:
+                self._local[key] = (None, float("inf"), time.monotonic() + remember_missing)
+                self._trim()
+            return None
+
+        value, expires_at = found
+        self._remember(key, value, expires_at)
+        return json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        """Create or replace an entry that expires ttl seconds from now"""
+        payload = json.dumps(value)
+        await self.backend.set(key, payload, ttl)
+        self.stats["writes"] += 1
+        self._remember(key, payload, time.time() + ttl)
+
+    async def pop(self, key: str) -> Optional[Any]:
+        """Remove an entry and return its value if it was still live"""
+        self._local.pop(key, None)
+        self.stats["pops"] += 1
+        value = await self.backend.pop(key)
+        return json.loads(value) if value is not None else None
+
+    async def delete(self, key: str):
+        await self.pop(key)
+
+    async def sweep(self) -> int:
+        """Delete expired entries from the backend and the local cache"""
+        now, local_now = time.time(), time.monotonic()
+        for key in [
+            k for k, (_, expires_at, valid_until) in self._local.items()
+            if expires_at <= now or valid_until <= local_now
+        ]:
+            del self._local[key]
+
+        removed = await self.backend.sweep()
+        self.stats["swept"] += removed
+        return removed
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._local[key] = (value, expires_at, time.monotonic() + self.local_ttl)
+        self._local.move_to_end(key)
+        self._trim()
+
+    def _trim(self):
+        while len(self._local) > self.local_max:
+            self._local.popitem(last=False)
+
+    async def start(self):
+        """Start the periodic sweep of expired entries"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    print(f"🧹 TTL store swept {removed} expired entries")
+            except Exception as e:
+                print(f"⚠️ TTL store sweep failed: {e}")
+
+    async def close(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        if self._backend is not None:
+            await self._backend.close()
+            self._backend = None
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            "backend": self._backend.name if self._backend else None,
+            "local_entries": len(self._local)
+        }
+
+
+# Global instance
+ttl_store = TTLStore()
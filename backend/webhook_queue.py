@@ -0,0 +1,246 @@
+"""
+GitHub webhook ingestion queue
+Deliveries are stored raw on receipt and applied in batches by a background worker
+"""
+
+import os
+import json
+import random
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_
+
+from database import SessionLocal
+from models import Refinement, WebhookDelivery
+from refinement_events import refinement_events
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", "5"))
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", "300"))
+# Processed deliveries are kept this long; it is also the de-duplication window
+WEBHOOK_RETENTION_DAYS = float(os.getenv("WEBHOOK_RETENTION_DAYS", "7"))
+WEBHOOK_PRUNE_INTERVAL = float(os.getenv("WEBHOOK_PRUNE_INTERVAL", "3600"))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class WebhookQueue:
+    """
+    Background processor for stored webhook deliveries
+
+    A batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, applied and
+    marked processed in one transaction, so several processes can share the
+    table and a crash simply leaves the batch pending. All pull_request
+    deliveries of a batch resolve their refinements with one pr_url IN (...)
+    query. A delivery that fails is retried with backoff, up to
+    WEBHOOK_MAX_ATTEMPTS.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = WEBHOOK_BATCH_SIZE,
+        poll_interval: float = WEBHOOK_POLL_INTERVAL,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pruned_at: Optional[datetime] = None
+        self.stats = {"batches": 0, "processed": 0, "retried": 0, "failed": 0, "pruned": 0}
+
+    async def start(self):
+        """Start the worker"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._worker())
+        print(f"🪝 Webhook queue started: batches of {self.batch_size}")
+
+    async def stop(self):
+        """Stop the worker; an interrupted batch rolls back and stays pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self):
+        """Wake the worker after a delivery was stored"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                handled = await asyncio.to_thread(self._process_batch)
+            except Exception as e:
+                print(f"⚠️ Webhook batch failed: {e}")
+                handled = 0
+
+            # A full batch probably means more are waiting
+            if handled >= self.batch_size:
+                continue
+
+            try:
+                await asyncio.to_thread(self._prune)
+            except Exception as e:
+                print(f"⚠️ Webhook delivery prune failed: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _process_batch(self) -> int:
+        """Claim, apply and commit one batch (runs in a worker thread)"""
+        db = SessionLocal()
+        try:
+            now = _utcnow()
+            deliveries = db.query(WebhookDelivery).filter(
+                WebhookDelivery.status == "pending",
+                or_(WebhookDelivery.available_at.is_(None), WebhookDelivery.available_at <= now)
+            ).order_by(
+                WebhookDelivery.received_at.asc(),
+                WebhookDelivery.id.asc()
+            ).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+            if not deliveries:
+                return 0
+
+            payloads: Dict[str, Dict] = {}
+            for delivery in deliveries:
+                try:
+                    payload = json.loads(delivery.payload)
+                except ValueError as e:
+                    self._fail(delivery, f"Invalid JSON: {e}", now, retry=False)
+                    continue
+                if not isinstance(payload, dict):
+                    self._fail(delivery, "Payload is not a JSON object", now, retry=False)
+                    continue
+                payloads[delivery.id] = payload
+
+            pr_urls = {
+                payload.get("pull_request", {}).get("html_url")
+                for payload in payloads.values()
+                if isinstance(payload.get("pull_request"), dict)
+            }
+            pr_urls.discard(None)
+            refinements_by_url: Dict[str, Refinement] = {}
+            if pr_urls:
+                for refinement in db.query(Refinement).filter(Refinement.pr_url.in_(pr_urls)):
+                    refinements_by_url.setdefault(refinement.pr_url, refinement)
+
+            changed: List[Refinement] = []
+            for delivery in deliveries:
+                payload = payloads.get(delivery.id)
+                if payload is None:
+                    continue
+                try:
+                    refinement = self._apply(delivery.event, payload, refinements_by_url, now)
+                except Exception as e:
+                    self._fail(delivery, str(e), now)
+                    continue
+                if refinement is not None and refinement not in changed:
+                    changed.append(refinement)
+                delivery.status = "processed"
+                delivery.processed_at = now
+                self.stats["processed"] += 1
+
+            db.commit()
+            self.stats["batches"] += 1
+
+            for refinement in changed:
+                refinement_events.publish(refinement)
+            print(f"🪝 Processed {len(deliveries)} webhook deliveries, {len(changed)} refinements updated")
+            return len(deliveries)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _fail(self, delivery: WebhookDelivery, error: str, now: datetime, retry: bool = True):
+        delivery.attempts = (delivery.attempts or 0) + 1
+        delivery.error_message = error
+        if retry and delivery.attempts < self.max_attempts:
+            delay = min(WEBHOOK_BACKOFF_MAX, WEBHOOK_BACKOFF_BASE * 2 ** (delivery.attempts - 1))
+            delivery.available_at = now + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+            self.stats["retried"] += 1
+        else:
+            delivery.status = "failed"
+            delivery.processed_at = now
+            self.stats["failed"] += 1
+        print(f"⚠️ Webhook delivery {delivery.id} ({delivery.event}) failed: {error}")
+
+    @staticmethod
+    def _apply(
+        event: str,
+        payload: Dict,
+        refinements_by_url: Dict[str, Refinement],
+        now: datetime
+    ) -> Optional[Refinement]:
+        """Apply one event; returns the refinement it changed, if any"""
+        if event == "pull_request":
+            action = payload.get("action")  # opened, closed, reopened, synchronize
+            pr_data = payload.get("pull_request", {})
+            merged = pr_data.get("merged", False)
+
+            refinement = refinements_by_url.get(pr_data.get("html_url"))
+            if refinement is None:
+                return None
+
+            if action == "opened":
+                refinement.status = "processing"
+            elif action == "closed" and merged:
+                refinement.status = "completed"
+                refinement.completed_at = now
+            elif action == "closed" and not merged:
+                refinement.status = "failed"
+                refinement.error_message = "PR closed without merging"
+            else:
+                return None
+            return refinement
+
+        if event == "issue_comment":
+            # Track when CodeRabbit posts comments
+            comment = payload.get("comment", {})
+            if "coderabbit" in comment.get("user", {}).get("login", "").lower():
+                print(f"✓ CodeRabbit comment: {comment.get('body', '')[:200]}")
+
+        elif event == "pull_request_review":
+            # Track PR reviews (including CodeRabbit's)
+            review = payload.get("review", {})
+            if "coderabbit" in review.get("user", {}).get("login", "").lower():
+                print(f"✓ CodeRabbit review: {review.get('state')}")
+
+        return None
+
+    def _prune(self):
+        """Delete settled deliveries past the retention window (at most every WEBHOOK_PRUNE_INTERVAL)"""
+        now = _utcnow()
+        if self._pruned_at and (now - self._pruned_at).total_seconds() < WEBHOOK_PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+
+        db = SessionLocal()
+        try:
+            removed = db.query(WebhookDelivery).filter(
+                WebhookDelivery.status != "pending",
+                WebhookDelivery.received_at < now - timedelta(days=WEBHOOK_RETENTION_DAYS)
+            ).delete(synchronize_session=False)
+            db.commit()
+            self.stats["pruned"] += removed
+        finally:
+            db.close()
+
+
+# Global instance
+webhook_queue = WebhookQueue()
@@ -26,24 +26,35 @@ export function useChatRoom({
     enabled: !!projectId,
   });
 
+  const historyLoaded = !!data?.data;
+
   useEffect(() => {
     if (data?.data) {
       setMessages(data.data);
     }
   }, [data]);
 
-  // Join/leave chat room (use projectId as room)
+  // Join the room (projectId) once history is loaded; the cursor catches up on
+  // anything sent between the REST fetch and the join
   useEffect(() => {
-    if (projectId) {
-      joinRoom(projectId);
-      return () => leaveRoom(projectId);
-    }
-  }, [projectId, joinRoom, leaveRoom]);
+    if (!projectId || !historyLoaded) return;
+
+    const history: ChatMessage[] =
+      queryClient.getQueryData<any>(["chat-messages", projectId])?.data ?? [];
+    const lastSeenId = history.reduce((max, m) => Math.max(max, m.id), 0);
+    joinRoom(projectId, lastSeenId);
+    return () => leaveRoom(projectId);
+  }, [projectId, historyLoaded, queryClient, joinRoom, leaveRoom]);
 
-  // Listen for new messages
+  // Listen for new messages (live broadcasts and reconnect replays)
   useEffect(() => {
-    const unsubscribe = on<any>("chat:message", (payload) => {
+    const handlePayload = (payload: any) => {
       if (payload.project_id === parseInt(projectId || "0")) {
+        // The gap was too large to replay in full; reload history over REST
+        if (payload.truncated) {
+          queryClient.invalidateQueries({ queryKey: ["chat-messages", projectId] });
+        }
+
         // Add new messages to the list (deduplicate by ID)
         if (payload.messages && Array.isArray(payload.messages)) {
           setMessages((prev) => {
@@ -51,14 +62,20 @@ export function useChatRoom({
             const newMessages = payload.messages.filter(
               (msg: ChatMessage) => !existingIds.has(msg.id)
             );
-            return [...prev, ...newMessages];
+            return [...prev, ...newMessages].sort((a, b) => a.id - b.id);
           });
         }
       }
-    });
+    };
+
+    const unsubscribeLive = on<any>("chat:message", handlePayload);
+    const unsubscribeReplay = on<any>("chat:replay", handlePayload);
 
-    return () => unsubscribe();
-  }, [on, projectId]);
+    return () => {
+      unsubscribeLive();
+      unsubscribeReplay();
+    };
+  }, [on, projectId, queryClient]);
 
   // Send message mutation
   const sendMessage = useMutation({
@@ -29,8 +29,8 @@ export function useWebSocket(autoConnect = true) {
     wsService.emit(eventType, data);
   }, []);
 
-  const joinRoom = useCallback((roomId: string) => {
-    wsService.joinRoom(roomId);
+  const joinRoom = useCallback((roomId: string, lastSeenId?: number) => {
+    wsService.joinRoom(roomId, lastSeenId);
   }, []);
 
   const leaveRoom = useCallback((roomId: string) => {
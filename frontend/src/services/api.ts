@@ -17,8 +17,13 @@ import type {
   Agent,
 } from "@/types";
 
+// Read-your-writes: the backend pins a client that just wrote to the primary
+// database until this epoch time (seconds); echo it so reads see the write
+const DB_PRIMARY_HEADER = "X-DB-Primary-Until";
+
 class ApiClient {
   private client: AxiosInstance;
+  private dbPrimaryUntil = 0;
 
   constructor() {
     this.client = axios.create({
@@ -36,6 +41,9 @@ class ApiClient {
         if (token) {
           config.headers.Authorization = `Bearer ${token}`;
         }
+        if (this.dbPrimaryUntil * 1000 > Date.now()) {
+          config.headers[DB_PRIMARY_HEADER] = this.dbPrimaryUntil.toFixed(3);
+        }
         return config;
       },
       (error) => Promise.reject(error)
@@ -43,7 +51,13 @@ class ApiClient {
 
     // Response interceptor for error handling
     this.client.interceptors.response.use(
-      (response) => response,
+      (response) => {
+        const pin = parseFloat(response.headers[DB_PRIMARY_HEADER.toLowerCase()]);
+        if (pin > this.dbPrimaryUntil) {
+          this.dbPrimaryUntil = pin;
+        }
+        return response;
+      },
       (error: AxiosError) => {
         if (error.response?.status === 401) {
           // Handle unauthorized
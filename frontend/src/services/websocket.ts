@@ -4,6 +4,8 @@ import type { WSEvent } from "@/types";
 class WebSocketService {
   private socket: Socket | null = null;
   private listeners: Map<string, Set<(data: any) => void>> = new Map();
+  // Joined rooms -> highest chat message id seen (replay cursor)
+  private roomCursors: Map<string, number | undefined> = new Map();
 
   connect(url?: string) {
     if (this.socket?.connected) {
@@ -22,6 +24,10 @@ class WebSocketService {
 
     this.socket.on("connect", () => {
       console.log("WebSocket connected");
+      // Re-join rooms after a reconnect; the server replays only missed messages
+      this.roomCursors.forEach((cursor, roomId) => {
+        this.emit("join_room", { room_id: roomId, last_seen_id: cursor });
+      });
     });
 
     this.socket.on("disconnect", () => {
@@ -33,11 +39,22 @@ class WebSocketService {
     });
 
     // Generic event handler
-    this.socket.onAny((eventType: string, data: any) => {
+    this.socket.onAny((eventType: string, data: any, ...rest: any[]) => {
+      if (eventType === "chat:message" || eventType === "chat:replay") {
+        this.trackCursor(data);
+      }
+
       const listeners = this.listeners.get(eventType);
       if (listeners) {
         listeners.forEach((callback) => callback(data));
       }
+
+      // Acknowledge emits that ask for it; the server sends the next
+      // chat:replay chunk only after this one is acknowledged
+      const ack = rest[rest.length - 1];
+      if (typeof ack === "function") {
+        ack({ received: true, cursor: data?.cursor });
+      }
     });
   }
 
@@ -71,14 +88,30 @@ class WebSocketService {
     }
   }
 
-  joinRoom(roomId: string) {
-    this.emit("join_room", { room_id: roomId });
+  joinRoom(roomId: string, lastSeenId?: number) {
+    const cursor = lastSeenId ?? this.roomCursors.get(roomId);
+    this.roomCursors.set(roomId, cursor);
+    this.emit("join_room", { room_id: roomId, last_seen_id: cursor });
   }
 
   leaveRoom(roomId: string) {
+    this.roomCursors.delete(roomId);
     this.emit("leave_room", { room_id: roomId });
   }
 
+  private trackCursor(payload: any) {
+    if (!payload || !Array.isArray(payload.messages)) return;
+    const roomId = String(payload.project_id);
+    if (!this.roomCursors.has(roomId)) return;
+
+    const current = this.roomCursors.get(roomId) ?? 0;
+    const highest = payload.messages.reduce(
+      (max: number, msg: { id: number }) => Math.max(max, msg.id),
+      current
+    );
+    this.roomCursors.set(roomId, highest);
+  }
+
   sendMessage(chatId: string, message: string, role: string) {
     this.emit("chat:message", {
       chat_id: chatId,